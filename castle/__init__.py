@@ -1,7 +1,10 @@
 from .square import Square
 from .game import Game, Winner
 from .move import Move, CastleMove, EnPassantMove, MoveParser
-from .player import Player, PlayerType
+from .player import Player, PlayerType, SearchPlayer
+from .search import Search, SearchResult
+from .transposition import TranspositionTable
 from .piece import Piece, PieceType, Color
 from .board import Board, InvalidChessNotationError
+from .bitboard import BitBoard
 from .fen_parser import FenGameConstructor
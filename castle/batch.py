@@ -0,0 +1,145 @@
+from typing import Iterable, List, Sequence
+
+from castle.bitboard import KNIGHT_ATTACKS, KING_ATTACKS, rook_attacks, bishop_attacks
+from castle.evaluation import MIDGAME_SCORES, ENDGAME_SCORES, PHASE, MAX_PHASE
+from castle.piece import PieceType, Color
+
+# Bulk evaluation of many positions at once, for offline analysis. Boards are encoded into an (N, 64) int8 array, one
+# signed piece code per square: the PieceType value for a white piece, its negation for a black piece and 0 for an
+# empty square, and then scored over the whole array at once.
+# NumPy is optional: without it, the same scores are computed one position at a time in pure Python.
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+HAS_NUMPY = np is not None
+
+# centipawns per square a piece can move to. Sliders are scored on an empty board, ignoring blockers, which is what
+# keeps the mobility term cheap enough to vectorize.
+MOBILITY_WEIGHTS = {
+    PieceType.KNIGHT: 4,
+    PieceType.BISHOP: 3,
+    PieceType.ROOK: 2,
+    PieceType.QUEEN: 1,
+    PieceType.KING: 0,
+}
+
+
+def _attack_rows(piece_type: PieceType) -> List[List[int]]:
+    # _attack_rows(piece_type)[source][dest] is 1 if the piece attacks dest from source on an empty board
+    rows = []
+    for source in range(64):
+        if piece_type == PieceType.KNIGHT:
+            attacks = KNIGHT_ATTACKS[source]
+        elif piece_type == PieceType.BISHOP:
+            attacks = bishop_attacks(source, 0)
+        elif piece_type == PieceType.ROOK:
+            attacks = rook_attacks(source, 0)
+        elif piece_type == PieceType.QUEEN:
+            attacks = rook_attacks(source, 0) | bishop_attacks(source, 0)
+        else:
+            attacks = KING_ATTACKS[source]
+        rows.append([(attacks >> dest) & 1 for dest in range(64)])
+    return rows
+
+
+_ATTACKS = {piece_type: _attack_rows(piece_type) for piece_type, weight in MOBILITY_WEIGHTS.items() if weight}
+# the same targets as lists of square indexes, for the pure-Python path
+_TARGETS = {piece_type: [[dest for dest in range(64) if row[dest]] for row in rows]
+            for piece_type, rows in _ATTACKS.items()}
+
+
+def _code_tables(scores: List[List[List[int]]]) -> List[List[int]]:
+    # _code_tables(scores)[code + 6][square index], where code is the signed piece code of the square
+    tables = [[0] * 64 for _ in range(13)]
+    for piece_type in range(PieceType.PAWN.value, PieceType.KING.value + 1):
+        tables[piece_type + 6] = scores[Color.WHITE.value][piece_type]
+        tables[-piece_type + 6] = scores[Color.BLACK.value][piece_type]
+    return tables
+
+
+_MIDGAME_BY_CODE = _code_tables(MIDGAME_SCORES)
+_ENDGAME_BY_CODE = _code_tables(ENDGAME_SCORES)
+_PHASE_BY_CODE = [PHASE[abs(code)] for code in range(-6, 7)]
+
+
+def encode_board(board: 'Board') -> List[int]:
+    """The board's 64 signed piece codes, indexed by rank * 8 + file
+    """
+    codes = [0] * 64
+    for square in board.squares_occupied():
+        piece = square.occupant
+        code = piece.type.value
+        codes[square.index] = code if piece.color == Color.WHITE else -code
+    return codes
+
+
+def encode_boards(boards: Iterable['Board']):
+    """Encode the boards into an (N, 64) int8 array, or a list of code lists if NumPy isn't available
+    """
+    encoded = [encode_board(board) for board in boards]
+    if not HAS_NUMPY:
+        return encoded
+    return np.array(encoded, dtype=np.int8).reshape(len(encoded), 64)
+
+
+def _evaluate_codes(codes: Sequence[int]) -> int:
+    """Pure-Python score of one encoded board, from white's point of view
+    """
+    midgame = endgame = phase = 0
+    mobility = 0
+    for index in range(64):
+        code = codes[index]
+        if not code:
+            continue
+        midgame += _MIDGAME_BY_CODE[code + 6][index]
+        endgame += _ENDGAME_BY_CODE[code + 6][index]
+        phase += _PHASE_BY_CODE[code + 6]
+        piece_type = PieceType(abs(code))
+        if piece_type in _TARGETS:
+            # count the targets not occupied by the piece's own side
+            own = sum(1 for dest in _TARGETS[piece_type][index] if codes[dest] * code > 0)
+            moves = len(_TARGETS[piece_type][index]) - own
+            mobility += MOBILITY_WEIGHTS[piece_type] * (moves if code > 0 else -moves)
+    phase = min(phase, MAX_PHASE)
+    return (midgame * phase + endgame * (MAX_PHASE - phase)) // MAX_PHASE + mobility
+
+
+def _evaluate_array(codes: 'np.ndarray') -> 'np.ndarray':
+    """Vectorized score of an (N, 64) array of encoded boards, from white's point of view
+    """
+    squares = np.arange(64)
+    indexes = codes.astype(np.intp) + 6
+    midgame = np.asarray(_MIDGAME_BY_CODE, dtype=np.int32)[indexes, squares].sum(axis=1)
+    endgame = np.asarray(_ENDGAME_BY_CODE, dtype=np.int32)[indexes, squares].sum(axis=1)
+    phase = np.minimum(np.asarray(_PHASE_BY_CODE, dtype=np.int32)[indexes].sum(axis=1), MAX_PHASE)
+    scores = (midgame * phase + endgame * (MAX_PHASE - phase)) // MAX_PHASE
+
+    white_free = (codes <= 0).astype(np.int32)
+    black_free = (codes >= 0).astype(np.int32)
+    for piece_type, rows in _ATTACKS.items():
+        attacks = np.asarray(rows, dtype=np.int32)
+        # moves[n, source] is how many squares a piece on source could move to, if it were that side's
+        white_moves = white_free @ attacks.T
+        black_moves = black_free @ attacks.T
+        white = (codes == piece_type.value) * white_moves
+        black = (codes == -piece_type.value) * black_moves
+        scores += MOBILITY_WEIGHTS[piece_type] * (white.sum(axis=1) - black.sum(axis=1))
+    return scores.astype(np.int32)
+
+
+def evaluate_encoded(codes):
+    """Score boards encoded by encode_boards(), in centipawns from white's point of view.
+    Returns an int32 array with NumPy, or a list of ints without it. Both give the same scores.
+    """
+    if HAS_NUMPY and isinstance(codes, np.ndarray):
+        return _evaluate_array(codes.reshape(-1, 64))
+    return [_evaluate_codes(board_codes) for board_codes in codes]
+
+
+def evaluate_boards(boards: Iterable['Board']):
+    """Score many boards at once: material and piece-square tables tapered by game phase, as in
+    castle.evaluation, plus an approximate mobility term
+    """
+    return evaluate_encoded(encode_boards(boards))
@@ -0,0 +1,233 @@
+import argparse
+import json
+import platform
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from castle.game import Game
+from castle.player import PlayerType
+from castle.san import parse_san
+from castle.search import Search
+from castle.transposition import TranspositionTable
+
+# Speed benchmarks, to catch performance regressions:
+#   python -m castle.bench --json results.json
+#   python -m castle.bench --baseline results.json --threshold 0.1
+# Each benchmark is run several times and its fastest run is reported, since slower runs only measure interference
+# from the rest of the machine. Comparing against a baseline exits with status 1 if any benchmark got slower by more
+# than the threshold.
+
+# name, FEN, perft depth, and the node count at that depth, which is checked so a fast but wrong move generator
+# doesn't pass for an improvement
+POSITIONS: List[Tuple[str, str, int, int]] = [
+    ('start', 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1', 3, 8902),
+    ('kiwipete', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1', 2, 2039),
+    ('en passant pins', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1', 3, 2812),
+    ('promotions', 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1', 2, 264),
+    ('promotion checks', 'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8', 2, 1486),
+    ('pawn race', '8/5p2/8/2k3P1/p3K3/8/1P6/8 b - - 0 1', 3, 795),
+    ('pawn endgame', '8/p7/8/1P6/K1k3p1/6P1/7P/8 w - - 0 1', 4, 2002),
+    ('castling', 'r3k2r/p6p/8/B7/1pp1p3/3b4/P6P/R3K2R w KQkq - 0 1', 2, 341),
+    ('middlegame', 'r3k2r/pb3p2/5npp/n2p4/1p1PPB2/6P1/P2N1PBP/R3K2R b KQkq - 0 1', 2, 953),
+]
+SEARCH_DEPTH = 3
+DEFAULT_REPEAT = 3
+DEFAULT_THRESHOLD = 0.10
+# operations per run of the benchmarks which are too quick to time once
+_MOVEGEN_LOOPS = 50
+_LEGALITY_LOOPS = 5
+_FEN_LOOPS = 50
+_SAN_LOOPS = 5
+
+
+def _games() -> List[Game]:
+    return [Game(PlayerType.HUMAN, PlayerType.HUMAN, fen=fen) for _, fen, _, _ in POSITIONS]
+
+
+def bench_perft() -> Callable[[], int]:
+    games = _games()
+
+    def run() -> int:
+        nodes = 0
+        for game, (name, _, depth, expected) in zip(games, POSITIONS):
+            count = game.perft(depth)
+            if count != expected:
+                raise RuntimeError(f'perft({depth}) of {name} is {count}, expected {expected}')
+            nodes += count
+        return nodes
+    return run
+
+
+def bench_movegen() -> Callable[[], int]:
+    games = _games()
+
+    def run() -> int:
+        moves = 0
+        for _ in range(_MOVEGEN_LOOPS):
+            for game in games:
+                moves += len(game.generate_legal_codes())
+        return moves
+    return run
+
+
+def bench_legality() -> Callable[[], int]:
+    # the legality test search and perft do after making a move: is the side which moved left in check?
+    games = _games()
+    cases = [(game, game.current_player.color, game.generate_legal_codes()) for game in games]
+
+    def run() -> int:
+        checks = 0
+        for _ in range(_LEGALITY_LOOPS):
+            for game, color, codes in cases:
+                is_in_check = game.board.is_in_check
+                for code in codes:
+                    game.make_move_code(code)
+                    is_in_check(color)
+                    game.unmake_move_code()
+                checks += len(codes)
+        return checks
+    return run
+
+
+def bench_fen() -> Callable[[], int]:
+    game = Game(PlayerType.HUMAN, PlayerType.HUMAN)
+    fens = [fen for _, fen, _, _ in POSITIONS]
+
+    def run() -> int:
+        for _ in range(_FEN_LOOPS):
+            for fen in fens:
+                game.load_fen(fen)
+        return _FEN_LOOPS * len(fens)
+    return run
+
+
+def bench_san() -> Callable[[], int]:
+    # every legal move of every position, written out beforehand
+    cases = []
+    for game in _games():
+        cases.append((game, [game.san(code) for code in game.generate_legal_codes()]))
+
+    def run() -> int:
+        parsed = 0
+        for _ in range(_SAN_LOOPS):
+            for game, notations in cases:
+                for notation in notations:
+                    parse_san(game, notation)
+                parsed += len(notations)
+        return parsed
+    return run
+
+
+def bench_search() -> Callable[[], int]:
+    games = _games()
+
+    def run() -> int:
+        nodes = 0
+        for game in games:
+            # a fresh table each run, so every run searches the same tree
+            search = Search(game, max_depth=SEARCH_DEPTH, table=TranspositionTable(1))
+            search.run()
+            nodes += search.nodes
+        return nodes
+    return run
+
+
+# each benchmark sets up, then returns the function to time, which returns how many operations it did
+BENCHMARKS: Dict[str, Callable[[], Callable[[], int]]] = {
+    'perft': bench_perft,
+    'movegen': bench_movegen,
+    'legality': bench_legality,
+    'fen': bench_fen,
+    'san': bench_san,
+    'search': bench_search,
+}
+
+
+def run_benchmark(name: str, repeat: int = DEFAULT_REPEAT) -> Dict[str, float]:
+    run = BENCHMARKS[name]()
+    best = None
+    operations = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        operations = run()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return {'operations': operations, 'seconds': best, 'per_second': operations / best if best else 0.0}
+
+
+def run_benchmarks(names: Optional[List[str]] = None, repeat: int = DEFAULT_REPEAT) -> Dict[str, object]:
+    """Run the named benchmarks, or all of them, and return the results with a description of the machine
+    """
+    names = names or list(BENCHMARKS)
+    unknown = set(names) - set(BENCHMARKS)
+    if unknown:
+        raise ValueError(f'unknown benchmarks: {", ".join(sorted(unknown))}')
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'repeat': repeat,
+        'benchmarks': {name: run_benchmark(name, repeat) for name in names},
+    }
+
+
+def compare(results: Dict[str, object], baseline: Dict[str, object],
+            threshold: float = DEFAULT_THRESHOLD) -> List[Tuple[str, float]]:
+    """The benchmarks which are slower than the baseline by more than the threshold, as a fraction, with the change
+    in speed of each. Benchmarks missing from either side are skipped.
+    """
+    regressions = []
+    old = baseline['benchmarks']
+    for name, result in results['benchmarks'].items():
+        if name not in old or not old[name]['per_second']:
+            continue
+        change = result['per_second'] / old[name]['per_second'] - 1
+        if change < -threshold:
+            regressions.append((name, change))
+    return regressions
+
+
+def format_results(results: Dict[str, object], baseline: Optional[Dict[str, object]] = None) -> str:
+    lines = [f'{"benchmark":<10} {"operations":>10} {"seconds":>9} {"per second":>12}']
+    old = baseline['benchmarks'] if baseline else {}
+    for name, result in results['benchmarks'].items():
+        line = f'{name:<10} {result["operations"]:>10} {result["seconds"]:>9.4f} {result["per_second"]:>12.0f}'
+        if name in old and old[name]['per_second']:
+            line += f' {result["per_second"] / old[name]["per_second"] - 1:>+8.1%}'
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='castle speed benchmarks')
+    parser.add_argument('names', nargs='*', help=f'benchmarks to run, from {", ".join(BENCHMARKS)}; all by default')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='runs of each benchmark, the best is kept')
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--baseline', help='compare against results written earlier with --json')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='slowdown, as a fraction, which counts as a regression')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.names, args.repeat)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+    print(format_results(results, baseline))
+    if args.json:
+        with open(args.json, 'w') as json_file:
+            json.dump(results, json_file, indent=2)
+
+    if baseline:
+        regressions = compare(results, baseline, args.threshold)
+        for name, change in regressions:
+            print(f'regression: {name} is {-change:.1%} slower than the baseline', file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
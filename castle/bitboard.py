@@ -0,0 +1,653 @@
+from typing import List, Optional, Set, Iterator
+
+from castle.board import Board
+from castle.move import Move, MoveParser
+from castle.move import CASTLE_WHITE_SHORT, CASTLE_WHITE_LONG, CASTLE_BLACK_SHORT, CASTLE_BLACK_LONG
+from castle.move import UndoRecord, QUIET, DOUBLE_PAWN_PUSH, KINGSIDE_CASTLE, QUEENSIDE_CASTLE, CAPTURE, EN_PASSANT
+from castle.move import PROMOTION, PROMOTION_PIECES, encode_move
+from castle.piece import Piece, PieceType, Color
+from castle.square import Square
+from castle.zobrist import PIECE_KEYS
+from castle.evaluation import MIDGAME_SCORES, ENDGAME_SCORES, PHASE
+
+# Squares are numbered a1 = 0, b1 = 1, ..., h8 = 63, so bit `rank * 8 + file` of a bitboard represents that square.
+FULL_BOARD = (1 << 64) - 1
+FILE_A = 0x0101010101010101
+FILE_H = FILE_A << 7
+RANK_1 = 0xFF
+RANK_8 = RANK_1 << 56
+
+
+def square_index(rank: int, file: int) -> int:
+    return rank * 8 + file
+
+
+def lsb_index(bitboard: int) -> int:
+    """Index of the least significant set bit. The bitboard must be non-zero.
+    """
+    return (bitboard & -bitboard).bit_length() - 1
+
+
+def msb_index(bitboard: int) -> int:
+    """Index of the most significant set bit. The bitboard must be non-zero.
+    """
+    return bitboard.bit_length() - 1
+
+
+def iter_bits(bitboard: int) -> Iterator[int]:
+    """Yield the index of every set bit, from least to most significant
+    """
+    while bitboard:
+        lsb = bitboard & -bitboard
+        yield lsb.bit_length() - 1
+        bitboard ^= lsb
+
+
+def popcount(bitboard: int) -> int:
+    return bin(bitboard).count('1')
+
+
+def _step_attacks(offsets) -> List[int]:
+    table = []
+    for index in range(64):
+        rank, file = divmod(index, 8)
+        attacks = 0
+        for rank_offset, file_offset in offsets:
+            r, f = rank + rank_offset, file + file_offset
+            if 0 <= r < 8 and 0 <= f < 8:
+                attacks |= 1 << square_index(r, f)
+        table.append(attacks)
+    return table
+
+
+def _ray(index: int, rank_step: int, file_step: int) -> int:
+    rank, file = divmod(index, 8)
+    ray = 0
+    rank += rank_step
+    file += file_step
+    while 0 <= rank < 8 and 0 <= file < 8:
+        ray |= 1 << square_index(rank, file)
+        rank += rank_step
+        file += file_step
+    return ray
+
+
+KNIGHT_ATTACKS = _step_attacks([(2, -1), (2, 1), (-2, -1), (-2, 1), (1, -2), (-1, -2), (1, 2), (-1, 2)])
+KING_ATTACKS = _step_attacks([(r, f) for r in (-1, 0, 1) for f in (-1, 0, 1) if r or f])
+# PAWN_ATTACKS[color.value][index] is the set of squares a pawn of that color on `index` attacks
+PAWN_ATTACKS = [
+    _step_attacks([(1, -1), (1, 1)]),
+    _step_attacks([(-1, -1), (-1, 1)]),
+]
+
+# Rays which move towards higher square indexes. The nearest blocker on these is the least significant bit.
+RAY_NORTH = [_ray(i, 1, 0) for i in range(64)]
+RAY_EAST = [_ray(i, 0, 1) for i in range(64)]
+RAY_NORTH_EAST = [_ray(i, 1, 1) for i in range(64)]
+RAY_NORTH_WEST = [_ray(i, 1, -1) for i in range(64)]
+# Rays which move towards lower square indexes. The nearest blocker on these is the most significant bit.
+RAY_SOUTH = [_ray(i, -1, 0) for i in range(64)]
+RAY_WEST = [_ray(i, 0, -1) for i in range(64)]
+RAY_SOUTH_EAST = [_ray(i, -1, 1) for i in range(64)]
+RAY_SOUTH_WEST = [_ray(i, -1, -1) for i in range(64)]
+
+
+def _between_and_line_tables():
+    between = [[0] * 64 for _ in range(64)]
+    line = [[0] * 64 for _ in range(64)]
+    for forward, backward in [(RAY_NORTH, RAY_SOUTH),
+                              (RAY_EAST, RAY_WEST),
+                              (RAY_NORTH_EAST, RAY_SOUTH_WEST),
+                              (RAY_NORTH_WEST, RAY_SOUTH_EAST)]:
+        for a in range(64):
+            full_line = forward[a] | backward[a] | (1 << a)
+            for b in iter_bits(forward[a]):
+                between[a][b] = between[b][a] = forward[a] & backward[b]
+                line[a][b] = line[b][a] = full_line
+    return between, line
+
+
+# BETWEEN[a][b] holds the squares strictly between a and b, and LINE[a][b] the whole rank, file or diagonal through
+# both. Both are 0 if the squares aren't aligned.
+BETWEEN, LINE = _between_and_line_tables()
+
+_PAWN = PieceType.PAWN.value
+_KNIGHT = PieceType.KNIGHT.value
+_BISHOP = PieceType.BISHOP.value
+_ROOK = PieceType.ROOK.value
+_QUEEN = PieceType.QUEEN.value
+_KING = PieceType.KING.value
+# promotion flags, queen first
+_PROMOTION_FLAGS = [PROMOTION | PROMOTION_PIECES.index(piece_type)
+                    for piece_type in [PieceType.QUEEN, PieceType.ROOK, PieceType.BISHOP, PieceType.KNIGHT]]
+# pieces in the order they join an exchange, least valuable first
+_EXCHANGE_ORDER = [_PAWN, _KNIGHT, _BISHOP, _ROOK, _QUEEN, _KING]
+
+
+def rook_attacks(index: int, occupied: int) -> int:
+    """Squares a rook on `index` attacks, including the first occupied square along each ray
+    """
+    attacks = 0
+    ray = RAY_NORTH[index]
+    blockers = ray & occupied
+    if blockers:
+        ray ^= RAY_NORTH[(blockers & -blockers).bit_length() - 1]
+    attacks |= ray
+    ray = RAY_EAST[index]
+    blockers = ray & occupied
+    if blockers:
+        ray ^= RAY_EAST[(blockers & -blockers).bit_length() - 1]
+    attacks |= ray
+    ray = RAY_SOUTH[index]
+    blockers = ray & occupied
+    if blockers:
+        ray ^= RAY_SOUTH[blockers.bit_length() - 1]
+    attacks |= ray
+    ray = RAY_WEST[index]
+    blockers = ray & occupied
+    if blockers:
+        ray ^= RAY_WEST[blockers.bit_length() - 1]
+    return attacks | ray
+
+
+def bishop_attacks(index: int, occupied: int) -> int:
+    """Squares a bishop on `index` attacks, including the first occupied square along each ray
+    """
+    attacks = 0
+    ray = RAY_NORTH_EAST[index]
+    blockers = ray & occupied
+    if blockers:
+        ray ^= RAY_NORTH_EAST[(blockers & -blockers).bit_length() - 1]
+    attacks |= ray
+    ray = RAY_NORTH_WEST[index]
+    blockers = ray & occupied
+    if blockers:
+        ray ^= RAY_NORTH_WEST[(blockers & -blockers).bit_length() - 1]
+    attacks |= ray
+    ray = RAY_SOUTH_EAST[index]
+    blockers = ray & occupied
+    if blockers:
+        ray ^= RAY_SOUTH_EAST[blockers.bit_length() - 1]
+    attacks |= ray
+    ray = RAY_SOUTH_WEST[index]
+    blockers = ray & occupied
+    if blockers:
+        ray ^= RAY_SOUTH_WEST[blockers.bit_length() - 1]
+    return attacks | ray
+
+
+def queen_attacks(index: int, occupied: int) -> int:
+    return rook_attacks(index, occupied) | bishop_attacks(index, occupied)
+
+
+class BitBoard(Board):
+    """Board implementation which keeps the position in 64-bit integers, one per piece type and color.
+
+    The Square objects handed out by the Board API are kept in sync with the bitboards, so callers can keep using
+    square_from_notation(), place_piece(), squares_matching_filter() etc. All mutation must go through
+    set_occupant() (directly or via place_piece()/move_piece_to_square()) so the two representations can't diverge.
+    """
+    def __init__(self):
+        # _pieces[color.value][piece_type.value] is the bitboard of that piece. Index 0 of the inner list is unused.
+        self._pieces: List[List[int]] = [[0] * 7, [0] * 7]
+        self._occupancy: List[int] = [0, 0]
+        self._occupied = 0
+        # piece on each square index, for O(1) lookups without touching Square objects
+        self._mailbox: List[Optional[Piece]] = [None] * 64
+        super(BitBoard, self).__init__()
+        self._square_list: List[Square] = list(self.squares_all())
+
+    def set_occupant(self, square: Square, piece: Optional[Piece]) -> None:
+        index = square.index
+        bit = 1 << index
+        previous = self._mailbox[index]
+        if previous:
+            color, piece_type = previous.color.value, previous.type.value
+            self._pieces[color][piece_type] ^= bit
+            self._occupancy[color] ^= bit
+            self._occupied ^= bit
+            self.zobrist_key ^= PIECE_KEYS[color][piece_type][index]
+            self.midgame_score -= MIDGAME_SCORES[color][piece_type][index]
+            self.endgame_score -= ENDGAME_SCORES[color][piece_type][index]
+            self.phase -= PHASE[piece_type]
+        if piece:
+            color, piece_type = piece.color.value, piece.type.value
+            self._pieces[color][piece_type] |= bit
+            self._occupancy[color] |= bit
+            self._occupied |= bit
+            self.zobrist_key ^= PIECE_KEYS[color][piece_type][index]
+            self.midgame_score += MIDGAME_SCORES[color][piece_type][index]
+            self.endgame_score += ENDGAME_SCORES[color][piece_type][index]
+            self.phase += PHASE[piece_type]
+        self._mailbox[index] = piece
+        square.occupant = piece
+
+    def square_from_index(self, index: int) -> Square:
+        return self._square_list[index]
+
+    def piece_at(self, index: int) -> Optional[Piece]:
+        return self._mailbox[index]
+
+    def make_move_code(self, code: int) -> UndoRecord:
+        """Board.make_move_code(), working directly from the encoding rather than building a Move
+        """
+        squares = self._square_list
+        mailbox = self._mailbox
+        set_occupant = self.set_occupant
+        source = code & 63
+        dest = (code >> 6) & 63
+        flags = code >> 12
+        piece = mailbox[source]
+
+        if flags == KINGSIDE_CASTLE or flags == QUEENSIDE_CASTLE:
+            rook_source, rook_dest = (source + 3, source + 1) if flags == KINGSIDE_CASTLE else (source - 4, source - 1)
+            set_occupant(squares[source], None)
+            set_occupant(squares[dest], piece)
+            set_occupant(squares[rook_dest], mailbox[rook_source])
+            set_occupant(squares[rook_source], None)
+            return UndoRecord(moved_piece=piece)
+
+        if flags == EN_PASSANT:
+            # the captured pawn is beside the capturing one: on its rank, and the destination's file
+            captured = (source & ~7) | (dest & 7)
+            undo = UndoRecord(mailbox[captured], squares[captured], moved_piece=piece)
+            set_occupant(squares[captured], None)
+        else:
+            undo = UndoRecord(mailbox[dest], squares[dest], moved_piece=piece)
+
+        placed = piece
+        if flags & PROMOTION:
+            placed = Piece(PROMOTION_PIECES[flags & 3], piece.color)
+            undo.promoted_pawn = piece
+        set_occupant(squares[source], None)
+        set_occupant(squares[dest], placed)
+        return undo
+
+    def unmake_move_code(self, code: int, undo: UndoRecord) -> None:
+        squares = self._square_list
+        set_occupant = self.set_occupant
+        source = code & 63
+        dest = (code >> 6) & 63
+        flags = code >> 12
+
+        if flags == KINGSIDE_CASTLE or flags == QUEENSIDE_CASTLE:
+            rook_source, rook_dest = (source + 3, source + 1) if flags == KINGSIDE_CASTLE else (source - 4, source - 1)
+            set_occupant(squares[rook_source], self._mailbox[rook_dest])
+            set_occupant(squares[rook_dest], None)
+            set_occupant(squares[dest], None)
+            set_occupant(squares[source], undo.moved_piece)
+            return
+
+        set_occupant(squares[dest], None)
+        set_occupant(squares[source], undo.moved_piece)
+        if undo.captured_piece:
+            set_occupant(undo.captured_square, undo.captured_piece)
+
+    def pieces(self, piece_type: PieceType, color: Color) -> int:
+        """Bitboard of every square occupied by the given piece
+        """
+        return self._pieces[color.value][piece_type.value]
+
+    def occupancy(self, color: Optional[Color] = None) -> int:
+        """Bitboard of every square occupied by the given color, or by either color if none is provided
+        """
+        if color is None:
+            return self._occupied
+        return self._occupancy[color.value]
+
+    def attacks_from(self, index: int) -> int:
+        """Bitboard of the squares attacked by the piece on `index`, regardless of what occupies them
+        """
+        piece = self._mailbox[index]
+        piece_type = piece.type
+        if piece_type is PieceType.PAWN:
+            return PAWN_ATTACKS[piece.color.value][index]
+        elif piece_type is PieceType.KNIGHT:
+            return KNIGHT_ATTACKS[index]
+        elif piece_type is PieceType.BISHOP:
+            return bishop_attacks(index, self._occupied)
+        elif piece_type is PieceType.ROOK:
+            return rook_attacks(index, self._occupied)
+        elif piece_type is PieceType.QUEEN:
+            return queen_attacks(index, self._occupied)
+        return KING_ATTACKS[index]
+
+    def move_targets(self, index: int) -> int:
+        """Bitboard of the pseudo-legal destinations of the piece on `index`. Does not respect check!
+        """
+        piece = self._mailbox[index]
+        color = piece.color.value
+        if piece.type is not PieceType.PAWN:
+            return self.attacks_from(index) & ~self._occupancy[color]
+
+        empty = ~self._occupied & FULL_BOARD
+        bit = 1 << index
+        if color == Color.WHITE.value:
+            single = (bit << 8) & empty
+            double = ((single & (RANK_1 << 16)) << 8) & empty
+        else:
+            single = (bit >> 8) & empty
+            double = ((single & (RANK_8 >> 16)) >> 8) & empty
+        captures = PAWN_ATTACKS[color][index] & self._occupancy[1 - color]
+        return single | double | captures
+
+    def generate_pseudo_legal(self, color: Color) -> Iterator[tuple]:
+        """Yield a (source index, destination index) pair for every pseudo-legal move. Does not respect check!
+        This avoids constructing Move and Square objects, and is what get_all_moves() is built on.
+        """
+        move_targets = self.move_targets
+        for source in iter_bits(self._occupancy[color.value]):
+            for dest in iter_bits(move_targets(source)):
+                yield source, dest
+
+    def get_all_moves(self, color: Color) -> Set[Move]:
+        squares = self._square_list
+        return {MoveParser.move_from_squares(squares[source], squares[dest])
+                for source, dest in self.generate_pseudo_legal(color)}
+
+    def get_moves(self, square: Square) -> Set[Square]:
+        squares = self._square_list
+        return {squares[dest] for dest in iter_bits(self.move_targets(square.index))}
+
+    def squares_occupied(self):
+        squares = self._square_list
+        for index in iter_bits(self._occupied):
+            yield squares[index]
+
+    def attackers_to(self, index: int, color: Color, occupied: Optional[int] = None) -> int:
+        """Bitboard of the pieces of `color` which attack `index`.
+        An alternate occupancy can be provided to see through pieces which are about to move.
+        """
+        if occupied is None:
+            occupied = self._occupied
+        pieces = self._pieces[color.value]
+        queens = pieces[_QUEEN]
+        return ((PAWN_ATTACKS[1 - color.value][index] & pieces[_PAWN]) |
+                (KNIGHT_ATTACKS[index] & pieces[_KNIGHT]) |
+                (KING_ATTACKS[index] & pieces[_KING]) |
+                (bishop_attacks(index, occupied) & (pieces[_BISHOP] | queens)) |
+                (rook_attacks(index, occupied) & (pieces[_ROOK] | queens)))
+
+    def is_square_attacked(self, square: Square, by_color: Color) -> bool:
+        return self.attackers_to(square.index, by_color) != 0
+
+    def is_in_check(self, color: Color) -> bool:
+        kings = self._pieces[color.value][_KING]
+        if not kings:
+            return False
+        return self.attackers_to((kings & -kings).bit_length() - 1, color.opposite()) != 0
+
+    def generate_legal_moves(self,
+                             color: Color,
+                             castling_rights: int = 0,
+                             en_passant_square: Optional[Square] = None) -> List[Move]:
+        """Returns every legal Move for `color`, without making any of them.
+        The pieces giving check and the pieces pinned to the king are found once up front, and used to restrict
+        each piece's destinations directly:
+          * in double check, only the king may move
+          * in single check, other pieces must capture the checker or block its ray
+          * a pinned piece may only move along the line between its king and the pinning piece
+          * the king may not step onto an attacked square, including one behind it on a checking ray
+        En passant can expose the king along the rank by removing two pieces at once, so those moves are verified
+        against the resulting occupancy.
+        """
+        move_from_code = self.move_from_code
+        return [move_from_code(code) for code in self.generate_legal_codes(color, castling_rights, en_passant_square)]
+
+    def generate_legal_codes(self,
+                             color: Color,
+                             castling_rights: int = 0,
+                             en_passant_square: Optional[Square] = None) -> List[int]:
+        """generate_legal_moves(), returning each move's 16-bit encoding instead of a Move
+        """
+        codes: List[int] = []
+        self._legal_moves(color, castling_rights, en_passant_square, codes)
+        return codes
+
+    def count_legal_moves(self,
+                          color: Color,
+                          castling_rights: int = 0,
+                          en_passant_square: Optional[Square] = None) -> int:
+        """Returns len(generate_legal_moves()), without constructing any Moves.
+        Most destinations are counted a whole bitboard at a time, which makes this much cheaper at perft leaves.
+        """
+        return self._legal_moves(color, castling_rights, en_passant_square, None)
+
+    def generate_legal_captures(self, color: Color, en_passant_square: Optional[Square] = None) -> List[Move]:
+        """Returns the legal captures and promotions for `color`, which are the only moves quiescence search looks at.
+        Quiet moves are masked out of each piece's destinations before any Moves are built for them.
+        """
+        move_from_code = self.move_from_code
+        return [move_from_code(code) for code in self.generate_legal_capture_codes(color, en_passant_square)]
+
+    def generate_legal_capture_codes(self, color: Color, en_passant_square: Optional[Square] = None) -> List[int]:
+        codes: List[int] = []
+        self._legal_moves(color, 0, en_passant_square, codes, captures_only=True)
+        return codes
+
+    def static_exchange(self, code: int) -> int:
+        """Static exchange evaluation: the material the encoded move wins, in Piece.value units, once every capture on
+        its destination square has been played out, with each side capturing with its least valuable attacker and
+        stopping whenever continuing would lose material.
+        This works on occupancy bitboards alone, without making any moves. Sliders behind a capturing piece join the
+        exchange once it has moved off their line. Promotions during the exchange aren't accounted for.
+        """
+        flags = code >> 12
+        if flags == KINGSIDE_CASTLE or flags == QUEENSIDE_CASTLE:
+            return 0
+        mailbox = self._mailbox
+        source = code & 63
+        dest = (code >> 6) & 63
+        occupied = self._occupied
+        if flags == EN_PASSANT:
+            captured = (source & ~7) | (dest & 7)
+            occupied ^= 1 << captured
+            gain = [mailbox[captured].value]
+        else:
+            gain = [mailbox[dest].value if mailbox[dest] else 0]
+
+        side = mailbox[source].color
+        attacker_bit = 1 << source
+        attacker_value = mailbox[source].value
+        while True:
+            occupied ^= attacker_bit
+            side = side.opposite()
+            attackers = self.attackers_to(dest, side, occupied) & occupied
+            if not attackers:
+                break
+            # what this side stands to gain by capturing the piece which just took on the square
+            gain.append(attacker_value - gain[-1])
+            for piece_type in _EXCHANGE_ORDER:
+                candidates = attackers & self._pieces[side.value][piece_type]
+                if candidates:
+                    attacker_bit = candidates & -candidates
+                    attacker_value = mailbox[attacker_bit.bit_length() - 1].value
+                    break
+
+        # each side may also decline to capture, so settle the exchange from the last capture back to the first
+        while len(gain) > 1:
+            last = gain.pop()
+            gain[-1] = -max(-gain[-1], last)
+        return gain[0]
+
+    def _legal_moves(self,
+                     color: Color,
+                     castling_rights: int,
+                     en_passant_square: Optional[Square],
+                     moves: Optional[List[int]],
+                     captures_only: bool = False) -> int:
+        """Appends the encoding of every legal move to `moves`, or only counts them if `moves` is None. Returns the
+        move count.
+        With `captures_only`, only captures and promotions are generated.
+        """
+        us = color.value
+        them = 1 - us
+        their_color = color.opposite()
+        ours = self._pieces[us]
+        theirs = self._pieces[them]
+        own = self._occupancy[us]
+        occupied = self._occupied
+        mailbox = self._mailbox
+        count = 0
+
+        target_mask = FULL_BOARD
+        pinned = 0
+        pin_lines = {}
+        checkers = 0
+        king = -1
+        if ours[_KING]:
+            king = (ours[_KING] & -ours[_KING]).bit_length() - 1
+            checkers = self.attackers_to(king, their_color)
+
+            # the king is taken off the board while testing its destinations, so it can't hide behind itself
+            without_king = occupied ^ (1 << king)
+            king_targets = KING_ATTACKS[king] & ~own
+            if captures_only:
+                king_targets &= self._occupancy[them]
+            for dest in iter_bits(king_targets):
+                if not self.attackers_to(dest, their_color, without_king):
+                    count += 1
+                    if moves is not None:
+                        moves.append(king | (dest << 6) | ((CAPTURE << 12) if mailbox[dest] else 0))
+
+            # in double check, only a king move can help
+            if checkers & (checkers - 1):
+                return count
+            if checkers:
+                checker = (checkers & -checkers).bit_length() - 1
+                target_mask = checkers | BETWEEN[king][checker]
+
+            # sliders which would attack the king if our pieces were out of the way
+            their_occupancy = self._occupancy[them]
+            snipers = ((rook_attacks(king, their_occupancy) & (theirs[_ROOK] | theirs[_QUEEN])) |
+                       (bishop_attacks(king, their_occupancy) & (theirs[_BISHOP] | theirs[_QUEEN])))
+            for sniper in iter_bits(snipers):
+                blockers = BETWEEN[king][sniper] & occupied
+                if blockers and not blockers & (blockers - 1):
+                    pinned |= blockers
+                    pin_lines[blockers.bit_length() - 1] = LINE[king][sniper]
+
+        enemies = self._occupancy[them]
+        empty = ~occupied
+        if us == Color.WHITE.value:
+            forward = 8
+            start_rank = 1
+            last_rank = 7
+            promotion_squares = RANK_8
+        else:
+            forward = -8
+            start_rank = 6
+            last_rank = 0
+            promotion_squares = RANK_1
+
+        for source in iter_bits(own & ~ours[_KING]):
+            piece_type = mailbox[source].type
+            if piece_type is PieceType.PAWN:
+                targets = PAWN_ATTACKS[us][source] & enemies
+                one_step = source + forward
+                if empty & (1 << one_step):
+                    targets |= 1 << one_step
+                    if source >> 3 == start_rank and empty & (1 << (one_step + forward)):
+                        targets |= 1 << (one_step + forward)
+            elif piece_type is PieceType.KNIGHT:
+                targets = KNIGHT_ATTACKS[source] & ~own
+            elif piece_type is PieceType.BISHOP:
+                targets = bishop_attacks(source, occupied) & ~own
+            elif piece_type is PieceType.ROOK:
+                targets = rook_attacks(source, occupied) & ~own
+            else:
+                targets = queen_attacks(source, occupied) & ~own
+
+            targets &= target_mask
+            if captures_only:
+                targets &= enemies | promotion_squares if piece_type is PieceType.PAWN else enemies
+            if pinned & (1 << source):
+                targets &= pin_lines[source]
+
+            if moves is None:
+                count += popcount(targets)
+                if piece_type is PieceType.PAWN and targets & promotion_squares:
+                    # one move per promotion piece
+                    count += 3 * popcount(targets & promotion_squares)
+                continue
+
+            if piece_type is PieceType.PAWN and targets:
+                for dest in iter_bits(targets):
+                    flags = CAPTURE if enemies & (1 << dest) else QUIET
+                    if dest >> 3 == last_rank:
+                        for promotion in _PROMOTION_FLAGS:
+                            moves.append(source | (dest << 6) | ((flags | promotion) << 12))
+                        count += 4
+                    else:
+                        if dest - source == 2 * forward:
+                            flags = DOUBLE_PAWN_PUSH
+                        moves.append(source | (dest << 6) | (flags << 12))
+                        count += 1
+            else:
+                for dest in iter_bits(targets):
+                    moves.append(source | (dest << 6) | ((CAPTURE << 12) if enemies & (1 << dest) else 0))
+                    count += 1
+
+        special_moves: List[int] = []
+        if en_passant_square:
+            special_moves += self._legal_en_passant_moves(color, en_passant_square, king, checkers, target_mask)
+        if castling_rights and not checkers and king >= 0 and not captures_only:
+            special_moves += self._legal_castle_moves(color, castling_rights, king)
+        if moves is not None:
+            moves.extend(special_moves)
+        return count + len(special_moves)
+
+    def _legal_en_passant_moves(self,
+                                color: Color,
+                                en_passant_square: Square,
+                                king: int,
+                                checkers: int,
+                                target_mask: int) -> List[int]:
+        us = color.value
+        theirs = self._pieces[1 - us]
+        target = en_passant_square.index
+        captured = target - 8 if us == Color.WHITE.value else target + 8
+        if not theirs[_PAWN] & (1 << captured):
+            return []
+        # the capture must resolve any check: either by landing on the blocking square, or by removing the checker
+        if not (target_mask & (1 << target) or checkers & (1 << captured)):
+            return []
+
+        moves = []
+        for source in iter_bits(PAWN_ATTACKS[1 - us][target] & self._pieces[us][_PAWN]):
+            if king >= 0:
+                after = (self._occupied ^ (1 << source) ^ (1 << captured)) | (1 << target)
+                if rook_attacks(king, after) & (theirs[_ROOK] | theirs[_QUEEN]):
+                    continue
+                if bishop_attacks(king, after) & (theirs[_BISHOP] | theirs[_QUEEN]):
+                    continue
+            moves.append(encode_move(source, target, EN_PASSANT))
+        return moves
+
+    def _legal_castle_moves(self, color: Color, castling_rights: int, king: int) -> List[int]:
+        if color == Color.WHITE:
+            home_rank = 0
+            sides = [(True, CASTLE_WHITE_SHORT), (False, CASTLE_WHITE_LONG)]
+        else:
+            home_rank = 56
+            sides = [(True, CASTLE_BLACK_SHORT), (False, CASTLE_BLACK_LONG)]
+        king_home = home_rank + 4
+        if king != king_home:
+            return []
+
+        moves = []
+        their_color = color.opposite()
+        for kingside, flag in sides:
+            if not castling_rights & flag:
+                continue
+            rook_home = home_rank + 7 if kingside else home_rank
+            if not self._pieces[color.value][_ROOK] & (1 << rook_home):
+                continue
+            if BETWEEN[king_home][rook_home] & self._occupied:
+                continue
+            step = 1 if kingside else -1
+            if any(self.attackers_to(king_home + step * i, their_color) for i in (1, 2)):
+                continue
+            dest = king_home + 2 * step
+            moves.append(encode_move(king_home, dest, KINGSIDE_CASTLE if kingside else QUEENSIDE_CASTLE))
+        return moves
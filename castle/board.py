@@ -1,22 +1,38 @@
 from typing import List, Set, Optional
 from castle.square import Square
 from castle.piece import PieceType, Piece, Color
-from castle.move import Move, CastleMove, EnPassantMove, MoveParser
+from castle.move import Move, CastleMove, EnPassantMove, MoveParser, UndoRecord
+from castle.move import KINGSIDE_CASTLE, QUEENSIDE_CASTLE, EN_PASSANT, move_promotion
+from castle.zobrist import PIECE_KEYS
+from castle.evaluation import MIDGAME_SCORES, ENDGAME_SCORES, PHASE
 
 
 class InvalidChessNotationError(Exception):
     pass
 
 
+_KNIGHT_OFFSETS = [(2, -1), (2, 1), (-2, -1), (-2, 1), (1, -2), (-1, -2), (1, 2), (-1, 2)]
+_KING_OFFSETS = [(1, -1), (1, 0), (1, 1), (0, -1), (0, 1), (-1, -1), (-1, 0), (-1, 1)]
+_ORTHOGONAL_DIRECTIONS = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+_DIAGONAL_DIRECTIONS = [(1, 1), (1, -1), (-1, 1), (-1, -1)]
+
+
 class Board:
     def __init__(self):
         self._squares: List[List[Square]] = Board.construct_squares()
+        # Zobrist key of the pieces on the board, updated on every set_occupant()
+        self.zobrist_key = 0
+        # material and piece-square scores from white's point of view, and the game phase, also updated on every
+        # set_occupant(). See castle.evaluation.
+        self.midgame_score = 0
+        self.endgame_score = 0
+        self.phase = 0
 
     def clear(self):
         """Remove all occupants from the board. Typically used for testing purposes.
         """
-        for square in self.squares_occupied():
-            square.occupant = None
+        for square in list(self.squares_occupied()):
+            self.set_occupant(square, None)
 
     @classmethod
     def construct_squares(cls) -> List[List[Square]]:
@@ -29,10 +45,11 @@ class Board:
         return board
 
     def copy(self) -> 'Board':
-        clone = Board()
+        clone = type(self)()
         for square, copy_square in list(zip(self.squares_all(), clone.squares_all())):
             if square.occupant:
-                copy_square.occupant = Piece(square.occupant.type, square.occupant.color)
+                # pieces are immutable, so the clone can share them
+                clone.set_occupant(copy_square, square.occupant)
         return clone
 
     def copy_move(self, move: Move) -> Move:
@@ -45,14 +62,82 @@ class Board:
         return MoveParser.move_from_squares(from_square, to_square)
 
     def apply_move(self, move: Move):
+        self.make_move(move)
+
+    def make_move(self, move: Move) -> UndoRecord:
+        """Apply the Move to this board in place, and return the record needed to take it back with unmake_move().
+        """
         if type(move) == CastleMove:
             move: CastleMove = move
+            king_square = self.square_from_coord(0 if move.color == Color.WHITE else 7, 4)
+            undo = UndoRecord(moved_piece=king_square.occupant)
             move.apply(self)
+            return undo
         elif type(move) == EnPassantMove:
             move: EnPassantMove = move
+            undo = UndoRecord(move.unsafe_square.occupant, move.unsafe_square, moved_piece=move.attacker.occupant)
             move.apply(self)
+            return undo
+
+        moving_piece = move.from_square.occupant
+        undo = UndoRecord(move.to_square.occupant, move.to_square, moved_piece=moving_piece)
+        self.move_piece_to_square(move.from_square, move.to_square, move.promotion)
+        if move.to_square.occupant is not moving_piece:
+            undo.promoted_pawn = moving_piece
+        return undo
+
+    def unmake_move(self, move: Move, undo: UndoRecord) -> None:
+        """Restore the board to its state before make_move() was called with this Move.
+        """
+        if type(move) == CastleMove:
+            move: CastleMove = move
+            move.undo(self)
+            return
+        elif type(move) == EnPassantMove:
+            move: EnPassantMove = move
+            self.set_occupant(move.attacker, move.target_square.occupant)
+            self.set_occupant(move.target_square, None)
         else:
-            self.move_piece_to_square(move.from_square, move.to_square)
+            self.set_occupant(move.from_square, undo.promoted_pawn or move.to_square.occupant)
+            self.set_occupant(move.to_square, None)
+        if undo.captured_piece:
+            self.set_occupant(undo.captured_square, undo.captured_piece)
+
+    def move_from_code(self, code: int, undo: Optional[UndoRecord] = None) -> Move:
+        """Build the Move object for an encoded move, before it's made on this board.
+        A move which has already been made can be rebuilt by also providing the UndoRecord it was made with.
+        """
+        source = self.square_from_index(code & 63)
+        dest = self.square_from_index((code >> 6) & 63)
+        flags = code >> 12
+        moved_piece = undo.moved_piece if undo else source.occupant
+        if flags == KINGSIDE_CASTLE or flags == QUEENSIDE_CASTLE:
+            return CastleMove(moved_piece.color, flags == KINGSIDE_CASTLE)
+        if flags == EN_PASSANT:
+            unsafe_square = self.square_from_coord(source.rank, dest.file)
+            return EnPassantMove(dest, source, unsafe_square, moved_piece.color)
+        if not undo:
+            return MoveParser.move_from_squares(source, dest, move_promotion(code))
+
+        move = Move(moved_piece.color)
+        move.from_square = source
+        move.to_square = dest
+        move.active_piece = moved_piece
+        move.promotion = move_promotion(code)
+        if undo.captured_piece:
+            move.is_capture = True
+            move.captured_piece = undo.captured_piece
+        return move
+
+    def make_move_code(self, code: int) -> UndoRecord:
+        """make_move(), for an encoded move
+        """
+        return self.make_move(self.move_from_code(code))
+
+    def unmake_move_code(self, code: int, undo: UndoRecord) -> None:
+        """unmake_move(), for an encoded move
+        """
+        self.unmake_move(self.move_from_code(code, undo), undo)
 
     def board_after_move(self, move: Move) -> 'Board':
         """Clone the current board state and apply the provided Move to it, then return the board state.
@@ -76,6 +161,13 @@ class Board:
                 moves.add(move)
         return moves
 
+    def get_all_captures(self, color: Color) -> Set[Move]:
+        """Returns the subset of get_all_moves() which capture a piece or promote a pawn. Does not respect check!
+        """
+        last_rank = 7 if color == Color.WHITE else 0
+        return {move for move in self.get_all_moves(color)
+                if move.is_capture or (move.active_piece.type == PieceType.PAWN and move.to_square.rank == last_rank)}
+
     def get_moves(self, square: Square) -> Set[Square]:
         if square.occupant.type is PieceType.PAWN:
             return self._get_pawn_moves(square)
@@ -308,26 +400,48 @@ class Board:
                     continue
         return valid_adjacent_squares
 
+    def set_occupant(self, square: Square, piece: Optional[Piece]) -> None:
+        """Place a piece on a square, or empty it if piece is None.
+        Every change to the board's contents goes through here, so subclasses can maintain derived state.
+        """
+        index = square.index
+        previous = square.occupant
+        if previous:
+            color, piece_type = previous.color.value, previous.type.value
+            self.zobrist_key ^= PIECE_KEYS[color][piece_type][index]
+            self.midgame_score -= MIDGAME_SCORES[color][piece_type][index]
+            self.endgame_score -= ENDGAME_SCORES[color][piece_type][index]
+            self.phase -= PHASE[piece_type]
+        if piece:
+            color, piece_type = piece.color.value, piece.type.value
+            self.zobrist_key ^= PIECE_KEYS[color][piece_type][index]
+            self.midgame_score += MIDGAME_SCORES[color][piece_type][index]
+            self.endgame_score += ENDGAME_SCORES[color][piece_type][index]
+            self.phase += PHASE[piece_type]
+        square.occupant = piece
+
     def place_piece(self, piece: Piece, location: str) -> None:
         square = self.square_from_notation(location)
-        square.occupant = piece
+        self.set_occupant(square, piece)
 
-    def move_piece_to_square(self, from_square: Square, to_square: Square) -> None:
+    def move_piece_to_square(self,
+                             from_square: Square,
+                             to_square: Square,
+                             promotion: Optional[PieceType] = None) -> None:
         # TODO(PT): test this method
         # TODO(PT): this should also update defenders and attackers fields
         if not from_square.occupant:
             raise RuntimeError(f'Can\'t move {from_square} to {to_square}. No piece on {from_square}.')
         if to_square.occupant and to_square.occupant.color == from_square.occupant.color:
             raise InvalidChessNotationError(f'Can\'t move onto your own piece')
-        to_square.occupant = from_square.occupant
-        from_square.occupant = None
+        self.set_occupant(to_square, from_square.occupant)
+        self.set_occupant(from_square, None)
 
         # is this a pawn promotion?
         if to_square.occupant.type == PieceType.PAWN:
             top_rank = 7 if to_square.occupant.color == Color.WHITE else 0
             if to_square.rank == top_rank:
-                print(f'Promoting pawn at {to_square} to Queen. Flesh me out?')
-                to_square.occupant = Piece(PieceType.QUEEN, to_square.occupant.color)
+                self.set_occupant(to_square, Piece(promotion or PieceType.QUEEN, to_square.occupant.color))
 
     def move_piece_to_location(self, from_square: Square, location: str) -> None:
         # TODO(PT): test this method
@@ -348,6 +462,14 @@ class Board:
 
         return self.square_from_coord(rank, file)
 
+    def square_from_index(self, index: int) -> Square:
+        """The square at index rank * 8 + file
+        """
+        return self._squares[index >> 3][index & 7]
+
+    def piece_at(self, index: int) -> Optional[Piece]:
+        return self._squares[index >> 3][index & 7].occupant
+
     def square_from_coord(self, rank: int, file: int) -> Square:
         if file < 0 or file > 7 or rank < 0 or rank > 7:
             raise InvalidChessNotationError(f'({rank},{file})')
@@ -424,17 +546,50 @@ class Board:
 
             yield square
 
+    def _occupant_at(self, rank: int, file: int) -> Optional[Piece]:
+        if file < 0 or file > 7 or rank < 0 or rank > 7:
+            return None
+        return self._squares[rank][file].occupant
+
+    def is_square_attacked(self, square: Square, by_color: Color) -> bool:
+        """Could a piece of by_color capture on this square?
+        Rather than generating by_color's moves, this looks outward from the square for a knight, pawn or king a
+        single step away, or a slider at the end of a ray.
+        """
+        rank, file = square.rank, square.file
+        for rank_offset, file_offset in _KNIGHT_OFFSETS:
+            piece = self._occupant_at(rank + rank_offset, file + file_offset)
+            if piece and piece.color == by_color and piece.type is PieceType.KNIGHT:
+                return True
+        for rank_offset, file_offset in _KING_OFFSETS:
+            piece = self._occupant_at(rank + rank_offset, file + file_offset)
+            if piece and piece.color == by_color and piece.type is PieceType.KING:
+                return True
+
+        # pawns attack diagonally forwards, so look one rank backwards from their point of view
+        pawn_rank = rank - 1 if by_color == Color.WHITE else rank + 1
+        for pawn_file in [file - 1, file + 1]:
+            piece = self._occupant_at(pawn_rank, pawn_file)
+            if piece and piece.color == by_color and piece.type is PieceType.PAWN:
+                return True
+
+        for directions, slider_type in [(_ORTHOGONAL_DIRECTIONS, PieceType.ROOK),
+                                        (_DIAGONAL_DIRECTIONS, PieceType.BISHOP)]:
+            for rank_step, file_step in directions:
+                r, f = rank + rank_step, file + file_step
+                while 0 <= r <= 7 and 0 <= f <= 7:
+                    piece = self._squares[r][f].occupant
+                    if piece:
+                        if piece.color == by_color and piece.type in (slider_type, PieceType.QUEEN):
+                            return True
+                        break
+                    r += rank_step
+                    f += file_step
+        return False
+
     def is_in_check(self, color: Color) -> bool:
         """Can the opposite color capture the King on their next turn?
         """
-        # TODO(PT): test me
-        opponent_color = color.opposite()
-        opponent_moves = self.get_all_moves(opponent_color)
-        # look at all the moves for the opposite player's next turn, and see if one of them includes a king capture
-        for move in opponent_moves:
-            if not move.to_square.occupant:
-                continue
-            if move.to_square.occupant.type == PieceType.KING:
-                # the opponent can capture our king on the next move, we are in check
-                return True
+        for king_square in self.squares_matching_filter(type=PieceType.KING, color=color):
+            return self.is_square_attacked(king_square, color.opposite())
         return False
@@ -0,0 +1,166 @@
+from typing import List, Tuple
+
+from castle.piece import Piece, PieceType, Color
+
+# Piece-square tables, in centipawns, from white's point of view with rank 8 at the top, so they read like a board.
+# Black's tables are the same, mirrored vertically.
+_PAWN_MIDGAME = [
+    0,   0,   0,   0,   0,   0,   0,   0,
+    50,  50,  50,  50,  50,  50,  50,  50,
+    10,  10,  20,  30,  30,  20,  10,  10,
+    5,   5,   10,  25,  25,  10,  5,   5,
+    0,   0,   0,   20,  20,  0,   0,   0,
+    5,   -5,  -10, 0,   0,   -10, -5,  5,
+    5,   10,  10,  -20, -20, 10,  10,  5,
+    0,   0,   0,   0,   0,   0,   0,   0,
+]
+_PAWN_ENDGAME = [
+    0,   0,   0,   0,   0,   0,   0,   0,
+    80,  80,  80,  80,  80,  80,  80,  80,
+    50,  50,  50,  50,  50,  50,  50,  50,
+    30,  30,  30,  30,  30,  30,  30,  30,
+    20,  20,  20,  20,  20,  20,  20,  20,
+    10,  10,  10,  10,  10,  10,  10,  10,
+    0,   0,   0,   0,   0,   0,   0,   0,
+    0,   0,   0,   0,   0,   0,   0,   0,
+]
+_KNIGHT = [
+    -50, -40, -30, -30, -30, -30, -40, -50,
+    -40, -20, 0,   0,   0,   0,   -20, -40,
+    -30, 0,   10,  15,  15,  10,  0,   -30,
+    -30, 5,   15,  20,  20,  15,  5,   -30,
+    -30, 0,   15,  20,  20,  15,  0,   -30,
+    -30, 5,   10,  15,  15,  10,  5,   -30,
+    -40, -20, 0,   5,   5,   0,   -20, -40,
+    -50, -40, -30, -30, -30, -30, -40, -50,
+]
+_BISHOP = [
+    -20, -10, -10, -10, -10, -10, -10, -20,
+    -10, 0,   0,   0,   0,   0,   0,   -10,
+    -10, 0,   5,   10,  10,  5,   0,   -10,
+    -10, 5,   5,   10,  10,  5,   5,   -10,
+    -10, 0,   10,  10,  10,  10,  0,   -10,
+    -10, 10,  10,  10,  10,  10,  10,  -10,
+    -10, 5,   0,   0,   0,   0,   5,   -10,
+    -20, -10, -10, -10, -10, -10, -10, -20,
+]
+_ROOK = [
+    0,   0,   0,   0,   0,   0,   0,   0,
+    5,   10,  10,  10,  10,  10,  10,  5,
+    -5,  0,   0,   0,   0,   0,   0,   -5,
+    -5,  0,   0,   0,   0,   0,   0,   -5,
+    -5,  0,   0,   0,   0,   0,   0,   -5,
+    -5,  0,   0,   0,   0,   0,   0,   -5,
+    -5,  0,   0,   0,   0,   0,   0,   -5,
+    0,   0,   0,   5,   5,   0,   0,   0,
+]
+_QUEEN = [
+    -20, -10, -10, -5,  -5,  -10, -10, -20,
+    -10, 0,   0,   0,   0,   0,   0,   -10,
+    -10, 0,   5,   5,   5,   5,   0,   -10,
+    -5,  0,   5,   5,   5,   5,   0,   -5,
+    0,   0,   5,   5,   5,   5,   0,   -5,
+    -10, 5,   5,   5,   5,   5,   0,   -10,
+    -10, 0,   5,   0,   0,   0,   0,   -10,
+    -20, -10, -10, -5,  -5,  -10, -10, -20,
+]
+_KING_MIDGAME = [
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -20, -30, -30, -40, -40, -30, -30, -20,
+    -10, -20, -20, -20, -20, -20, -20, -10,
+    20,  20,  0,   0,   0,   0,   20,  20,
+    20,  30,  10,  0,   0,   10,  30,  20,
+]
+_KING_ENDGAME = [
+    -50, -40, -30, -20, -20, -30, -40, -50,
+    -30, -20, -10, 0,   0,   -10, -20, -30,
+    -30, -10, 20,  30,  30,  20,  -10, -30,
+    -30, -10, 30,  40,  40,  30,  -10, -30,
+    -30, -10, 30,  40,  40,  30,  -10, -30,
+    -30, -10, 20,  30,  30,  20,  -10, -30,
+    -30, -30, 0,   0,   0,   0,   -30, -30,
+    -50, -30, -30, -30, -30, -30, -30, -50,
+]
+
+_MIDGAME_TABLES = {
+    PieceType.PAWN: _PAWN_MIDGAME,
+    PieceType.KNIGHT: _KNIGHT,
+    PieceType.BISHOP: _BISHOP,
+    PieceType.ROOK: _ROOK,
+    PieceType.QUEEN: _QUEEN,
+    PieceType.KING: _KING_MIDGAME,
+}
+_ENDGAME_TABLES = {
+    PieceType.PAWN: _PAWN_ENDGAME,
+    PieceType.KNIGHT: _KNIGHT,
+    PieceType.BISHOP: _BISHOP,
+    PieceType.ROOK: _ROOK,
+    PieceType.QUEEN: _QUEEN,
+    PieceType.KING: _KING_ENDGAME,
+}
+
+# how much each piece counts towards the game phase. A board with all the starting pieces has MAX_PHASE, and the
+# evaluation moves from the midgame score towards the endgame score as pieces are traded off.
+_PHASE_WEIGHTS = {
+    PieceType.PAWN: 0,
+    PieceType.KNIGHT: 1,
+    PieceType.BISHOP: 1,
+    PieceType.ROOK: 2,
+    PieceType.QUEEN: 4,
+    PieceType.KING: 0,
+}
+MAX_PHASE = 24
+
+
+def _square_scores(tables: dict) -> List[List[List[int]]]:
+    """Material plus piece-square score for [color][piece type][square index], positive for white and negative for
+    black, so a position's score is the sum over its pieces
+    """
+    scores = [[[0] * 64 for _ in range(7)] for _ in range(2)]
+    for piece_type, table in tables.items():
+        # the king can never be captured, so it has no material value
+        material = 0 if piece_type == PieceType.KING else Piece(piece_type, Color.WHITE).value * 100
+        for index in range(64):
+            rank, file = index // 8, index % 8
+            scores[Color.WHITE.value][piece_type.value][index] = material + table[(7 - rank) * 8 + file]
+            scores[Color.BLACK.value][piece_type.value][index] = -(material + table[rank * 8 + file])
+    return scores
+
+
+# MIDGAME_SCORES[color.value][piece_type.value][square index], and likewise for the endgame
+MIDGAME_SCORES = _square_scores(_MIDGAME_TABLES)
+ENDGAME_SCORES = _square_scores(_ENDGAME_TABLES)
+# PHASE[piece_type.value]
+PHASE: List[int] = [0] + [_PHASE_WEIGHTS[PieceType(value)] for value in range(1, 7)]
+
+
+def tapered_score(midgame: int, endgame: int, phase: int) -> int:
+    """Blend the midgame and endgame scores by how much material is left on the board
+    """
+    phase = min(phase, MAX_PHASE)
+    return (midgame * phase + endgame * (MAX_PHASE - phase)) // MAX_PHASE
+
+
+def evaluate(board: 'Board', color: Color) -> int:
+    """Static evaluation of the board, in centipawns for `color`.
+    The board keeps its midgame and endgame scores and phase up to date as pieces move, so this is O(1).
+    """
+    score = tapered_score(board.midgame_score, board.endgame_score, board.phase)
+    return score if color == Color.WHITE else -score
+
+
+def compute_scores(board: 'Board') -> Tuple[int, int, int]:
+    """Compute a board's (midgame score, endgame score, phase) from scratch.
+    Boards maintain these incrementally, so this is only needed to verify them.
+    """
+    midgame, endgame, phase = 0, 0, 0
+    for square in board.squares_occupied():
+        color, piece_type = square.occupant.color.value, square.occupant.type.value
+        index = square.index
+        midgame += MIDGAME_SCORES[color][piece_type][index]
+        endgame += ENDGAME_SCORES[color][piece_type][index]
+        phase += PHASE[piece_type]
+    return midgame, endgame, phase
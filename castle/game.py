@@ -1,13 +1,117 @@
 import logging
 from enum import Enum
-from typing import List, Optional, Set
+from typing import Callable, Dict, List, Optional, Set, Tuple, Type
 
 from castle.board import Board, InvalidChessNotationError
+from castle.bitboard import BitBoard
 from castle.piece import Piece, PieceType, Color
-from castle.player import HumanPlayer, RandomPlayer
-from castle.move import Move, CastleMove, EnPassantMove, MoveParser, InvalidMoveError
+from castle.player import HumanPlayer, SearchPlayer
+from castle.move import Move, CastleMove, EnPassantMove, MoveParser, InvalidMoveError, UndoRecord
+from castle.move import CASTLE_WHITE_SHORT, CASTLE_WHITE_LONG, CASTLE_BLACK_SHORT, CASTLE_BLACK_LONG, CASTLE_ALL
+from castle.move import DOUBLE_PAWN_PUSH, CAPTURE, PROMOTION, move_coordinates
 from castle.player import PlayerType
+from castle.perft import PerftCache
+from castle.san import san
 from castle.square import Square
+from castle.zobrist import SIDE_TO_MOVE_KEY, CASTLING_KEYS, EN_PASSANT_KEYS
+
+
+# castling rights which are lost when a piece moves from or to the given square index, i.e. a king or rook leaves its
+# original square, or a rook is captured on it
+_CASTLING_RIGHTS_LOST_ON_SQUARE = [0] * 64
+_CASTLING_RIGHTS_LOST_ON_SQUARE[4] = CASTLE_WHITE_SHORT | CASTLE_WHITE_LONG
+_CASTLING_RIGHTS_LOST_ON_SQUARE[0] = CASTLE_WHITE_LONG
+_CASTLING_RIGHTS_LOST_ON_SQUARE[7] = CASTLE_WHITE_SHORT
+_CASTLING_RIGHTS_LOST_ON_SQUARE[60] = CASTLE_BLACK_SHORT | CASTLE_BLACK_LONG
+_CASTLING_RIGHTS_LOST_ON_SQUARE[56] = CASTLE_BLACK_LONG
+_CASTLING_RIGHTS_LOST_ON_SQUARE[63] = CASTLE_BLACK_SHORT
+
+# FEN castling symbols, in the order they're written
+CASTLING_BY_SYMBOL = {'K': CASTLE_WHITE_SHORT, 'Q': CASTLE_WHITE_LONG, 'k': CASTLE_BLACK_SHORT, 'q': CASTLE_BLACK_LONG}
+# FEN piece symbols: upper case for white and lower case for black
+FEN_PIECES = {
+    symbol if color == Color.WHITE else symbol.lower(): Piece(PieceType(value), color)
+    for value in range(PieceType.PAWN.value, PieceType.KING.value + 1)
+    for symbol in [PieceType.symbol_from_type(PieceType(value))]
+    for color in (Color.WHITE, Color.BLACK)
+}
+FEN_SYMBOLS = {piece: symbol for symbol, piece in FEN_PIECES.items()}
+
+
+def parse_fen(fen: str) -> Tuple[List[Tuple[int, Piece]], bool, int, Optional[int], int, int]:
+    """Split a position in Forsyth-Edwards Notation into its fields: the pieces, as (square index, piece), whether
+    black is to move, the castling rights, the en passant target square index, and the move clocks, which are
+    optional and default to 0 1. Raises InvalidChessNotationError if the FEN is malformed.
+    """
+    fields = fen.split()
+    if not 4 <= len(fields) <= 6:
+        raise InvalidChessNotationError(f'FEN needs 4 to 6 fields: {fen}')
+    placement, side_to_move, castling, en_passant = fields[:4]
+    ranks = placement.split('/')
+    if len(ranks) != 8 or side_to_move not in ('w', 'b'):
+        raise InvalidChessNotationError(f'Bad FEN: {fen}')
+
+    pieces = []
+    for rank, rank_str in zip(range(7, -1, -1), ranks):
+        index = rank * 8
+        end = index + 8
+        for char in rank_str:
+            if char.isdigit():
+                index += int(char)
+                continue
+            piece = FEN_PIECES.get(char)
+            if not piece or index >= end:
+                raise InvalidChessNotationError(f'Bad piece placement in FEN: {fen}')
+            pieces.append((index, piece))
+            index += 1
+        if index != end:
+            raise InvalidChessNotationError(f'Rank {rank + 1} doesn\'t have 8 squares in FEN: {fen}')
+
+    castling_rights = 0
+    if castling != '-':
+        for symbol in castling:
+            if symbol not in CASTLING_BY_SYMBOL:
+                raise InvalidChessNotationError(f'Bad castling rights in FEN: {fen}')
+            castling_rights |= CASTLING_BY_SYMBOL[symbol]
+    en_passant_index = None
+    if en_passant != '-':
+        # the square a pawn skipped over, which is only ever on the third or sixth rank
+        if len(en_passant) != 2 or not 'a' <= en_passant[0] <= 'h' or en_passant[1] not in '36':
+            raise InvalidChessNotationError(f'Bad en passant square in FEN: {fen}')
+        en_passant_index = (int(en_passant[1]) - 1) * 8 + ord(en_passant[0]) - ord('a')
+    try:
+        halfmove_clock = int(fields[4]) if len(fields) > 4 else 0
+        fullmove_number = int(fields[5]) if len(fields) > 5 else 1
+    except ValueError:
+        raise InvalidChessNotationError(f'Bad move clocks in FEN: {fen}')
+    return pieces, side_to_move == 'b', castling_rights, en_passant_index, halfmove_clock, fullmove_number
+
+
+def format_fen(piece_at: Callable[[int], Optional[Piece]], black_to_move: bool, castling_rights: int,
+               en_passant: Optional[int], halfmove_clock: int, fullmove_number: int) -> str:
+    """A position in Forsyth-Edwards Notation, from the piece on each square index and the other fields
+    """
+    ranks = []
+    for rank in range(7, -1, -1):
+        rank_str = ''
+        empty = 0
+        for index in range(rank * 8, rank * 8 + 8):
+            piece = piece_at(index)
+            if not piece:
+                empty += 1
+                continue
+            if empty:
+                rank_str += str(empty)
+                empty = 0
+            rank_str += FEN_SYMBOLS[piece]
+        if empty:
+            rank_str += str(empty)
+        ranks.append(rank_str)
+
+    castling = ''.join(symbol for symbol, flag in CASTLING_BY_SYMBOL.items() if castling_rights & flag)
+    en_passant_str = '-' if en_passant is None else f'{chr(ord("a") + (en_passant & 7))}{(en_passant >> 3) + 1}'
+    return f'{"/".join(ranks)} {"b" if black_to_move else "w"} {castling or "-"} {en_passant_str} ' \
+           f'{halfmove_clock} {fullmove_number}'
 
 
 class Winner(Enum):
@@ -25,29 +129,47 @@ class Winner(Enum):
 
 
 class Game:
-    def __init__(self, player1: PlayerType, player2: PlayerType) -> None:
-        self.board = Board()
-        self.moves: List[Move] = []
-        self.place_pieces_for_new_game()
+    def __init__(self,
+                 player1: PlayerType,
+                 player2: PlayerType,
+                 board_type: Type[Board] = BitBoard,
+                 fen: Optional[str] = None) -> None:
+        """The game starts from the standard starting position, or from the position in Forsyth-Edwards Notation
+        if one is provided
+        """
+        self.board = board_type()
+        # every move made so far, in its 16-bit encoding. The Move objects in self.moves are only built when asked for.
+        self.move_codes: List[int] = []
+        self._moves: List[Move] = []
+        # standard algebraic notation of the first moves in self.move_codes, filled in by san_history()
+        self._san_history: List[str] = []
+        if fen is None:
+            self.place_pieces_for_new_game()
+        # moves since the last capture or pawn move, and the number of the move being played, which starts at 1 and
+        # goes up after black moves
+        self.halfmove_clock = 0
+        self.fullmove_number = 1
 
         self.finished = False
         self.winner: Optional[Winner] = None
 
-        self.can_white_castle_short = True
-        self.can_white_castle_long = True
-        self.can_black_castle_short = True
-        self.can_black_castle_long = True
+        # bitmask of the CASTLE_* flags which are still allowed
+        self.castling_rights = CASTLE_ALL
         self.en_passant_target_square: Square = None
+        # one UndoRecord per entry in self.move_codes
+        self._undo_records: List[UndoRecord] = []
 
         if player1 == PlayerType.HUMAN:
             self.white_player = HumanPlayer(Color.WHITE)
         else:
-            self.white_player = RandomPlayer(Color.WHITE)
+            self.white_player = SearchPlayer(Color.WHITE, self)
         if player2 == PlayerType.HUMAN:
             self.black_player = HumanPlayer(Color.BLACK)
         else:
-            self.black_player = RandomPlayer(Color.BLACK)
+            self.black_player = SearchPlayer(Color.BLACK, self)
         self.current_player = self.white_player
+        if fen is not None:
+            self.load_fen(fen)
 
     def place_pieces_for_new_game(self) -> None:
         # white's pieces
@@ -93,8 +215,7 @@ class Game:
                 if type(move) == str:
                     move = MoveParser.parse_move(self, move)
 
-                legal_moves = self.get_all_legal_moves(self.current_player.color)
-                if move not in legal_moves:
+                if move.code not in self.generate_legal_codes():
                     raise InvalidMoveError('Illegal')
 
                 self.apply_move(move)
@@ -112,25 +233,24 @@ class Game:
         """Returns a set of all legal Moves from the current board state, respecting rules like check.
         This method does 'move post processing' to transform a pseudo-legal
         """
-        all_moves = self.board.get_all_moves(color)
-        legal_moves = all_moves.copy()
+        candidate_moves = self.board.get_all_moves(color)
 
         # add in en passant if possible
         # this must be done before restricting moves to ones that do not check for putting ourselves in check
-        if self.en_passant_target_square or self.en_passant_eligible():
+        if color == self.current_player.color and self.en_passant_eligible():
             logging.debug(f'en passant target square: {self.en_passant_target_square}')
             # add all pawns which are attacking the target square
             unsafe_square = self.en_passant_unsafe_square()
-
-            attackers = self.en_passant_attackers()
-            for attacker in attackers:
-                legal_moves.add(EnPassantMove(self.en_passant_target_square, attacker, unsafe_square))
+            for attacker in self.en_passant_attackers():
+                candidate_moves.add(EnPassantMove(self.en_passant_target_square, attacker, unsafe_square))
 
         # restrict moves to ones that do not result in the player being in check after this turn
-        for move in all_moves:
-            if self.board.board_after_move(move).is_in_check(color):
-                # throw this move away because it results in us being in check
-                legal_moves.remove(move)
+        legal_moves: Set[Move] = set()
+        for move in candidate_moves:
+            undo = self.board.make_move(move)
+            if not self.board.is_in_check(color):
+                legal_moves.add(move)
+            self.board.unmake_move(move, undo)
 
         # add in castle moves if possible
         for on_kingside in [True, False]:
@@ -141,88 +261,174 @@ class Game:
 
         return legal_moves
 
+    def generate_legal_moves(self, color: Optional[Color] = None) -> List[Move]:
+        """Returns a list of all legal Moves for the provided color, or the player to move if none is provided.
+        Unlike get_all_legal_moves(), this generates legal moves directly from the checking and pinned pieces rather
+        than trying every pseudo-legal move on the board, and includes underpromotions.
+        The list-based Board doesn't support this, and falls back to get_all_legal_moves().
+        """
+        color = color or self.current_player.color
+        if not isinstance(self.board, BitBoard):
+            moves = list(self.get_all_legal_moves(color))
+        else:
+            en_passant_square = self.en_passant_target_square if color == self.current_player.color else None
+            moves = self.board.generate_legal_moves(color, self.castling_rights, en_passant_square)
+        if color == self.current_player.color:
+            self._attach_position(moves)
+        return moves
+
+    def generate_legal_captures(self, color: Optional[Color] = None) -> List[Move]:
+        """Returns the legal captures and promotions for the provided color, or the player to move if none is provided.
+        The list-based Board falls back to filtering generate_legal_moves().
+        """
+        color = color or self.current_player.color
+        en_passant_square = self.en_passant_target_square if color == self.current_player.color else None
+        if not isinstance(self.board, BitBoard):
+            last_rank = 7 if color == Color.WHITE else 0
+            return [move for move in self.generate_legal_moves(color)
+                    if move.is_capture or (move.active_piece and
+                                           move.active_piece.type == PieceType.PAWN and
+                                           move.to_square.rank == last_rank)]
+        captures = self.board.generate_legal_captures(color, en_passant_square)
+        if color == self.current_player.color:
+            self._attach_position(captures)
+        return captures
+
+    def _attach_position(self, moves: List[Move]) -> None:
+        # generated moves work out their notation in this position, if it's ever asked for
+        position = (self, len(self.move_codes), self.zobrist_key)
+        for move in moves:
+            move._notation = None
+            move._position = position
+
+    def generate_legal_codes(self) -> List[int]:
+        """generate_legal_moves() for the player to move, returning each move's encoding instead of a Move
+        """
+        if not isinstance(self.board, BitBoard):
+            return [move.code for move in self.generate_legal_moves()]
+        return self.board.generate_legal_codes(self.current_player.color,
+                                               self.castling_rights,
+                                               self.en_passant_target_square)
+
+    def generate_legal_capture_codes(self) -> List[int]:
+        """generate_legal_captures() for the player to move, returning each move's encoding instead of a Move
+        """
+        if not isinstance(self.board, BitBoard):
+            return [move.code for move in self.generate_legal_captures()]
+        return self.board.generate_legal_capture_codes(self.current_player.color, self.en_passant_target_square)
+
+    def count_legal_moves(self) -> int:
+        """Returns the number of legal moves for the player to move, without constructing them where possible.
+        """
+        if not isinstance(self.board, BitBoard):
+            return len(self.generate_legal_moves())
+        return self.board.count_legal_moves(self.current_player.color,
+                                            self.castling_rights,
+                                            self.en_passant_target_square)
+
     # TODO(PT): spin off en passant logic into its own class?
     def en_passant_unsafe_square(self) -> Optional[Square]:
+        """The square of the pawn which can be captured en passant, i.e. the pawn which just moved two squares
+        """
         if not self.en_passant_target_square:
             return None
 
-        last_move = self.moves[-1]
-        return last_move.to_square
-
-    def en_passant_attackers(self, target_square: Square = None) -> Optional[List[Square]]:
-        if not len(self.moves):
-            return None
+        target = self.en_passant_target_square
+        # the pawn sits one rank past the target square, from the point of view of the player who moved it
+        rank = 4 if target.rank == 5 else 3
+        return self.board.square_from_coord(rank, target.file)
 
-        last_move = self.moves[-1]
+    def en_passant_attackers(self, target_square: Square = None) -> List[Square]:
         if not target_square:
             target_square = self.en_passant_target_square
 
         if not target_square:
-            return None
+            return []
 
-        # is there an opponent pawn attacking the target square?
-        attacker_files = [target_square.file - 1, target_square.file + 1]
+        # is there a pawn belonging to the player to move attacking the target square?
+        attacker_color = Color.WHITE if target_square.rank == 5 else Color.BLACK
+        attacker_rank = 4 if target_square.rank == 5 else 3
         attackers = []
-        for attacker_file in attacker_files:
-            attacker = list(self.board.squares_matching_filter(
-                color=last_move.active_piece.color.opposite(),
-                type=PieceType.PAWN,
-                file=attacker_file,
-                rank=last_move.to_square.rank
-            ))
-            attackers += attacker
+        for attacker_file in [target_square.file - 1, target_square.file + 1]:
+            if attacker_file < 0 or attacker_file > 7:
+                continue
+            attacker = self.board.square_from_coord(attacker_rank, attacker_file)
+            if attacker.occupant == Piece(PieceType.PAWN, attacker_color):
+                attackers.append(attacker)
         return attackers
 
     def en_passant_eligible(self) -> bool:
-        if not len(self.moves):
+        """Can the player to move capture en passant?
+        The target square is set whenever a pawn moves two squares, but is only usable if a pawn is attacking it.
+        """
+        if not self.en_passant_target_square:
             return False
+        return len(self.en_passant_attackers()) > 0
 
-        last_move = self.moves[-1]
+    @property
+    def zobrist_key(self) -> int:
+        """64-bit key identifying the position: pieces, side to move, castling rights and en passant file.
+        The board keeps the piece component up to date as moves are made and undone, so this is O(1).
+        """
+        key = self.board.zobrist_key ^ CASTLING_KEYS[self.castling_rights]
+        if self.current_player.color == Color.BLACK:
+            key ^= SIDE_TO_MOVE_KEY
+        if self.en_passant_target_square and self.en_passant_eligible():
+            key ^= EN_PASSANT_KEYS[self.en_passant_target_square.file]
+        return key
+
+    def _castle_flag_for_location(self, color: Color, kingside: bool) -> int:
+        can_castle_flag_map = {
+            (Color.WHITE, True): CASTLE_WHITE_SHORT,
+            (Color.WHITE, False): CASTLE_WHITE_LONG,
+            (Color.BLACK, True): CASTLE_BLACK_SHORT,
+            (Color.BLACK, False): CASTLE_BLACK_LONG,
+        }
+        return can_castle_flag_map[(color, kingside)]
 
-        # en passant isn't possible for castle moves, etc
-        if type(last_move) != Move:
-            return False
+    def disallow_castle_for_location(self, color: Color, kingside: bool):
+        self.castling_rights &= ~self._castle_flag_for_location(color, kingside)
 
-        # check if en passant applies
-        if last_move.active_piece.type != PieceType.PAWN:
-            return False
+    def _set_castle_flag(self, flag: int, allowed: bool) -> None:
+        if allowed:
+            self.castling_rights |= flag
+        else:
+            self.castling_rights &= ~flag
 
-        distance = last_move.to_square.rank - last_move.from_square.rank
-        abs_dist = abs(distance)
-        magnitude = 1 if distance > 0 else -1
+    @property
+    def can_white_castle_short(self) -> bool:
+        return bool(self.castling_rights & CASTLE_WHITE_SHORT)
 
-        # did they move two squares?
-        if abs_dist < 2:
-            return False
+    @can_white_castle_short.setter
+    def can_white_castle_short(self, allowed: bool) -> None:
+        self._set_castle_flag(CASTLE_WHITE_SHORT, allowed)
 
-        target_rank = last_move.from_square.rank + magnitude
-        target_square = self.board.square_from_coord(target_rank, last_move.from_square.file)
+    @property
+    def can_white_castle_long(self) -> bool:
+        return bool(self.castling_rights & CASTLE_WHITE_LONG)
 
-        # is there an opponent pawn attacking the target square?
-        if not len(self.en_passant_attackers(target_square)):
-            return False
+    @can_white_castle_long.setter
+    def can_white_castle_long(self, allowed: bool) -> None:
+        self._set_castle_flag(CASTLE_WHITE_LONG, allowed)
 
-        self.en_passant_target_square = target_square
-        return True
+    @property
+    def can_black_castle_short(self) -> bool:
+        return bool(self.castling_rights & CASTLE_BLACK_SHORT)
 
-    def _castle_flag_for_location(self, color: Color, kingside: bool):
-        can_castle_flag_map = {
-            (Color.WHITE, True): 'can_white_castle_short',
-            (Color.WHITE, False): 'can_white_castle_long',
-            (Color.BLACK, True): 'can_black_castle_short',
-            (Color.BLACK, False): 'can_black_castle_long',
-        }
-        can_castle_flag_name = can_castle_flag_map[(color, kingside)]
-        return can_castle_flag_name
+    @can_black_castle_short.setter
+    def can_black_castle_short(self, allowed: bool) -> None:
+        self._set_castle_flag(CASTLE_BLACK_SHORT, allowed)
 
-    def disallow_castle_for_location(self, color: Color, kingside: bool):
-        flag_name = self._castle_flag_for_location(color, kingside)
-        self.__setattr__(flag_name, False)
+    @property
+    def can_black_castle_long(self) -> bool:
+        return bool(self.castling_rights & CASTLE_BLACK_LONG)
+
+    @can_black_castle_long.setter
+    def can_black_castle_long(self, allowed: bool) -> None:
+        self._set_castle_flag(CASTLE_BLACK_LONG, allowed)
 
     def can_castle(self, color: Color, kingside: bool):
-        can_castle_flag_name = self._castle_flag_for_location(color, kingside)
-        can_castle_flag = self.__getattribute__(can_castle_flag_name)
-        if not can_castle_flag:
+        if not self.castling_rights & self._castle_flag_for_location(color, kingside):
             return False
 
         # are they in check?
@@ -252,16 +458,20 @@ class Game:
             if s.occupant:
                 return False
 
+        # the rook must still be in its corner
+        rook_square = self.board.square_from_coord(king_square.rank, 7 if kingside else 0)
+        if rook_square.occupant != Piece(PieceType.ROOK, color):
+            return False
+        # on the queenside, the square next to the rook must be empty too
+        if not kingside and self.board.square_from_coord(king_square.rank, 1).occupant:
+            return False
+
         # would moving on any of the squares on the way put the king in check?
+        # the last traveled square is the king's destination, so this also covers castling into check
         for s in traveled_squares:
-            move = MoveParser.move_from_squares(king_square, s)
-            if self.board.board_after_move(move).is_in_check(color):
+            if self.board.is_square_attacked(s, color.opposite()):
                 return False
 
-        # would castling put the player in check?
-        if self.board.board_after_move(CastleMove(color, kingside)).is_in_check(color):
-            return False
-
         return True
 
     def apply_notation(self, move_str: str) -> None:
@@ -269,26 +479,46 @@ class Game:
         self.apply_move(move)
 
     def apply_record(self, game_str: str) -> None:
-        # TODO spin off this logic into a better place
-        # XXX As is this assumes the board is in the starting position
-        from .fen_parser import Parser, EndOfStream
-        parser = Parser(game_str)
-        try:
-            move_idx = 1
-            while True:
-                parser.match_str(f'{move_idx}.')
-                # optional space
-                if parser.peek_tok() == ' ':
-                    parser.match(' ')
-
-                white_move = ''.join(parser.read_to(' '))
-                self.apply_notation(white_move)
-                black_move = ''.join(parser.read_to(' '))
-                self.apply_notation(black_move)
-
-                move_idx += 1
-        except EndOfStream:
-            pass
+        """Apply the moves of PGN movetext, such as '1. e4 e5 2. Nf3', from the current position.
+        Comments, NAGs and variations are skipped.
+        """
+        from castle.pgn import read_games
+        for record in read_games(game_str.splitlines()):
+            for notation in record.moves:
+                self.apply_notation(notation)
+
+    def load_fen(self, fen: str) -> None:
+        """Set up the position in Forsyth-Edwards Notation, replacing the board and the game so far.
+        The move clocks are optional, and default to 0 1.
+        """
+        pieces, black_to_move, castling_rights, en_passant, halfmove_clock, fullmove_number = parse_fen(fen)
+        board = self.board
+        board.clear()
+        for index, piece in pieces:
+            board.set_occupant(board.square_from_index(index), piece)
+        self.set_color_to_move(Color.BLACK if black_to_move else Color.WHITE)
+        self.castling_rights = castling_rights
+        self.en_passant_target_square = None if en_passant is None else board.square_from_index(en_passant)
+        self.halfmove_clock = halfmove_clock
+        self.fullmove_number = fullmove_number
+
+        self.move_codes = []
+        self._moves = []
+        self._san_history = []
+        self._undo_records = []
+        self.finished = False
+        self.winner = None
+
+    def to_fen(self) -> str:
+        """Returns the position in Forsyth-Edwards Notation
+        """
+        en_passant = self.en_passant_target_square
+        return format_fen(self.board.piece_at,
+                          self.current_player.color == Color.BLACK,
+                          self.castling_rights,
+                          en_passant.index if en_passant else None,
+                          self.halfmove_clock,
+                          self.fullmove_number)
 
     def swap_player(self):
         self.current_player = self.white_player if self.current_player == self.black_player else self.black_player
@@ -299,32 +529,126 @@ class Game:
         else:
             self.current_player = self.black_player
 
-    def apply_move(self, move: Move) -> None:
-        self.board.apply_move(move)
+    @property
+    def moves(self) -> List[Move]:
+        """Every move made so far. Moves are kept as their encodings, and Move objects are only built for them here.
+        """
+        for index in range(len(self._moves), len(self.move_codes)):
+            move = self.board.move_from_code(self.move_codes[index], self._undo_records[index])
+            move._notation = None
+            move._position = (self, index, None)
+            self._moves.append(move)
+        return self._moves
+
+    def san(self, move) -> str:
+        """The Move or encoded move in standard algebraic notation, in the current position. It must be legal.
+        """
+        return san(self, move if isinstance(move, int) else move.code)
+
+    def san_history(self) -> List[str]:
+        """Standard algebraic notation of every move made so far.
+        Each move's notation depends on the position before it, so the moves which haven't been written out yet are
+        taken back and replayed once. The result is kept until those moves are taken back.
+        """
+        if len(self._san_history) < len(self.move_codes):
+            codes = self.move_codes[len(self._san_history):]
+            # taking moves back drops their Move objects, so put the same ones back afterwards
+            moves = list(self._moves)
+            for _ in codes:
+                self.unmake_move_code()
+            for code in codes:
+                self._san_history.append(san(self, code))
+                self.make_move_code(code)
+            self._moves[len(self._moves):] = moves[len(self._moves):]
+        return self._san_history
+
+    def notation_at(self, code: int, ply: int, key: Optional[int]) -> Optional[str]:
+        """The standard algebraic notation of an encoded move played after `ply` moves, or None if the game no longer
+        knows that position. A key of None means the move is the one made at that ply.
+        """
+        if key is None:
+            if ply < len(self.move_codes) and self.move_codes[ply] == code:
+                return self.san_history()[ply]
+        elif ply == len(self.move_codes) and key == self.zobrist_key:
+            return san(self, code)
+        return None
+
+    def make_move(self, move: Move) -> None:
+        """Apply the Move and update the game state, without checking whether the game has ended.
+        This is the fast path used by perft and search; it can be taken back with unmake_move().
+        """
+        self.make_move_code(move.code)
+        # keep the Move object, so self.moves doesn't have to rebuild it
+        if len(self._moves) == len(self.move_codes) - 1:
+            # whatever notation the move came with may have been written without the position, so it's worked out
+            # again from the game's history
+            move._notation = None
+            move._position = (self, len(self._moves), None)
+            self._moves.append(move)
+
+    def make_move_code(self, code: int) -> None:
+        """make_move(), for an encoded move
+        """
+        undo = self.board.make_move_code(code)
+        undo.castling_rights = self.castling_rights
+        undo.en_passant_square = self.en_passant_target_square
+        undo.halfmove_clock = self.halfmove_clock
+        self._undo_records.append(undo)
+        if (code >> 12) & (CAPTURE | PROMOTION) or undo.moved_piece.type is PieceType.PAWN:
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+        if self.current_player.color == Color.BLACK:
+            self.fullmove_number += 1
 
         # update game state
-        self.moves.append(move)
-        previous_player = self.current_player
+        self.move_codes.append(code)
         self.swap_player()
         self.en_passant_target_square = None
 
-        if type(move) == CastleMove:
-            # this castle will not be allowed again
-            move: CastleMove = move
-            self.disallow_castle_for_location(move.color, move.kingside)
-        elif type(move) == EnPassantMove:
-            pass
-        else:
-            # also can't castle if a player moves their king
-            if move.active_piece.type == PieceType.KING:
-                self.disallow_castle_for_location(move.color, True)
-                self.disallow_castle_for_location(move.color, False)
-            # lastly, can't castle on a given side if you move that rook
-            if move.active_piece.type == PieceType.ROOK:
-                if move.from_square in [self.board.square_from_notation('a1'), self.board.square_from_notation('a8')]:
-                    self.disallow_castle_for_location(move.color, False)
-                elif move.from_square in [self.board.square_from_notation('h1'), self.board.square_from_notation('h8')]:
-                    self.disallow_castle_for_location(move.color, True)
+        source = code & 63
+        dest = (code >> 6) & 63
+        # can't castle once the king or rook has left its square, or if the rook was captured. Castling is encoded as
+        # the king's movement, so this covers it too.
+        lost_rights = _CASTLING_RIGHTS_LOST_ON_SQUARE[source] | _CASTLING_RIGHTS_LOST_ON_SQUARE[dest]
+        if lost_rights:
+            self.castling_rights &= ~lost_rights
+        # a pawn which moved two squares can be captured en passant on the square it skipped
+        if code >> 12 == DOUBLE_PAWN_PUSH:
+            self.en_passant_target_square = self.board.square_from_index((source + dest) // 2)
+
+    def unmake_move(self) -> Move:
+        """Take back the last move made with make_move(), and return it
+        """
+        if not len(self.move_codes):
+            raise InvalidMoveError('Can\'t undo from starting position')
+        last_move = self.moves[-1]
+        self.unmake_move_code()
+        return last_move
+
+    def unmake_move_code(self) -> int:
+        """unmake_move(), returning the encoding of the move taken back
+        """
+        code = self.move_codes.pop()
+        undo = self._undo_records.pop()
+        if len(self._moves) > len(self.move_codes):
+            self._moves.pop()
+        if len(self._san_history) > len(self.move_codes):
+            self._san_history.pop()
+        self.board.unmake_move_code(code, undo)
+        self.castling_rights = undo.castling_rights
+        self.en_passant_target_square = undo.en_passant_square
+        self.halfmove_clock = undo.halfmove_clock
+
+        # restore active player
+        self.swap_player()
+        if self.current_player.color == Color.BLACK:
+            self.fullmove_number -= 1
+        return code
+
+    def apply_move(self, move: Move) -> None:
+        previous_player = self.current_player
+        self.make_move(move)
 
         # endgame detection
         if self.is_in_checkmate(self.current_player.color):
@@ -356,51 +680,104 @@ class Game:
         return None
 
     def undo_move(self):
-        if not len(self.moves):
-            raise InvalidMoveError('Can\'t undo from starting position')
-
-        # TODO(PT): test me please!
-        last_move = self.moves.pop()
-        last_move.undo(self.board)
-
-        # restore the previous occupant of the square, if any
-        if last_move.is_capture:
-            self.board.place_piece(last_move.captured_piece, last_move.to_square.notation())
-
-        # restore active player
-        self.swap_player()
+        self.unmake_move()
+        self.finished = False
+        self.winner = None
 
-    def perft(self, depth: int) -> int:
-        moves = self.get_all_legal_moves(self.current_player.color)
+    def perft(self, depth: int, cache: Optional[PerftCache] = None) -> int:
+        """Count the leaf nodes of the legal move tree to the given depth.
+        If a PerftCache is provided, subtrees which were already counted from a transposed position are reused.
+        """
+        if cache is not None:
+            return self.perft_report(depth, cache)[-1] if depth else 1
+        if depth == 0:
+            return 1
         if depth == 1:
-            return len(moves)
+            return self.count_legal_moves()
         game_states = 0
 
-        for move in moves:
-            self.apply_move(move)
+        for code in self.generate_legal_codes():
+            self.make_move_code(code)
             game_states += self.perft(depth - 1)
-            self.undo_move()
+            self.unmake_move_code()
         return game_states
 
+    def perft_report(self, depth: int, cache: Optional[PerftCache] = None) -> List[int]:
+        """Returns the perft counts for every depth from 1 to the given depth, from a single walk of the move tree.
+        Element i of the result is the number of nodes i + 1 plies from the current position.
+        """
+        if depth == 0:
+            return []
+
+        key = 0
+        if cache is not None:
+            key = self.zobrist_key
+            cached = cache.get(key, depth)
+            if cached is not None:
+                return list(cached)
+
+        if depth == 1:
+            counts = [self.count_legal_moves()]
+        else:
+            codes = self.generate_legal_codes()
+            counts = [len(codes)] + [0] * (depth - 1)
+            for code in codes:
+                self.make_move_code(code)
+                for i, count in enumerate(self.perft_report(depth - 1, cache), 1):
+                    counts[i] += count
+                self.unmake_move_code()
+
+        if cache is not None:
+            cache.put(key, depth, tuple(counts))
+        return counts
+
+    def divide(self, depth: int, cache: Optional[PerftCache] = None) -> Dict[str, int]:
+        """Returns the perft count below each legal root move, keyed by the move's coordinate notation (e2e4).
+        Comparing this against another engine's divide output narrows a perft mismatch down to a single move.
+        """
+        counts = {}
+        for code in self.generate_legal_codes():
+            self.make_move_code(code)
+            counts[move_coordinates(code)] = self.perft(depth - 1, cache)
+            self.unmake_move_code()
+        return counts
+
+    def perft_parallel(self, depth: int, workers: Optional[int] = None, frontier_depth: int = 1) -> int:
+        """perft(), with the subtrees below the first `frontier_depth` plies counted across a process pool.
+        Uses one worker per CPU unless a worker count is provided.
+        """
+        if depth == 0:
+            return 1
+        return sum(self.divide_parallel(depth, workers, frontier_depth).values())
+
+    def divide_parallel(self, depth: int, workers: Optional[int] = None, frontier_depth: int = 1) -> Dict[str, int]:
+        """divide(), with the subtrees counted across a process pool. See castle.perft.divide_parallel().
+        """
+        from castle.perft import divide_parallel
+        return divide_parallel(self, depth, workers, frontier_depth)
+
+    def print_divide(self, depth: int) -> Dict[str, int]:
+        counts = self.divide(depth, PerftCache())
+        for notation, count in sorted(counts.items()):
+            print(f'{notation}: {count}')
+        print(f'total: {sum(counts.values())}')
+        return counts
+
     def print_perft(self, depth: int) -> List[int]:
-        perfts = []
-        for i in range(1, depth+1):
-            perft = self.perft(i)
+        perfts = self.perft_report(depth, PerftCache())
+        for i, perft in enumerate(perfts, 1):
             print(f'perft({i}) = {perft}')
-            perfts.append(perft)
         return perfts
 
     def is_in_checkmate(self, color: Color) -> bool:
         """Can the opposite color capture the King on their next turn, and the playing color has no way out of this?
         """
-        # TODO(PT): test me
-        return self.board.is_in_check(color) and len(self.get_all_legal_moves(color)) == 0
+        return self.board.is_in_check(color) and len(self.generate_legal_moves(color)) == 0
 
     def is_in_stalemate(self, color: Color) -> bool:
         """Does the King have no legal moves?
         """
-        # TODO(PT): test me
-        return not self.board.is_in_check(color) and len(self.get_all_legal_moves(color)) == 0
+        return not self.board.is_in_check(color) and len(self.generate_legal_moves(color)) == 0
 
     def moves_matching_filter(self,
                               color: Color = None,
@@ -0,0 +1,293 @@
+import argparse
+import collections
+import contextlib
+import cProfile
+import functools
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from typing import Any, Callable, Counter, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from castle.bitboard import BitBoard
+from castle.board import Board
+from castle.game import Game
+from castle.player import PlayerType
+from castle.search import Search
+from castle.transposition import TranspositionTable
+
+# Opt-in instrumentation of the engine's hot paths, and profiling of perft and search runs:
+#   python -m castle.instrument perft --depth 4 --mode counters
+#   python -m castle.instrument search --depth 5 --mode sample --output search.folded
+# Counters work by replacing methods on their classes with counting wrappers while instrumentation is enabled, and
+# putting the originals back when it's disabled, so there's no cost at all when it's off. Methods looked up before
+# instrumentation was enabled, e.g. bound to a local variable, aren't counted.
+
+_CLASSES = {cls.__name__: cls for cls in (Game, Board, BitBoard, Search, TranspositionTable)}
+
+# the methods instrumented by default
+HOT_FUNCTIONS = [
+    'Game.get_all_legal_moves',
+    'Game.generate_legal_moves',
+    'Game.generate_legal_codes',
+    'Game.count_legal_moves',
+    'Game.make_move',
+    'Game.make_move_code',
+    'Game.unmake_move_code',
+    'Game.apply_move',
+    'Game.load_fen',
+    'Board.copy',
+    'Board.is_in_check',
+    'Board.make_move_code',
+    'BitBoard.is_in_check',
+    'BitBoard.generate_legal_codes',
+    'BitBoard.count_legal_moves',
+    'BitBoard.make_move_code',
+    'BitBoard.unmake_move_code',
+    'Search.run',
+    'Search._negamax',
+    'Search._quiescence',
+    'TranspositionTable.probe',
+    'TranspositionTable.store',
+]
+
+
+class FunctionStats:
+    """Calls to one instrumented method, and the time spent in them. The time of a recursive method is only counted
+    for its outermost call, so it's never counted twice.
+    """
+    __slots__ = ('calls', 'seconds', 'active')
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.seconds = 0.0
+        # inside a call already, for recursion
+        self.active = False
+
+
+_stats: Dict[str, FunctionStats] = {}
+# the original of each method replaced by a wrapper
+_originals: Dict[str, Callable] = {}
+
+
+def _resolve(target: str) -> Tuple[type, str]:
+    class_name, _, name = target.partition('.')
+    cls = _CLASSES.get(class_name)
+    if cls is None or name not in vars(cls) or not callable(vars(cls)[name]):
+        raise ValueError(f'can\'t instrument {target}')
+    return cls, name
+
+
+def _wrap(function: Callable, entry: FunctionStats) -> Callable:
+    perf_counter = time.perf_counter
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        entry.calls += 1
+        if entry.active:
+            return function(*args, **kwargs)
+        entry.active = True
+        start = perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            entry.seconds += perf_counter() - start
+            entry.active = False
+    return wrapper
+
+
+def enable(targets: Optional[Iterable[str]] = None) -> None:
+    """Start counting calls to the methods, given as 'Class.method', or to HOT_FUNCTIONS.
+    The counts aren't thread-safe, so instrument one search or perft at a time.
+    """
+    for target in targets or HOT_FUNCTIONS:
+        if target in _originals:
+            continue
+        cls, name = _resolve(target)
+        entry = _stats.setdefault(target, FunctionStats())
+        _originals[target] = vars(cls)[name]
+        setattr(cls, name, _wrap(_originals[target], entry))
+
+
+def disable() -> None:
+    """Put back every instrumented method. The counts are kept until reset().
+    """
+    for target, original in _originals.items():
+        cls, name = _resolve(target)
+        setattr(cls, name, original)
+    _originals.clear()
+
+
+def is_enabled() -> bool:
+    return bool(_originals)
+
+
+def reset() -> None:
+    for entry in _stats.values():
+        entry.calls = 0
+        entry.seconds = 0.0
+
+
+@contextlib.contextmanager
+def instrumented(targets: Optional[Iterable[str]] = None) -> Iterator[None]:
+    """Count calls to the methods while the block runs, starting from zero
+    """
+    reset()
+    enable(targets)
+    try:
+        yield
+    finally:
+        disable()
+
+
+def snapshot() -> Dict[str, Dict[str, float]]:
+    """A copy of the counts so far: calls and seconds for each method that's been called
+    """
+    return {target: {'calls': entry.calls, 'seconds': entry.seconds}
+            for target, entry in _stats.items() if entry.calls}
+
+
+def format_stats(stats: Dict[str, Dict[str, float]]) -> str:
+    lines = [f'{"function":<32} {"calls":>10} {"seconds":>9} {"us/call":>9}']
+    for target, entry in sorted(stats.items(), key=lambda item: -item[1]['seconds']):
+        per_call = entry['seconds'] / entry['calls'] * 1e6 if entry['calls'] else 0.0
+        lines.append(f'{target:<32} {entry["calls"]:>10} {entry["seconds"]:>9.4f} {per_call:>9.2f}')
+    return '\n'.join(lines)
+
+
+def profile(function: Callable, *args, path: Optional[str] = None, sort: str = 'cumulative', limit: int = 25,
+            **kwargs) -> Tuple[Any, str]:
+    """Run the function under cProfile, and return its result with a report of the most expensive functions.
+    The raw profile is written to `path` if one is given, for pstats or a viewer like snakeviz.
+    """
+    profiler = cProfile.Profile()
+    result = profiler.runcall(function, *args, **kwargs)
+    if path:
+        profiler.dump_stats(path)
+    report = io.StringIO()
+    pstats.Stats(profiler, stream=report).sort_stats(sort).print_stats(limit)
+    return result, report.getvalue()
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f'{os.path.basename(code.co_filename)}:{code.co_name}'
+
+
+class SamplingProfiler:
+    """Samples the stack of the thread which started it, every `interval` seconds, from a background thread.
+    Unlike cProfile, it doesn't slow down the code being measured, beyond the time the sampling thread takes.
+    """
+    def __init__(self, interval: float = 0.001) -> None:
+        self.interval = interval
+        # how often each stack, outermost frame first, was seen
+        self.stacks: Counter[Tuple[str, ...]] = collections.Counter()
+        self._target: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def __enter__(self) -> 'SamplingProfiler':
+        self.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        self._target = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(reversed(stack))] += 1
+
+    @property
+    def samples(self) -> int:
+        return sum(self.stacks.values())
+
+    def leaf_counts(self) -> Counter[str]:
+        """Samples by the function which was running, i.e. each function's own time
+        """
+        counts: Counter[str] = collections.Counter()
+        for stack, count in self.stacks.items():
+            counts[stack[-1]] += count
+        return counts
+
+    def inclusive_counts(self) -> Counter[str]:
+        """Samples by every function on the stack, i.e. each function's time including what it called
+        """
+        counts: Counter[str] = collections.Counter()
+        for stack, count in self.stacks.items():
+            for name in set(stack):
+                counts[name] += count
+        return counts
+
+    def report(self, limit: int = 25) -> str:
+        total = self.samples or 1
+        inclusive = self.inclusive_counts()
+        lines = [f'{self.samples} samples', f'{"own":>6} {"total":>6}  function']
+        for name, count in self.leaf_counts().most_common(limit):
+            lines.append(f'{count / total:>6.1%} {inclusive[name] / total:>6.1%}  {name}')
+        return '\n'.join(lines)
+
+    def dump(self, path: str) -> None:
+        """Write the stacks in the folded format flame graph tools read: one 'outer;inner count' line per stack
+        """
+        with open(path, 'w') as folded_file:
+            for stack, count in self.stacks.most_common():
+                folded_file.write(f'{";".join(stack)} {count}\n')
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description='instrument or profile a perft or search run')
+    parser.add_argument('run', choices=['perft', 'search'])
+    parser.add_argument('--fen', help='position to start from, the starting position by default')
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--mode', choices=['counters', 'cprofile', 'sample'], default='counters')
+    parser.add_argument('--output', help='write the cProfile stats, or the sampled stacks in folded format, here')
+    args = parser.parse_args(argv)
+
+    game = Game(PlayerType.HUMAN, PlayerType.HUMAN, fen=args.fen)
+    if args.run == 'perft':
+        def run() -> Any:
+            return game.perft(args.depth)
+    else:
+        def run() -> Any:
+            return Search(game, max_depth=args.depth).run()
+
+    if args.mode == 'counters':
+        with instrumented():
+            result = run()
+        print(result)
+        print(format_stats(snapshot()))
+    elif args.mode == 'cprofile':
+        result, report = profile(run, path=args.output)
+        print(result)
+        print(report)
+    else:
+        with SamplingProfiler() as sampler:
+            result = run()
+        print(result)
+        print(sampler.report())
+        if args.output:
+            sampler.dump(args.output)
+
+
+if __name__ == '__main__':
+    main()
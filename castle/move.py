@@ -1,162 +1,218 @@
 from castle.piece import Piece, PieceType, Color
 from castle.square import Square
-from typing import List
+from typing import List, Optional
+
+
+# castling rights, as stored in Game.castling_rights
+CASTLE_WHITE_SHORT = 1
+CASTLE_WHITE_LONG = 2
+CASTLE_BLACK_SHORT = 4
+CASTLE_BLACK_LONG = 8
+CASTLE_ALL = CASTLE_WHITE_SHORT | CASTLE_WHITE_LONG | CASTLE_BLACK_SHORT | CASTLE_BLACK_LONG
+
+# Internally, moves are 16-bit ints: the source square index in bits 0-5, the destination square index in bits 6-11,
+# and flags for the kind of move in bits 12-15. Square indexes are rank * 8 + file, and castling is encoded as the
+# king's movement. Move objects are only built from these where they're handed out through the API.
+QUIET = 0
+DOUBLE_PAWN_PUSH = 1
+KINGSIDE_CASTLE = 2
+QUEENSIDE_CASTLE = 3
+CAPTURE = 4
+EN_PASSANT = 5
+# set for every promotion, with the promotion piece in the low two bits. A promotion can also be a CAPTURE.
+PROMOTION = 8
+PROMOTION_PIECES = [PieceType.KNIGHT, PieceType.BISHOP, PieceType.ROOK, PieceType.QUEEN]
+# a1 to a1 can't be played, so 0 is free to mean 'no move'
+NO_MOVE = 0
+
+
+def encode_move(source: int, dest: int, flags: int = QUIET) -> int:
+    return source | (dest << 6) | (flags << 12)
+
+
+def move_source(code: int) -> int:
+    return code & 63
+
+
+def move_dest(code: int) -> int:
+    return (code >> 6) & 63
+
+
+def move_flags(code: int) -> int:
+    return code >> 12
+
+
+def move_promotion(code: int) -> Optional[PieceType]:
+    flags = code >> 12
+    if flags & PROMOTION:
+        return PROMOTION_PIECES[flags & 3]
+    return None
+
+
+def move_coordinates(code: int) -> str:
+    """The move's coordinate notation, as in Move.coordinate_notation(): e2e4, e7e8q
+    """
+    source = code & 63
+    dest = (code >> 6) & 63
+    notation = f'{Square.index_to_file(source & 7)}{(source >> 3) + 1}{Square.index_to_file(dest & 7)}{(dest >> 3) + 1}'
+    promotion = move_promotion(code)
+    if promotion:
+        notation += PieceType.symbol_from_type(promotion).lower()
+    return notation
 
 
 class InvalidMoveError(Exception):
     pass
 
 
+class UndoRecord:
+    """Everything Board.unmake_move() and Game.undo_move() need to take back a move, which isn't stored on the Move.
+    Board.make_move() fills in the board fields, and Game fills in the game state it owned before the move.
+    """
+    __slots__ = ('captured_piece', 'captured_square', 'promoted_pawn', 'moved_piece', 'castling_rights',
+                 'en_passant_square', 'halfmove_clock')
+
+    def __init__(self,
+                 captured_piece: Optional[Piece] = None,
+                 captured_square: Optional[Square] = None,
+                 promoted_pawn: Optional[Piece] = None,
+                 moved_piece: Optional[Piece] = None) -> None:
+        self.captured_piece = captured_piece
+        self.captured_square = captured_square
+        # the pawn which was replaced by a promoted piece, if this move was a promotion
+        self.promoted_pawn = promoted_pawn
+        # the piece which moved (the king, for castling), so the move can be rebuilt from its encoding
+        self.moved_piece = moved_piece
+        self.castling_rights: int = 0
+        self.en_passant_square: Optional[Square] = None
+        self.halfmove_clock = 0
+
+
 class Move:
     def __init__(self, color: Color, notation: str = None):
         self.color = color
-        self.notation = notation
+        self._notation = notation
         self.from_square: Square = None
         self.to_square: Square = None
         self.is_capture = False
         self.active_piece: Piece = None
         self.captured_piece: Piece = None
+        # piece type a pawn becomes when it reaches the last rank. Queen is used if this is not set.
+        self.promotion: Optional[PieceType] = None
+        # (game, ply, zobrist key) of the position the move is played from, if a Game handed it out. This is what lets
+        # the notation be worked out lazily, since it depends on the position.
+        self._position: Optional[tuple] = None
+
+    @property
+    def notation(self) -> str:
+        """The move in standard algebraic notation. Moves handed out by a Game only work this out when it's asked
+        for, and then keep it.
+        """
+        if self._notation is None and self._position:
+            game, ply, key = self._position
+            self._notation = game.notation_at(self.code, ply, key)
+        if self._notation is None and self.from_square and self.to_square:
+            # without the position, other pieces which could reach the same square and checks can't be shown, so
+            # this isn't kept, in case the move is given a position later
+            return MoveParser.notation_from_move(self)
+        return self._notation
+
+    @notation.setter
+    def notation(self, notation: str) -> None:
+        self._notation = notation
+
+    @property
+    def code(self) -> int:
+        """The move's 16-bit encoding. See encode_move().
+        """
+        source = self.from_square.index
+        dest = self.to_square.index
+        flags = CAPTURE if self.is_capture else QUIET
+        piece = self.active_piece or self.from_square.occupant
+        if piece and piece.type == PieceType.PAWN:
+            if self.promotion or self.to_square.rank in (0, 7):
+                flags |= PROMOTION | PROMOTION_PIECES.index(self.promotion or PieceType.QUEEN)
+            elif abs(self.to_square.rank - self.from_square.rank) == 2:
+                flags = DOUBLE_PAWN_PUSH
+        return encode_move(source, dest, flags)
+
+    def _identity(self) -> int:
+        # the squares and promotion piece, which is what tells moves from the same position apart
+        identity = self.from_square.index | (self.to_square.index << 6)
+        if self.promotion:
+            identity |= self.promotion.value << 12
+        return identity
 
     def __eq__(self, other: 'Move'):
-        # TODO(PT): test me!
-        if self.color != other.color:
-            return False
-        if self.to_square.notation() != other.to_square.notation():
+        if type(other) != type(self):
             return False
-        if self.from_square.notation() != other.from_square.notation():
+        if self.color != other.color:
             return False
-        # XXX(PT): this does not check the generated notation (since it can vary depending on the source of the Move),
-        # or the is_capture flag.
-        return True
+        # this does not check the notation (since it can vary depending on the source of the Move), or the is_capture
+        # flag
+        return self._identity() == other._identity()
 
     def __hash__(self):
-        return hash((self.color, self.from_square.notation(), self.to_square.notation()))
+        return hash((self.color, self._identity()))
 
     def __repr__(self):
         return f'({self.from_square.notation()}{self.to_square.notation()})'
 
+    def coordinate_notation(self) -> str:
+        """The move as source and destination squares, plus the promotion piece if any: e2e4, e7e8q
+        """
+        notation = f'{self.from_square.notation()}{self.to_square.notation()}'
+        if self.promotion:
+            notation += PieceType.symbol_from_type(self.promotion).lower()
+        return notation
+
     def undo(self, board: 'Board'):
         board.move_piece_to_square(self.to_square, self.from_square)
 
 
 class MoveParser:
     @classmethod
-    def move_from_squares(cls, source: Square, dest: Square) -> Move:
+    def move_from_squares(cls, source: Square, dest: Square, promotion: Optional[PieceType] = None) -> Move:
         if not source.occupant:
             raise RuntimeError(f'can\'t move from a square with no occupant {source}')
         move = Move(source.occupant.color)
         move.from_square = source
         move.to_square = dest
         move.active_piece = source.occupant
+        move.promotion = promotion
         if dest.occupant:
             move.is_capture = True
             move.captured_piece = dest.occupant
             if source.occupant.color == dest.occupant.color:
                 raise RuntimeError(f'can\'t capture another piece of the same color')
-        move.notation = MoveParser.notation_from_move(move)
         return move
 
     @classmethod
     def notation_from_move(cls, move: Move):
-        notation = f''
-        notation += PieceType.symbol_from_type(move.from_square.occupant.type)
-        notation += Square.index_to_file(move.from_square.file)
-        if move.is_capture:
-            notation += 'x'
+        """The move's algebraic notation, from the move alone. See castle.san for notation in the context of a game.
+        """
+        if move.active_piece.type == PieceType.PAWN:
+            notation = Square.index_to_file(move.from_square.file) + 'x' if move.is_capture else ''
+        else:
+            notation = PieceType.symbol_from_type(move.active_piece.type) + ('x' if move.is_capture else '')
         notation += move.to_square.notation()
-        # internally MoveParser will prepend P to pawn moves; clean it up.
-        notation = notation.strip('P')
+        if move.promotion:
+            notation += f'={PieceType.symbol_from_type(move.promotion)}'
         return notation
 
     @staticmethod
-    #def parse_move(board: 'Board', active_color: Color, move_str: str) -> Move:
     def parse_move(game: 'Game', move_str: str) -> Move:
         """Parses chess notation in the context of the board, and returns the piece which is moving and its destination.
+        See castle.san.parse_san(), which does the work on encoded moves.
         """
         from castle.board import InvalidChessNotationError
-        from castle.game import Game
-
-        game: Game = game
-        active_color = game.current_player.color
-        board = game.board
+        from castle.san import parse_san
 
         if not len(move_str):
             raise InvalidChessNotationError('Non-empty chess move required')
-
-        # castle?
-        if move_str == CastleMove.KINGSIDE_NOTATION:
-            return CastleMove(active_color, True)
-        elif move_str == CastleMove.QUEENSIDE_NOTATION:
-            return CastleMove(active_color, False)
-
-        move = Move(active_color, move_str)
-        # if a pawn is being moved, prepend a P to the notation string so pawn movements are internally
-        # consistent with other piece's movement. This is so all pieces can be handled with the same logic.
-        if move_str[0].islower():
-            move_str = f'P{move_str}'
-
-        # is it a capture? SxDD
-        if 'x' in move_str:
-            move.is_capture = True
-            # TODO(PT): test for Nexd6
-            from_square = move_str[:move_str.find('x')]
-            to_square_str = move_str[move_str.find('x')+1:]
-            move.to_square = board.square_from_notation(to_square_str)
-            move.captured_piece = move.to_square.occupant
-
-            from_type = PieceType.type_from_symbol(from_square[0])
-            from_file = None
-            # if a file is specified, make use of it
-            if len(from_square) > 1:
-                from_file = from_square[1]
-            from_squares = list(board.squares_matching_filter(type=from_type,
-                                                              color=active_color,
-                                                              file_str=from_file,
-                                                              can_reach_square=move.to_square))
-            # there should be exactly one source square
-            if len(from_squares) != 1:
-                # check if this is en passant
-                if game.en_passant_eligible():
-                    rank = 5 if active_color == Color.WHITE else 4
-                    from_square = board.square_from_notation(f'{from_file}{rank}')
-                    unsafe_square = board.square_from_notation(f'{Square.index_to_file(move.to_square.file)}{rank}')
-                    return EnPassantMove(move.to_square, from_square, unsafe_square)
-                else:
-                    raise InvalidMoveError(f'{move_str} is ambiguous')
-
-            move.from_square = from_squares[0]
-            move.active_piece = move.from_square.occupant
-            return move
-
-        # piece type will be the first character
-        piece_type = PieceType.type_from_symbol(move_str[0])
-        # if the total move is >= 4 characters, then the second character specifies the file of the source piece (Ned6)
-        if len(move_str) >= 4:
-            from_file = move_str[1]
-            move.to_square = board.square_from_notation(move_str[2:])
-        else:
-            from_file = None
-            move.to_square = board.square_from_notation(move_str[1:])
-
-        pieces_fulfilling_source_square_requirements: List[Square] = []
-        for square in board.squares_matching_filter(
-                color=active_color,
-                type=piece_type,
-                file_str=from_file,
-                can_reach_square=move.to_square):
-            # found the piece to move
-            pieces_fulfilling_source_square_requirements.append(square)
-
-        # if there were multiple pieces matching all the necessary criteria to perform the provided notation,
-        # then the notation is invalid and must contain the source square's file
-        if len(pieces_fulfilling_source_square_requirements) > 1:
-            raise InvalidChessNotationError(f'Ambiguous move: {move_str}')
-        elif len(pieces_fulfilling_source_square_requirements) == 1:
-            move.from_square = pieces_fulfilling_source_square_requirements[0]
-            move.active_piece = move.from_square.occupant
-            return move
-
-        raise InvalidMoveError(move_str)
+        move = game.board.move_from_code(parse_san(game, move_str))
+        move.notation = move_str
+        return move
 
 
 class CastleMove(Move):
@@ -186,6 +242,19 @@ class CastleMove(Move):
         side = 'short' if self.kingside else 'long'
         return f'({color} {side} castle)'
 
+    def coordinate_notation(self) -> str:
+        # castling is written as the king's movement
+        rank = 1 if self.color == Color.WHITE else 8
+        dest_file = 'g' if self.kingside else 'c'
+        return f'e{rank}{dest_file}{rank}'
+
+    @property
+    def code(self) -> int:
+        king = 4 if self.color == Color.WHITE else 60
+        if self.kingside:
+            return encode_move(king, king + 2, KINGSIDE_CASTLE)
+        return encode_move(king, king - 2, QUEENSIDE_CASTLE)
+
     def apply(self, board: 'Board'):
         king_file = Square.file_to_index('e')
         if self.color == Color.WHITE:
@@ -226,17 +295,26 @@ class CastleMove(Move):
 
 
 class EnPassantMove(Move):
-    def __init__(self, target_square: Square, attacker: Square, unsafe_square: Square):
+    def __init__(self, target_square: Square, attacker: Square, unsafe_square: Square, color: Optional[Color] = None):
+        """The color defaults to that of the pawn on the attacker square. It must be provided when the move has
+        already been made, since the attacker square is empty by then.
+        """
         self.target_square = target_square
         self.attacker = attacker
         self.unsafe_square = unsafe_square
 
-        self.active_piece = self.attacker.occupant
-
+        color = color or self.attacker.occupant.color
         notation = f'{Square.index_to_file(attacker.file)}x{self.target_square.notation()}'
-        super(EnPassantMove, self).__init__(self.attacker.occupant.color, notation)
+        super(EnPassantMove, self).__init__(color, notation)
+        self.active_piece = Piece(PieceType.PAWN, color)
+        self.from_square = attacker
+        self.to_square = target_square
+        self.is_capture = True
+        self.captured_piece = Piece(PieceType.PAWN, color.opposite())
 
     def __eq__(self, other):
+        if type(other) != EnPassantMove:
+            return False
         if self.target_square != other.target_square:
             return False
         if self.attacker != other.attacker:
@@ -254,12 +332,16 @@ class EnPassantMove(Move):
         sup = super(EnPassantMove, self).__repr__()
         return f'e.p. {sup}'
 
+    @property
+    def code(self) -> int:
+        return encode_move(self.attacker.index, self.target_square.index, EN_PASSANT)
+
     def apply(self, board: 'Board'):
         board.move_piece_to_square(self.attacker, self.target_square)
         if not self.target_square:
             raise RuntimeError(f'unsafe square for en passant was empty?')
-        self.unsafe_square.occupant = None
+        board.set_occupant(self.unsafe_square, None)
 
     def undo(self, board: 'Board'):
         board.move_piece_to_square(self.target_square, self.attacker)
-        self.unsafe_square.occupant = Piece(PieceType.PAWN, self.color.opposite())
+        board.set_occupant(self.unsafe_square, Piece(PieceType.PAWN, self.color.opposite()))
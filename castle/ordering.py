@@ -0,0 +1,98 @@
+from typing import Iterator, List
+
+from castle.move import CAPTURE, EN_PASSANT, PROMOTION, PROMOTION_PIECES, NO_MOVE
+from castle.piece import Piece, PieceType, Color
+
+# moves are searched in bands: captures and promotions, then killer moves, then the other quiet moves by history
+_CAPTURE_SCORE = 1 << 30
+_KILLER_SCORE = 1 << 29
+# history scores are halved once any reaches this, so they stay below the killer band and favour recent results
+_HISTORY_LIMIT = 1 << 20
+
+KILLERS_PER_PLY = 2
+
+_PAWN_VALUE = Piece(PieceType.PAWN, Color.WHITE).value
+# the value of each promotion piece, indexed by the low two bits of the promotion flags
+_PROMOTION_VALUES = [Piece(piece_type, Color.WHITE).value for piece_type in PROMOTION_PIECES]
+
+
+def mvv_lva(board: 'Board', code: int) -> int:
+    """Most valuable victim, least valuable attacker: captures of big pieces come first, and among captures of the
+    same piece, captures by the smallest attacker come first, since they risk the least material if recaptured.
+    The encoded move must not have been made on the board yet.
+    """
+    flags = code >> 12
+    score = 0
+    if flags == EN_PASSANT:
+        score = _PAWN_VALUE * 1000
+    elif flags & CAPTURE:
+        score = board.piece_at((code >> 6) & 63).value * 1000
+    if flags & PROMOTION:
+        # count the promotion as capturing the piece the pawn becomes, less the pawn it was
+        score += (_PROMOTION_VALUES[flags & 3] - _PAWN_VALUE) * 1000
+    if score:
+        score -= board.piece_at(code & 63).value
+    return score
+
+
+class MoveOrderer:
+    """Orders the encoded moves at each node of a search, so alpha-beta prunes as much as possible.
+
+    The hash move is searched first, then captures and promotions by MVV-LVA, then the killer moves which caused a
+    cutoff at the same ply elsewhere in the tree, then the remaining quiet moves by their history score: how often
+    and how deep they've caused a cutoff anywhere in the tree.
+    """
+    def __init__(self, board: 'Board', max_ply: int = 128) -> None:
+        self.board = board
+        # killers[ply] holds the quiet moves which most recently caused a cutoff at that ply
+        self.killers: List[List[int]] = [[NO_MOVE] * KILLERS_PER_PLY for _ in range(max_ply)]
+        # history[color][from | to << 6]
+        self.history: List[List[int]] = [[0] * 4096 for _ in range(2)]
+
+    def score(self, code: int, ply: int) -> int:
+        capture_score = mvv_lva(self.board, code)
+        if capture_score:
+            return _CAPTURE_SCORE + capture_score
+        # quiescence search can go deeper than the killer table
+        if ply < len(self.killers) and code in self.killers[ply]:
+            return _KILLER_SCORE - self.killers[ply].index(code)
+        return self.history[self.board.piece_at(code & 63).color.value][code & 0xFFF]
+
+    def ordered(self, codes: List[int], ply: int, hash_move: int = NO_MOVE) -> Iterator[int]:
+        """Yields the moves, best first.
+        Moves are picked one at a time, so nothing after a cutoff is sorted, and the hash move is yielded before
+        anything is scored at all. Each move must have been taken back before the next one is asked for.
+        """
+        remaining = list(codes)
+        if hash_move != NO_MOVE and hash_move in remaining:
+            remaining.remove(hash_move)
+            yield hash_move
+
+        score = self.score
+        scores = [score(code, ply) for code in remaining]
+        while remaining:
+            best = max(range(len(scores)), key=scores.__getitem__)
+            code = remaining[best]
+            # remove the best move by swapping the last one into its place
+            remaining[best] = remaining[-1]
+            scores[best] = scores[-1]
+            remaining.pop()
+            scores.pop()
+            yield code
+
+    def record_cutoff(self, code: int, ply: int, depth: int) -> None:
+        """Remember a quiet move which caused a beta cutoff. The move must have been taken back.
+        """
+        if mvv_lva(self.board, code):
+            # captures are already searched early
+            return
+        killers = self.killers[ply]
+        if killers[0] != code:
+            killers[1:] = killers[:-1]
+            killers[0] = code
+
+        history = self.history[self.board.piece_at(code & 63).color.value]
+        history[code & 0xFFF] += depth * depth
+        if history[code & 0xFFF] >= _HISTORY_LIMIT:
+            for color in (Color.WHITE, Color.BLACK):
+                self.history[color.value] = [value // 2 for value in self.history[color.value]]
@@ -0,0 +1,121 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from castle.move import move_coordinates
+
+
+class PerftCache:
+    """Bounded table of perft results, keyed by (Zobrist key, depth).
+
+    The table has a fixed number of two-entry buckets. The first entry of a bucket is depth-preferred: it's only
+    replaced by a result for an equal or deeper subtree, since those are the most expensive to recompute. The second
+    entry is always replaced, so recent shallow results still get cached.
+    """
+    DEFAULT_BUCKETS = 1 << 16
+
+    def __init__(self, buckets: int = DEFAULT_BUCKETS) -> None:
+        if buckets < 1 or buckets & (buckets - 1):
+            raise ValueError(f'bucket count must be a power of two, got {buckets}')
+        self._mask = buckets - 1
+        size = buckets * 2
+        self._keys: List[int] = [0] * size
+        self._depths: List[int] = [-1] * size
+        self._values: List[Any] = [None] * size
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return sum(1 for depth in self._depths if depth >= 0)
+
+    @staticmethod
+    def _slot_key(key: int, depth: int) -> int:
+        # mix the depth in, so the same position at different depths lands in different buckets
+        return key ^ (depth * 0x9E3779B97F4A7C15)
+
+    def get(self, key: int, depth: int) -> Optional[Any]:
+        slot_key = self._slot_key(key, depth)
+        slot = (slot_key & self._mask) << 1
+        for index in (slot, slot + 1):
+            if self._keys[index] == slot_key and self._depths[index] == depth:
+                self.hits += 1
+                return self._values[index]
+        self.misses += 1
+        return None
+
+    def put(self, key: int, depth: int, value: Any) -> None:
+        slot_key = self._slot_key(key, depth)
+        slot = (slot_key & self._mask) << 1
+        if depth < self._depths[slot]:
+            slot += 1
+        self._keys[slot] = slot_key
+        self._depths[slot] = depth
+        self._values[slot] = value
+
+    def clear(self) -> None:
+        size = len(self._keys)
+        self._keys = [0] * size
+        self._depths = [-1] * size
+        self._values = [None] * size
+        self.hits = 0
+        self.misses = 0
+
+
+# each worker process keeps one cache for its lifetime, so transpositions are shared between the tasks it runs
+_worker_cache: Optional[PerftCache] = None
+
+
+def _init_worker(cache_buckets: int) -> None:
+    global _worker_cache
+    _worker_cache = PerftCache(cache_buckets)
+
+
+def _perft_task(fen: str, depth: int) -> int:
+    from castle.fen_parser import FenGameConstructor
+    game = FenGameConstructor(fen).game
+    return game.perft(depth, _worker_cache)
+
+
+def _frontier(game: 'Game', plies: int, root_move: Optional[str] = None) -> List[Tuple[str, str]]:
+    """Returns a (root move, FEN) pair for every position `plies` moves from the current one
+    """
+    if plies == 0:
+        return [(root_move, game.to_fen())]
+    positions = []
+    for code in game.generate_legal_codes():
+        game.make_move_code(code)
+        positions += _frontier(game, plies - 1, root_move or move_coordinates(code))
+        game.unmake_move_code()
+    return positions
+
+
+def divide_parallel(game: 'Game',
+                    depth: int,
+                    workers: Optional[int] = None,
+                    frontier_depth: int = 1,
+                    cache_buckets: int = PerftCache.DEFAULT_BUCKETS) -> Dict[str, int]:
+    """Game.divide(), with the subtrees counted across a pool of worker processes.
+
+    The tree is expanded `frontier_depth` plies from the root, and each frontier position is sent to a worker as
+    FEN. Splitting deeper than the root moves gives the pool many smaller tasks, which balances the load better
+    when some root moves have much bigger subtrees than others. Results are merged back onto their root move.
+    """
+    if depth < 1:
+        raise ValueError(f'divide requires a depth of at least 1, got {depth}')
+    frontier_depth = max(1, min(frontier_depth, depth))
+    if frontier_depth == depth:
+        return game.divide(depth)
+
+    workers = workers or os.cpu_count() or 1
+    positions = _frontier(game, frontier_depth)
+    # root moves whose subtrees end before the frontier still get listed, with a count of 0
+    counts = {move_coordinates(code): 0 for code in game.generate_legal_codes()}
+    remaining_depth = depth - frontier_depth
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(cache_buckets,)) as pool:
+        results = pool.map(_perft_task,
+                           [fen for _, fen in positions],
+                           [remaining_depth] * len(positions),
+                           chunksize=max(1, len(positions) // (8 * workers)))
+        for (root_move, _), count in zip(positions, results):
+            counts[root_move] += count
+    return counts
@@ -0,0 +1,211 @@
+import re
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from castle.game import Game
+from castle.player import PlayerType
+from castle.san import parse_san
+
+# Reads games in Portable Game Notation, one at a time, from any iterable of lines such as an open file. Only the game
+# being read is held in memory, so archives of any size can be processed. Games are written back out with to_pgn().
+
+_TAG_PATTERN = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+# one movetext token, after any whitespace: the start of a comment, a rest-of-line comment, a NAG, a variation
+# bracket, a result, a move number, or a move
+_TOKEN_PATTERN = re.compile(r'\s*(?:(\{)|(;.*)|\$(\d+)|([()])|(1-0|0-1|1/2-1/2|\*)|\d+\.+|([^\s{}();$]+))')
+# the move suffix annotations, and the NAGs they stand for
+_SUFFIX_PATTERN = re.compile(r'[!?]+$')
+_SUFFIX_NAGS = {'!': 1, '?': 2, '!!': 3, '??': 4, '!?': 5, '?!': 6}
+# the tags every game has, written first and in this order
+_SEVEN_TAG_ROSTER = ['Event', 'Site', 'Date', 'Round', 'White', 'Black', 'Result']
+_LINE_LENGTH = 79
+
+
+class PgnGame:
+    """One game read from PGN: its tag pairs, main line moves in standard algebraic notation, and result.
+    Comments are kept by the number of moves played before them, and NAGs by the index of the move they annotate.
+    Variations are kept as their raw movetext, by the index of the move they're an alternative to, if the reader was
+    asked to keep them.
+    """
+    def __init__(self) -> None:
+        self.headers: Dict[str, str] = {}
+        self.moves: List[str] = []
+        self.comments: Dict[int, List[str]] = {}
+        self.nags: Dict[int, List[int]] = {}
+        self.variations: Dict[int, List[str]] = {}
+        # the result given at the end of the movetext, if any
+        self._result: Optional[str] = None
+
+    @property
+    def result(self) -> str:
+        """The game's result, from the end of its movetext, or its Result tag if the movetext didn't have one
+        """
+        return self._result or self.headers.get('Result', '*')
+
+    @result.setter
+    def result(self, result: str) -> None:
+        self._result = result
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.headers or self.moves or self.comments or self._result)
+
+    def to_game(self) -> Game:
+        """Play the game's moves from its starting position, which is the FEN tag if it has one
+        """
+        game = Game(PlayerType.HUMAN, PlayerType.HUMAN, fen=self.headers.get('FEN'))
+        for notation in self.moves:
+            game.make_move_code(parse_san(game, notation))
+        return game
+
+    def _movetext(self) -> List[str]:
+        fields = self.headers.get('FEN', '').split()
+        black_to_move = len(fields) > 1 and fields[1] == 'b'
+        number = int(fields[5]) if len(fields) > 5 else 1
+        tokens = [f'{{{text}}}' for text in self.comments.get(0, [])]
+        for index, notation in enumerate(self.moves):
+            if not black_to_move:
+                tokens.append(f'{number}.')
+            elif index == 0 or tokens[-1].endswith(('}', ')')):
+                # black's move needs its number again after anything interrupts the move pair
+                tokens.append(f'{number}...')
+            tokens.append(notation)
+            tokens += [f'${nag}' for nag in self.nags.get(index, [])]
+            tokens += [f'{{{text}}}' for text in self.comments.get(index + 1, [])]
+            tokens += [f'({variation})' for variation in self.variations.get(index, [])]
+            if black_to_move:
+                number += 1
+            black_to_move = not black_to_move
+        tokens.append(self.result)
+        return tokens
+
+    def to_pgn(self) -> str:
+        """The game in PGN export format: the seven tag roster then any other tags, and movetext wrapped to 79 columns
+        """
+        headers = dict(self.headers, Result=self.result)
+        names = _SEVEN_TAG_ROSTER + [name for name in headers if name not in _SEVEN_TAG_ROSTER]
+        lines = []
+        for name in names:
+            value = headers.get(name, '?').replace('\\', '\\\\').replace('"', '\\"')
+            lines.append(f'[{name} "{value}"]')
+        lines.append('')
+        line = ''
+        for token in self._movetext():
+            if line and len(line) + 1 + len(token) > _LINE_LENGTH:
+                lines.append(line)
+                line = token
+            else:
+                line = f'{line} {token}' if line else token
+        lines.append(line)
+        return '\n'.join(lines) + '\n'
+
+
+class PgnReader:
+    """Iterates the games in PGN text, yielding each PgnGame as soon as it's complete.
+    Lines are read as they're needed, so nothing after the current game has been read yet.
+    """
+    def __init__(self, lines: Iterable[str], keep_variations: bool = False) -> None:
+        self.lines = lines
+        self.keep_variations = keep_variations
+        self._game = PgnGame()
+        # the text of an unterminated {comment}, which continues on the next line
+        self._comment: Optional[List[str]] = None
+        # how deeply nested in variations the reader is, and the movetext of the variation being kept
+        self._depth = 0
+        self._variation: List[str] = []
+
+    def __iter__(self) -> Iterator[PgnGame]:
+        for line in self.lines:
+            line = line.rstrip('\r\n')
+            if self._comment is None and self._depth == 0:
+                stripped = line.lstrip()
+                if line.startswith('%'):
+                    # escaped line, for other software
+                    continue
+                if stripped.startswith('['):
+                    if self._game.moves or self._game.comments:
+                        # the last game's movetext stopped without a result
+                        yield self._finish()
+                    for name, value in _TAG_PATTERN.findall(stripped):
+                        self._game.headers[name] = re.sub(r'\\(.)', r'\1', value)
+                    continue
+            yield from self._read_movetext(line)
+        if not self._game.is_empty:
+            yield self._finish()
+
+    def _finish(self) -> PgnGame:
+        game = self._game
+        self._game = PgnGame()
+        self._comment = None
+        self._depth = 0
+        self._variation = []
+        return game
+
+    def _add_comment(self, text: str) -> None:
+        if self._depth:
+            if self.keep_variations:
+                self._variation.append(f'{{{text}}}')
+            return
+        self._game.comments.setdefault(len(self._game.moves), []).append(text.strip())
+
+    def _read_movetext(self, line: str) -> Iterator[PgnGame]:
+        game = self._game
+        position = 0
+        while position < len(line):
+            if self._comment is not None:
+                end = line.find('}', position)
+                if end < 0:
+                    self._comment.append(line[position:])
+                    return
+                self._comment.append(line[position:end])
+                self._add_comment('\n'.join(self._comment))
+                self._comment = None
+                position = end + 1
+                continue
+
+            match = _TOKEN_PATTERN.match(line, position)
+            if not match or match.end() == position:
+                # only whitespace is left
+                return
+            position = match.end()
+            comment, line_comment, nag, bracket, result, move = match.groups()
+            if comment:
+                self._comment = []
+            elif line_comment:
+                self._add_comment(line_comment[1:])
+            elif bracket == '(':
+                if self._depth and self.keep_variations:
+                    self._variation.append('(')
+                self._depth += 1
+            elif bracket == ')':
+                if not self._depth:
+                    continue
+                self._depth -= 1
+                if self._depth:
+                    if self.keep_variations:
+                        self._variation.append(')')
+                elif self.keep_variations:
+                    text = ' '.join(self._variation).replace('( ', '(').replace(' )', ')')
+                    game.variations.setdefault(len(game.moves) - 1, []).append(text)
+                    self._variation = []
+            elif self._depth:
+                if self.keep_variations:
+                    self._variation.append(match.group(0).strip())
+            elif result:
+                game._result = result
+                yield self._finish()
+                game = self._game
+            elif nag:
+                game.nags.setdefault(len(game.moves) - 1, []).append(int(nag))
+            elif move:
+                suffix = _SUFFIX_PATTERN.search(move)
+                if suffix:
+                    move = move[:suffix.start()]
+                    if suffix.group(0) in _SUFFIX_NAGS:
+                        game.nags.setdefault(len(game.moves), []).append(_SUFFIX_NAGS[suffix.group(0)])
+                game.moves.append(move)
+
+
+def read_games(lines: Iterable[str], keep_variations: bool = False) -> Iterator[PgnGame]:
+    """Iterate the games in PGN text, e.g. an open file
+    """
+    return iter(PgnReader(lines, keep_variations))
@@ -46,35 +46,40 @@ class PieceType(Enum):
         return cls._TYPE_TO_SYMBOL.value[piece_type.value]
 
 
+_PIECE_VALUES = {
+    PieceType.PAWN: 1,
+    PieceType.KNIGHT: 3,
+    PieceType.BISHOP: 3,
+    PieceType.ROOK: 5,
+    PieceType.QUEEN: 9,
+    PieceType.KING: 999,
+}
+
+
 class Piece:
-    def __init__(self, type: PieceType, color: Color):
-        self.type = type
-        self.color = color
+    """A piece of some type and color.
+    Pieces are immutable, and there's only one of each: Piece(PieceType.PAWN, Color.WHITE) always returns the same
+    object, so boards share them rather than allocating their own, and they compare by identity.
+    """
+    __slots__ = ('type', 'color', 'value')
+    _instances = {}
 
-    def __repr__(self):
-        return f'<{self.color.value} {self.type.name}>'
+    def __new__(cls, type: PieceType, color: Color) -> 'Piece':
+        piece = cls._instances.get((type, color))
+        if piece is None:
+            piece = super(Piece, cls).__new__(cls)
+            object.__setattr__(piece, 'type', type)
+            object.__setattr__(piece, 'color', color)
+            object.__setattr__(piece, 'value', _PIECE_VALUES[type])
+            cls._instances[(type, color)] = piece
+        return piece
 
-    def __eq__(self, other):
-        if not other:
-            return False
-        if self.color != other.color:
-            return False
-        if self.type != other.type:
-            return False
-        return True
-
-    def __hash__(self):
-        return hash((self.color, self.type))
-
-    @property
-    def value(self):
-        if self.type == PieceType.PAWN:
-            return 1
-        elif self.type == PieceType.KNIGHT or self.type == PieceType.BISHOP:
-            return 3
-        elif self.type == PieceType.ROOK:
-            return 5
-        elif self.type == PieceType.QUEEN:
-            return 9
-        return 999
+    def __setattr__(self, name, value):
+        raise AttributeError(f'Pieces can\'t be changed')
 
+    def __reduce__(self):
+        # unpickle to the same instance
+        return Piece, (self.type, self.color)
+
+    def __repr__(self):
+        return f'<{self.color.value} {self.type.name}>'
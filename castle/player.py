@@ -1,11 +1,13 @@
 import random
 from enum import Enum
-from typing import Tuple, List, Set, Union
+from typing import Tuple, List, Optional, Set, Union
 
 from castle.piece import Color
 from castle.board import Board
 from castle.square import Square
 from castle.move import Move, MoveParser
+from castle.search import Search, SearchResult
+from castle.transposition import TranspositionTable
 
 
 class PlayerType(Enum):
@@ -65,3 +67,43 @@ class RandomPlayer(Player):
         print(move.notation)
 
         return move
+
+
+class SearchPlayer(Player):
+    """Computer player which picks its move with an alpha-beta search of the game it's playing.
+    The search runs until it reaches max_depth, or its time or node budget is spent.
+    """
+    DEFAULT_TIME_LIMIT = 2.0
+
+    def __init__(self,
+                 color: Color,
+                 game: 'Game',
+                 max_depth: int = Search.DEFAULT_MAX_DEPTH,
+                 time_limit: Optional[float] = DEFAULT_TIME_LIMIT,
+                 node_limit: Optional[int] = None,
+                 hash_megabytes: float = TranspositionTable.DEFAULT_MEGABYTES):
+        super(SearchPlayer, self).__init__(color)
+        self.name = 'Computer'
+        self.game = game
+        self.max_depth = max_depth
+        self.time_limit = time_limit
+        self.node_limit = node_limit
+        self.last_result: Optional[SearchResult] = None
+        # kept between moves, since positions searched for one move are often reached again for the next
+        self.table = TranspositionTable(hash_megabytes)
+
+    def search(self) -> SearchResult:
+        search = Search(self.game,
+                        max_depth=self.max_depth,
+                        time_limit=self.time_limit,
+                        node_limit=self.node_limit,
+                        table=self.table)
+        self.last_result = search.run()
+        return self.last_result
+
+    def play_move(self, board: Board) -> Move:
+        super(SearchPlayer, self).play_move(board)
+        move = self.search().best_move
+        # output the move as if the computer entered it to the CLI
+        print(move.notation)
+        return move
@@ -0,0 +1,207 @@
+import mmap
+import struct
+from typing import Dict, Iterable, List, Optional, Tuple, Type
+
+from castle.bitboard import BitBoard
+from castle.board import Board, InvalidChessNotationError
+from castle.game import Game, FEN_PIECES, parse_fen, format_fen
+from castle.piece import Piece, Color
+from castle.player import PlayerType
+from castle.pgn import read_games
+from castle.san import parse_san
+
+# A file of positions in a fixed-width binary format, so any position can be read straight from its offset without
+# parsing anything before it. The file is a 16-byte header followed by RECORD_BYTES per position:
+#   32 bytes  one nibble per square index (rank * 8 + file), the low nibble first: 0 for an empty square, the PieceType
+#             value for a white piece, and the PieceType value + 8 for a black piece
+#   1 byte    bit 0 set if black is to move, bits 1-4 the CASTLE_* rights
+#   1 byte    en passant target square index, or 255 if there is none
+#   2 bytes   halfmove clock
+#   2 bytes   fullmove number
+MAGIC = b'CSTLPOS\0'
+VERSION = 1
+_HEADER = struct.Struct('<8sHH4x')
+_RECORD = struct.Struct('<32sBBHH')
+RECORD_BYTES = _RECORD.size
+_NO_EN_PASSANT = 255
+
+
+def _nibble_tables() -> Tuple[Dict[Piece, int], List[Optional[Piece]]]:
+    """The nibble for each piece, and the piece for each nibble
+    """
+    nibbles = {piece: piece.type.value if piece.color == Color.WHITE else piece.type.value + 8
+               for piece in FEN_PIECES.values()}
+    pieces: List[Optional[Piece]] = [None] * 16
+    for piece, nibble in nibbles.items():
+        pieces[nibble] = piece
+    return nibbles, pieces
+
+
+_NIBBLE_BY_PIECE, _PIECES = _nibble_tables()
+
+
+def _pack(nibbles: List[int], black_to_move: bool, castling_rights: int, en_passant: Optional[int],
+          halfmove_clock: int, fullmove_number: int) -> bytes:
+    squares = bytes(nibbles[index] | (nibbles[index + 1] << 4) for index in range(0, 64, 2))
+    return _RECORD.pack(squares,
+                        int(black_to_move) | (castling_rights << 1),
+                        _NO_EN_PASSANT if en_passant is None else en_passant,
+                        min(halfmove_clock, 0xFFFF),
+                        min(fullmove_number, 0xFFFF))
+
+
+def encode_fen(fen: str) -> bytes:
+    """The record for a position in Forsyth-Edwards Notation, without building a Game. The FEN is checked just as
+    Game.load_fen() checks it, and a malformed one raises ValueError.
+    """
+    try:
+        pieces, black_to_move, castling_rights, en_passant, halfmove_clock, fullmove_number = parse_fen(fen)
+    except InvalidChessNotationError as e:
+        raise ValueError(str(e)) from e
+    nibbles = [0] * 64
+    for index, piece in pieces:
+        nibbles[index] = _NIBBLE_BY_PIECE[piece]
+    return _pack(nibbles, black_to_move, castling_rights, en_passant, halfmove_clock, fullmove_number)
+
+
+def encode_game(game: Game) -> bytes:
+    """The record for a game's current position
+    """
+    nibbles = [0] * 64
+    piece_at = game.board.piece_at
+    for index in range(64):
+        piece = piece_at(index)
+        if piece:
+            nibbles[index] = _NIBBLE_BY_PIECE[piece]
+    en_passant = game.en_passant_target_square
+    return _pack(nibbles,
+                 game.current_player.color == Color.BLACK,
+                 game.castling_rights,
+                 en_passant.index if en_passant else None,
+                 game.halfmove_clock,
+                 game.fullmove_number)
+
+
+class PositionWriter:
+    """Writes positions to a position file, as a context manager
+    """
+    def __init__(self, path: str) -> None:
+        self._file = open(path, 'wb')
+        self._file.write(_HEADER.pack(MAGIC, VERSION, RECORD_BYTES))
+        self.count = 0
+
+    def __enter__(self) -> 'PositionWriter':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._file.close()
+
+    def write_record(self, record: bytes) -> int:
+        """Append an encoded position, and return its index
+        """
+        self._file.write(record)
+        self.count += 1
+        return self.count - 1
+
+    def write_fen(self, fen: str) -> int:
+        return self.write_record(encode_fen(fen))
+
+    def write_fens(self, fens: Iterable[str]) -> None:
+        """Write each position of a stream of FEN lines. Blank lines are skipped.
+        """
+        for fen in fens:
+            if fen.strip():
+                self.write_fen(fen)
+
+    def write_game(self, game: Game) -> int:
+        return self.write_record(encode_game(game))
+
+    def write_pgn(self, lines: Iterable[str]) -> None:
+        """Write every position of every game in a PGN stream: the starting position, then the position after each
+        main line move
+        """
+        for record in read_games(lines):
+            game = Game(PlayerType.HUMAN, PlayerType.HUMAN, fen=record.headers.get('FEN'))
+            self.write_game(game)
+            for notation in record.moves:
+                game.make_move_code(parse_san(game, notation))
+                self.write_game(game)
+
+
+class PositionReader:
+    """Random access to the positions in a position file, which is memory-mapped rather than read.
+    Positions are only turned into Boards, Games or FEN when they're asked for.
+    """
+    def __init__(self, path: str) -> None:
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, record_bytes = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION or record_bytes != RECORD_BYTES:
+            self.close()
+            raise ValueError(f'{path} is not a version {VERSION} position file')
+        self._count = (len(self._map) - _HEADER.size) // RECORD_BYTES
+
+    def __enter__(self) -> 'PositionReader':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._map.close()
+        self._file.close()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def record(self, index: int) -> bytes:
+        """The encoded position at the index
+        """
+        if not 0 <= index < self._count:
+            raise IndexError(f'position {index} out of range')
+        offset = _HEADER.size + index * RECORD_BYTES
+        return self._map[offset:offset + RECORD_BYTES]
+
+    def _unpack(self, index: int) -> Tuple[List[int], int, int, int, int]:
+        squares, flags, en_passant, halfmove_clock, fullmove_number = _RECORD.unpack(self.record(index))
+        nibbles = [0] * 64
+        for byte_index, byte in enumerate(squares):
+            nibbles[byte_index * 2] = byte & 0xF
+            nibbles[byte_index * 2 + 1] = byte >> 4
+        return nibbles, flags, en_passant, halfmove_clock, fullmove_number
+
+    def board(self, index: int, board_type: Type[Board] = BitBoard) -> Board:
+        board = board_type()
+        nibbles = self._unpack(index)[0]
+        for square_index, nibble in enumerate(nibbles):
+            if nibble:
+                board.set_occupant(board.square_from_index(square_index), _PIECES[nibble])
+        return board
+
+    def game(self, index: int) -> Game:
+        nibbles, flags, en_passant, halfmove_clock, fullmove_number = self._unpack(index)
+        # an empty position, rather than setting up the starting position only to clear it
+        game = Game(PlayerType.HUMAN, PlayerType.HUMAN, fen='8/8/8/8/8/8/8/8 w - - 0 1')
+        board = game.board
+        for square_index, nibble in enumerate(nibbles):
+            if nibble:
+                board.set_occupant(board.square_from_index(square_index), _PIECES[nibble])
+        game.set_color_to_move(Color.BLACK if flags & 1 else Color.WHITE)
+        game.castling_rights = flags >> 1
+        if en_passant != _NO_EN_PASSANT:
+            game.en_passant_target_square = board.square_from_index(en_passant)
+        game.halfmove_clock = halfmove_clock
+        game.fullmove_number = fullmove_number
+        return game
+
+    def fen(self, index: int) -> str:
+        nibbles, flags, en_passant, halfmove_clock, fullmove_number = self._unpack(index)
+        return format_fen(lambda square_index: _PIECES[nibbles[square_index]],
+                          bool(flags & 1),
+                          flags >> 1,
+                          None if en_passant == _NO_EN_PASSANT else en_passant,
+                          halfmove_clock,
+                          fullmove_number)
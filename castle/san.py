@@ -0,0 +1,245 @@
+import re
+from typing import List, Optional
+
+from castle.bitboard import BitBoard, iter_bits, KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS
+from castle.bitboard import rook_attacks, bishop_attacks, queen_attacks
+from castle.board import InvalidChessNotationError
+from castle.move import CAPTURE, PROMOTION, PROMOTION_PIECES, KINGSIDE_CASTLE, QUEENSIDE_CASTLE
+from castle.move import QUIET, DOUBLE_PAWN_PUSH, EN_PASSANT, InvalidMoveError, encode_move
+from castle.piece import Piece, PieceType, Color
+from castle.square import Square
+
+# Standard algebraic notation for encoded moves, written and parsed. SAN depends on the position the move is played
+# from: which other pieces could reach the same square, and whether the move gives check or mate. Moves only work it
+# out when their notation is asked for, so none of this is paid for by move generation or search.
+
+
+def _square_name(index: int) -> str:
+    return f'{Square.index_to_file(index & 7)}{(index >> 3) + 1}'
+
+
+def _rivals(game: 'Game', piece: Piece, source: int, dest: int) -> List[int]:
+    """The squares of the other pieces like `piece` which could legally move to `dest`
+    """
+    board = game.board
+    if isinstance(board, BitBoard):
+        # almost always, no other piece of the type even attacks the square, and no legal moves need generating
+        candidates = board.attackers_to(dest, piece.color) & board.pieces(piece.type, piece.color) & ~(1 << source)
+        if not candidates:
+            return []
+        # a candidate might still be pinned
+        return [code & 63 for code in game.generate_legal_codes()
+                if (code >> 6) & 63 == dest and (candidates >> (code & 63)) & 1]
+    return [code & 63 for code in game.generate_legal_codes()
+            if (code >> 6) & 63 == dest and code & 63 != source and board.piece_at(code & 63) == piece]
+
+
+def _disambiguation(game: 'Game', piece: Piece, source: int, dest: int) -> str:
+    """What to write after the piece's symbol so only one piece matches: the source file if that tells the pieces
+    apart, otherwise its rank, otherwise both
+    """
+    rivals = _rivals(game, piece, source, dest)
+    if not rivals:
+        return ''
+    if all(rival & 7 != source & 7 for rival in rivals):
+        return Square.index_to_file(source & 7)
+    if all(rival >> 3 != source >> 3 for rival in rivals):
+        return str((source >> 3) + 1)
+    return _square_name(source)
+
+
+def san(game: 'Game', code: int) -> str:
+    """The encoded move in standard algebraic notation, in the game's current position: Nbd7, exd5, e8=Q+, O-O#.
+    The move must be legal and not made yet.
+    """
+    source = code & 63
+    dest = (code >> 6) & 63
+    flags = code >> 12
+    piece = game.board.piece_at(source)
+    if flags == KINGSIDE_CASTLE:
+        notation = 'O-O'
+    elif flags == QUEENSIDE_CASTLE:
+        notation = 'O-O-O'
+    elif piece.type == PieceType.PAWN:
+        # en passant has the capture bit set too
+        if flags & CAPTURE:
+            notation = f'{Square.index_to_file(source & 7)}x{_square_name(dest)}'
+        else:
+            notation = _square_name(dest)
+        if flags & PROMOTION:
+            notation += f'={PieceType.symbol_from_type(PROMOTION_PIECES[flags & 3])}'
+    else:
+        notation = PieceType.symbol_from_type(piece.type)
+        if piece.type != PieceType.KING:
+            notation += _disambiguation(game, piece, source, dest)
+        if flags & CAPTURE:
+            notation += 'x'
+        notation += _square_name(dest)
+
+    game.make_move_code(code)
+    try:
+        if game.board.is_in_check(piece.color.opposite()):
+            notation += '#' if game.count_legal_moves() == 0 else '+'
+    finally:
+        game.unmake_move_code()
+    return notation
+
+
+# piece, disambiguating file and rank, capture, destination, promotion piece, check or mate, annotation.
+# Pawn captures are accepted without the 'x' ('fg2'), and promotions without the '=' ('e8Q').
+_SAN_PATTERN = re.compile(r'([NBRQK])?([a-h])?([1-8])?(x)?([a-h][1-8])(?:=?([NBRQ]))?([+#])?[!?]*')
+# castling is accepted with letter O or digit 0
+_CASTLING_PATTERN = re.compile(r'([O0])-\1(-\1)?([+#])?[!?]*')
+
+
+class SanToken:
+    """The parts of a move in standard algebraic notation, split out without looking at the board
+    """
+    __slots__ = ('piece_type', 'file', 'rank', 'is_capture', 'dest', 'promotion', 'check', 'castle')
+
+    def __init__(self) -> None:
+        self.piece_type = PieceType.PAWN
+        # the source file and rank given to disambiguate the move, as indexes, if any
+        self.file: Optional[int] = None
+        self.rank: Optional[int] = None
+        self.is_capture = False
+        # destination square index
+        self.dest = 0
+        self.promotion: Optional[PieceType] = None
+        # '+', '#' or ''
+        self.check = ''
+        # KINGSIDE_CASTLE or QUEENSIDE_CASTLE for castling, otherwise None
+        self.castle: Optional[int] = None
+
+
+def tokenize(notation: str) -> SanToken:
+    """Split a move in standard algebraic notation into its parts
+    """
+    token = SanToken()
+    match = _SAN_PATTERN.fullmatch(notation)
+    if match:
+        piece, file, rank, capture, dest, promotion, check = match.groups()
+        if piece:
+            token.piece_type = PieceType.type_from_symbol(piece)
+        if file:
+            token.file = ord(file) - ord('a')
+        if rank:
+            token.rank = int(rank) - 1
+        token.dest = (int(dest[1]) - 1) * 8 + ord(dest[0]) - ord('a')
+        token.is_capture = capture is not None
+        if promotion:
+            if token.piece_type != PieceType.PAWN:
+                raise InvalidChessNotationError(f'Only pawns can promote: {notation}')
+            token.promotion = PieceType.type_from_symbol(promotion)
+        token.check = check or ''
+        return token
+
+    match = _CASTLING_PATTERN.fullmatch(notation)
+    if match:
+        token.piece_type = PieceType.KING
+        token.castle = QUEENSIDE_CASTLE if match.group(2) else KINGSIDE_CASTLE
+        token.check = match.group(3) or ''
+        return token
+    raise InvalidChessNotationError(f'Unrecognised move: {notation}')
+
+
+def _origins(board: BitBoard, token: SanToken, color: Color) -> int:
+    """Bitboard of the pieces which could make the move, found by looking back from its destination
+    """
+    dest = token.dest
+    pieces = board.pieces(token.piece_type, color)
+    occupied = board.occupancy()
+    piece_type = token.piece_type
+    if piece_type == PieceType.PAWN:
+        if token.is_capture or (token.file is not None and token.file != dest & 7):
+            return PAWN_ATTACKS[color.opposite().value][dest] & pieces
+        # pushes come from directly behind, or two squares behind onto the fourth rank
+        behind = dest - 8 if color == Color.WHITE else dest + 8
+        if not 0 <= behind < 64:
+            return 0
+        if (pieces >> behind) & 1:
+            return 1 << behind
+        double_rank = 3 if color == Color.WHITE else 4
+        if dest >> 3 == double_rank and not (occupied >> behind) & 1:
+            start = behind - 8 if color == Color.WHITE else behind + 8
+            return pieces & (1 << start)
+        return 0
+    if piece_type == PieceType.KNIGHT:
+        return KNIGHT_ATTACKS[dest] & pieces
+    if piece_type == PieceType.BISHOP:
+        return bishop_attacks(dest, occupied) & pieces
+    if piece_type == PieceType.ROOK:
+        return rook_attacks(dest, occupied) & pieces
+    if piece_type == PieceType.QUEEN:
+        return queen_attacks(dest, occupied) & pieces
+    return KING_ATTACKS[dest] & pieces
+
+
+def _encode(board: 'Board', token: SanToken, source: int, color: Color, en_passant: Optional[int]) -> int:
+    dest = token.dest
+    target = board.piece_at(dest)
+    if target and target.color == color:
+        raise InvalidMoveError(f'can\'t capture another piece of the same color')
+    flags = CAPTURE if target else QUIET
+    if token.piece_type == PieceType.PAWN:
+        diagonal = source & 7 != dest & 7
+        if diagonal and not target and dest != en_passant:
+            raise InvalidMoveError(f'pawns can only move diagonally to capture')
+        if not diagonal and target:
+            raise InvalidMoveError(f'pawns can\'t capture straight ahead')
+        if dest >> 3 in (0, 7):
+            flags |= PROMOTION | PROMOTION_PIECES.index(token.promotion or PieceType.QUEEN)
+        elif abs(dest - source) == 16:
+            flags = DOUBLE_PAWN_PUSH
+        elif diagonal and not target:
+            flags = EN_PASSANT
+    return encode_move(source, dest, flags)
+
+
+def parse_san(game: 'Game', notation: str) -> int:
+    """The encoded move for standard algebraic notation, in the game's current position.
+
+    Candidate source squares are found from the destination: the squares from which a piece of the moving type would
+    attack it, intersected with where those pieces are. Legal move generation is only needed to rule out pinned pieces
+    when more than one candidate remains. The move is checked to be pseudo-legal, but may leave the king in check.
+    Castling is checked to be legal.
+    """
+    token = tokenize(notation)
+    color = game.current_player.color
+    if token.castle is not None:
+        king = 4 if color == Color.WHITE else 60
+        dest = king + 2 if token.castle == KINGSIDE_CASTLE else king - 2
+        code = encode_move(king, dest, token.castle)
+        # castling is rare enough to check fully: the king and rook in place, the right not lost, and no check
+        if code not in game.generate_legal_codes():
+            raise InvalidMoveError(f'can\'t castle: {notation}')
+        return code
+
+    board = game.board
+    en_passant = None
+    if game.en_passant_target_square:
+        en_passant = game.en_passant_target_square.index
+    if isinstance(board, BitBoard):
+        origins = _origins(board, token, color)
+        if token.file is not None:
+            origins &= 0x0101010101010101 << token.file
+        if token.rank is not None:
+            origins &= 0xFF << (token.rank * 8)
+        candidates = list(iter_bits(origins))
+    else:
+        # the list-based Board has no piece index to look up, so match the notation against its legal moves
+        piece = Piece(token.piece_type, color)
+        candidates = sorted({code & 63 for code in game.generate_legal_codes()
+                             if (code >> 6) & 63 == token.dest and board.piece_at(code & 63) == piece and
+                             (token.file is None or code & 7 == token.file) and
+                             (token.rank is None or (code & 63) >> 3 == token.rank)})
+
+    if len(candidates) > 1:
+        # only the pieces which can legally make the move count: a pinned piece doesn't make it ambiguous
+        legal_sources = {code & 63 for code in game.generate_legal_codes() if (code >> 6) & 63 == token.dest}
+        candidates = [source for source in candidates if source in legal_sources]
+        if len(candidates) > 1:
+            raise InvalidChessNotationError(f'Ambiguous move: {notation}')
+    if not candidates:
+        raise InvalidMoveError(notation)
+    return _encode(board, token, candidates[0], color, en_passant)
@@ -0,0 +1,281 @@
+import time
+from typing import Callable, List, Optional
+
+from castle import evaluation
+from castle.bitboard import BitBoard
+from castle.move import Move, PROMOTION, NO_MOVE
+from castle.ordering import MoveOrderer
+from castle.transposition import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
+
+# scores are in centipawns, from the point of view of the player to move
+MATE_SCORE = 100000
+# any score beyond this is a forced mate, with the distance to mate encoded in the difference from MATE_SCORE
+MATE_THRESHOLD = MATE_SCORE - 1000
+INFINITY = MATE_SCORE + 1
+
+# the clock is only read every this many nodes, since time.monotonic() is slow relative to a node
+_CHECK_INTERVAL_MASK = 1023
+
+
+def is_mate_score(score: int) -> bool:
+    return abs(score) >= MATE_THRESHOLD
+
+
+def score_to_table(score: int, ply: int) -> int:
+    # mate scores are stored as the distance to mate from the stored position, rather than from the root
+    if score >= MATE_THRESHOLD:
+        return score + ply
+    if score <= -MATE_THRESHOLD:
+        return score - ply
+    return score
+
+
+def score_from_table(score: int, ply: int) -> int:
+    if score >= MATE_THRESHOLD:
+        return score - ply
+    if score <= -MATE_THRESHOLD:
+        return score + ply
+    return score
+
+
+def evaluate(game: 'Game') -> int:
+    """Static evaluation of the position, in centipawns for the player to move
+    """
+    return evaluation.evaluate(game.board, game.current_player.color)
+
+
+class SearchResult:
+    """The outcome of a search: the best move found, its score and the line the search expects to be played.
+    The result always comes from the deepest iteration that finished within the budget.
+    """
+    def __init__(self) -> None:
+        self.best_move: Optional[Move] = None
+        self.score = 0
+        self.depth = 0
+        self.nodes = 0
+        self.elapsed = 0.0
+        self.pv: List[Move] = []
+
+    def __repr__(self):
+        pv = ' '.join(move.coordinate_notation() for move in self.pv)
+        return f'<SearchResult depth={self.depth} score={self.score} nodes={self.nodes} pv={pv}>'
+
+
+class Search:
+    """Negamax alpha-beta search with iterative deepening.
+
+    Each iteration searches one ply deeper than the last, so the search can be stopped once its time or node budget
+    runs out and still return the best move of the last iteration that finished. The first iteration always runs to
+    completion, so there's always a move to play.
+
+    Results are kept in a TranspositionTable, which cuts off transposed positions and makes the best move from a
+    shallower search of each position be searched first. Pass the same table to each search of a game to reuse it
+    between moves. The other moves are searched in the order given by a MoveOrderer.
+    """
+    DEFAULT_MAX_DEPTH = 64
+
+    def __init__(self,
+                 game: 'Game',
+                 max_depth: int = DEFAULT_MAX_DEPTH,
+                 time_limit: Optional[float] = None,
+                 node_limit: Optional[int] = None,
+                 table: Optional[TranspositionTable] = None,
+                 on_iteration: Optional[Callable[[SearchResult], None]] = None) -> None:
+        """on_iteration is called with the result so far after each iteration finishes, e.g. to report progress
+        """
+        self.game = game
+        self.table = table if table is not None else TranspositionTable()
+        self.max_depth = max_depth
+        self.time_limit = time_limit
+        self.node_limit = node_limit
+        self.nodes = 0
+        self.stopped = False
+        self.on_iteration = on_iteration
+        self._deadline: Optional[float] = None
+        # set by stop(), which may be called from another thread
+        self._stop_requested = False
+        self.orderer = MoveOrderer(game.board, max_depth + 1)
+        # _pv[ply] is the best line found from the node at that ply, as encoded moves
+        self._pv: List[List[int]] = []
+        self._can_stop = False
+
+    def run(self) -> SearchResult:
+        start = time.monotonic()
+        self._deadline = start + self.time_limit if self.time_limit is not None else None
+        self.nodes = 0
+        self.stopped = False
+        self.table.new_search()
+        result = SearchResult()
+
+        for depth in range(1, self.max_depth + 1):
+            # an interrupted iteration is thrown away, but the first one must finish to give a move to play
+            self._can_stop = depth > 1
+            self._pv = [[] for _ in range(depth + 1)]
+            score = self._negamax(depth, 0, -INFINITY, INFINITY)
+            if self.stopped:
+                break
+
+            result.score = score
+            result.depth = depth
+            result.pv = self._pv_moves(self._extend_pv(self._pv[0], depth))
+            result.best_move = result.pv[0] if result.pv else None
+            result.nodes = self.nodes
+            result.elapsed = time.monotonic() - start
+            if self.on_iteration:
+                self.on_iteration(result)
+            # no point searching deeper once there's no move to play, or a forced mate has been found
+            if not result.pv or is_mate_score(score) or self._out_of_budget():
+                break
+
+        result.nodes = self.nodes
+        result.elapsed = time.monotonic() - start
+        return result
+
+    def stop(self) -> None:
+        """Ask the search to stop as soon as it can. This is safe to call from another thread while run() is going.
+        run() still returns the result of the last iteration that finished.
+        """
+        self._stop_requested = True
+
+    def _out_of_budget(self) -> bool:
+        if self._stop_requested:
+            return True
+        if self.node_limit is not None and self.nodes >= self.node_limit:
+            return True
+        return self._deadline is not None and time.monotonic() >= self._deadline
+
+    def _extend_pv(self, pv: List[int], depth: int) -> List[int]:
+        """A cutoff from the table ends the line collected during the search early, so continue it with the best
+        moves stored in the table, up to the search depth
+        """
+        pv = list(pv)
+        for code in pv:
+            self.game.make_move_code(code)
+        while len(pv) < depth:
+            entry = self.table.probe(self.game.zobrist_key)
+            if not entry or entry[3] not in self.game.generate_legal_codes():
+                break
+            pv.append(entry[3])
+            self.game.make_move_code(entry[3])
+        for _ in pv:
+            self.game.unmake_move_code()
+        return pv
+
+    def _pv_moves(self, pv: List[int]) -> List[Move]:
+        # the Move for each encoded move in the line is built in the position it's played from
+        moves = []
+        game = self.game
+        for code in pv:
+            move = game.board.move_from_code(code)
+            # so its notation can be worked out while the game is in that position
+            move._position = (game, len(game.move_codes), game.zobrist_key)
+            moves.append(move)
+            game.make_move_code(code)
+        for _ in pv:
+            game.unmake_move_code()
+        return moves
+
+    def _negamax(self, depth: int, ply: int, alpha: int, beta: int) -> int:
+        self._pv[ply] = []
+        if depth == 0:
+            return self._quiescence(ply, alpha, beta)
+
+        self.nodes += 1
+        if self._can_stop and (self.nodes & _CHECK_INTERVAL_MASK == 0 or self.node_limit is not None):
+            if self._out_of_budget():
+                self.stopped = True
+                return 0
+
+        key = self.game.zobrist_key
+        hash_move = NO_MOVE
+        entry = self.table.probe(key)
+        if entry:
+            entry_depth, bound, score, hash_move = entry
+            # the root always searches, so there's a move to return
+            if ply > 0 and entry_depth >= depth:
+                score = score_from_table(score, ply)
+                if bound == EXACT:
+                    return score
+                if bound == LOWER_BOUND and score >= beta:
+                    return score
+                if bound == UPPER_BOUND and score <= alpha:
+                    return score
+
+        moves = self.game.generate_legal_codes()
+        if not moves:
+            if self.game.board.is_in_check(self.game.current_player.color):
+                # prefer the quickest mate, and the slowest to be mated
+                return -MATE_SCORE + ply
+            return 0
+
+        original_alpha = alpha
+        best_score = -INFINITY
+        best_move = NO_MOVE
+        for move in self.orderer.ordered(moves, ply, hash_move):
+            self.game.make_move_code(move)
+            score = -self._negamax(depth - 1, ply + 1, -beta, -alpha)
+            self.game.unmake_move_code()
+            if self.stopped:
+                return 0
+            if score > best_score:
+                best_score = score
+                if score > alpha:
+                    alpha = score
+                    best_move = move
+                    self._pv[ply] = [move] + self._pv[ply + 1]
+                    if alpha >= beta:
+                        self.orderer.record_cutoff(move, ply, depth)
+                        break
+
+        if best_score >= beta:
+            bound = LOWER_BOUND
+        elif best_score > original_alpha:
+            bound = EXACT
+        else:
+            bound = UPPER_BOUND
+        self.table.store(key, depth, bound, score_to_table(best_score, ply), best_move)
+        return best_score
+
+    def _quiescence(self, ply: int, alpha: int, beta: int) -> int:
+        """Search captures and promotions only, until the position is quiet enough for its static evaluation to be
+        trusted. The side to move may always 'stand pat' on the static evaluation instead of capturing, unless it's
+        in check, in which case every evasion is searched. Captures which lose material by static exchange
+        evaluation are skipped, since standing pat is at least as good.
+        """
+        game = self.game
+        self.nodes += 1
+        if self._can_stop and (self.nodes & _CHECK_INTERVAL_MASK == 0 or self.node_limit is not None):
+            if self._out_of_budget():
+                self.stopped = True
+                return 0
+
+        in_check = game.board.is_in_check(game.current_player.color)
+        if in_check:
+            moves = game.generate_legal_codes()
+            if not moves:
+                return -MATE_SCORE + ply
+            best_score = -INFINITY
+        else:
+            best_score = evaluate(game)
+            if best_score >= beta:
+                return best_score
+            alpha = max(alpha, best_score)
+            moves = game.generate_legal_capture_codes()
+
+        board = game.board
+        can_exchange = isinstance(board, BitBoard)
+        for move in self.orderer.ordered(moves, ply):
+            if not in_check and can_exchange and not (move >> 12) & PROMOTION and board.static_exchange(move) < 0:
+                continue
+            game.make_move_code(move)
+            score = -self._quiescence(ply + 1, -beta, -alpha)
+            game.unmake_move_code()
+            if self.stopped:
+                return 0
+            if score > best_score:
+                best_score = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        return best_score
@@ -0,0 +1,271 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+from castle.board import InvalidChessNotationError
+from castle.game import Game
+from castle.player import PlayerType
+from castle.search import Search
+from castle.transposition import TranspositionTable
+
+# Local analysis service: JSON requests, one per line, over TCP, a Unix socket or standard input:
+#   python -m castle.server --port 8765
+#   {"id": 1, "fen": "<fen>", "depth": 6}
+# Searches run on a pool of worker processes. A position which is already being searched with the same limits isn't
+# searched again, the second request waits for the first one's result, and finished results are kept in an LRU cache.
+# Responses carry the request's id, and may be written out of order.
+
+DEFAULT_DEPTH = 4
+DEFAULT_CACHE_SIZE = 4096
+# distinct searches which may be queued or running at once; beyond that, requests are turned away straight away, so
+# a burst can't queue up work that would make every later request wait
+DEFAULT_MAX_PENDING = 64
+
+# each worker process keeps one table for its lifetime, so what's learned from one search helps the next
+_worker_table: Optional[TranspositionTable] = None
+
+
+def _init_worker(megabytes: int) -> None:
+    global _worker_table
+    _worker_table = TranspositionTable(megabytes)
+
+
+def _analyse_task(fen: str, depth: int, movetime: Optional[int], nodes: Optional[int]) -> Dict[str, Any]:
+    game = Game(PlayerType.HUMAN, PlayerType.HUMAN, fen=fen)
+    search = Search(game,
+                    max_depth=depth,
+                    time_limit=movetime / 1000 if movetime is not None else None,
+                    node_limit=nodes,
+                    table=_worker_table)
+    result = search.run()
+    best_move = result.best_move
+    return {
+        'bestmove': best_move.coordinate_notation() if best_move else None,
+        'san': game.san(best_move) if best_move else None,
+        'score': result.score,
+        'depth': result.depth,
+        'nodes': result.nodes,
+        'time': int(result.elapsed * 1000),
+        'pv': [move.coordinate_notation() for move in result.pv],
+    }
+
+
+class RequestError(Exception):
+    pass
+
+
+class ServerBusyError(RequestError):
+    pass
+
+
+def _limit(request: Dict[str, Any], name: str, default: Optional[int] = None) -> Optional[int]:
+    value = request.get(name, default)
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+        raise RequestError(f'{name} must be a positive integer, got {value!r}')
+    return value
+
+
+class AnalysisServer:
+    """Answers analysis requests from a pool of worker processes, with duplicate in-flight positions coalesced and
+    results cached by position hash. Use as an async context manager, or call close() when done.
+    """
+    def __init__(self,
+                 workers: Optional[int] = None,
+                 cache_size: int = DEFAULT_CACHE_SIZE,
+                 max_pending: int = DEFAULT_MAX_PENDING,
+                 hash_megabytes: int = TranspositionTable.DEFAULT_MEGABYTES) -> None:
+        self.workers = workers or os.cpu_count() or 1
+        self.cache_size = cache_size
+        self.max_pending = max_pending
+        self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                         initializer=_init_worker,
+                                         initargs=(hash_megabytes,))
+        self._cache: 'OrderedDict[Tuple, Dict[str, Any]]' = OrderedDict()
+        self._in_flight: Dict[Tuple, asyncio.Future] = {}
+        self.stats = {'requests': 0, 'cache_hits': 0, 'coalesced': 0, 'searches': 0, 'rejected': 0, 'errors': 0}
+
+    async def __aenter__(self) -> 'AnalysisServer':
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+    @property
+    def pending(self) -> int:
+        return len(self._in_flight)
+
+    def _cache_get(self, key: Tuple) -> Optional[Dict[str, Any]]:
+        result = self._cache.get(key)
+        if result is not None:
+            self._cache.move_to_end(key)
+        return result
+
+    def _cache_put(self, key: Tuple, result: Dict[str, Any]) -> None:
+        self._cache[key] = result
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def analyse(self, fen: str, depth: Optional[int] = None, movetime: Optional[int] = None,
+                      nodes: Optional[int] = None) -> Dict[str, Any]:
+        """Search a position, limited by depth, movetime in milliseconds and nodes. Without a movetime or nodes, the
+        depth defaults to DEFAULT_DEPTH.
+        """
+        if depth is None:
+            depth = DEFAULT_DEPTH if movetime is None and nodes is None else Search.DEFAULT_MAX_DEPTH
+        try:
+            game = Game(PlayerType.HUMAN, PlayerType.HUMAN, fen=fen)
+        except (InvalidChessNotationError, ValueError, IndexError) as e:
+            raise RequestError(f'invalid FEN: {e}')
+        # the clocks aren't part of the key, since they don't change the search
+        key = (game.zobrist_key, depth, movetime, nodes)
+
+        result = self._cache_get(key)
+        if result is not None:
+            self.stats['cache_hits'] += 1
+            return dict(result, cached=True)
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.stats['coalesced'] += 1
+            return dict(await asyncio.shield(future), cached=False)
+        if len(self._in_flight) >= self.max_pending:
+            self.stats['rejected'] += 1
+            raise ServerBusyError(f'server busy: {len(self._in_flight)} searches pending')
+
+        self.stats['searches'] += 1
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._pool, _analyse_task, game.to_fen(), depth, movetime, nodes)
+        self._in_flight[key] = future
+        try:
+            result = await asyncio.shield(future)
+        finally:
+            del self._in_flight[key]
+        self._cache_put(key, result)
+        return dict(result, cached=False)
+
+    async def handle_request(self, line: str) -> Dict[str, Any]:
+        """The response to one JSON request line. Errors are reported in the response rather than raised.
+        """
+        self.stats['requests'] += 1
+        request_id = None
+        try:
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                raise RequestError(f'invalid JSON: {e}')
+            if not isinstance(request, dict):
+                raise RequestError('a request must be a JSON object')
+            request_id = request.get('id')
+            if request.get('command') == 'stats':
+                return {'id': request_id, 'stats': dict(self.stats, pending=self.pending, cached=len(self._cache))}
+            fen = request.get('fen')
+            if not isinstance(fen, str):
+                raise RequestError('a request needs a fen')
+            result = await self.analyse(fen,
+                                        depth=_limit(request, 'depth'),
+                                        movetime=_limit(request, 'movetime'),
+                                        nodes=_limit(request, 'nodes'))
+        except RequestError as e:
+            self.stats['errors'] += 1
+            return {'id': request_id, 'error': str(e)}
+        except Exception as e:
+            # e.g. a worker process died
+            self.stats['errors'] += 1
+            return {'id': request_id, 'error': f'search failed: {e!r}'}
+        return {'id': request_id, 'fen': fen, **result}
+
+    async def _respond(self, line: str, writer: asyncio.StreamWriter) -> None:
+        response = await self.handle_request(line)
+        writer.write(json.dumps(response).encode() + b'\n')
+        await writer.drain()
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Answer each request line from a client concurrently, until it disconnects
+        """
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if line.strip():
+                    task = asyncio.ensure_future(self._respond(line.decode(), writer))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            writer.close()
+
+    async def serve_tcp(self, host: str = '127.0.0.1', port: int = 0) -> asyncio.AbstractServer:
+        """Start listening on a TCP port. Port 0 picks a free one, which is in the returned server's sockets.
+        """
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+    async def serve_unix(self, path: str) -> asyncio.AbstractServer:
+        return await asyncio.start_unix_server(self.handle_connection, path)
+
+    async def serve_stdio(self) -> None:
+        """Answer requests from standard input on standard output, until the end of the input
+        """
+        loop = asyncio.get_running_loop()
+        tasks = set()
+
+        async def respond(line: str) -> None:
+            print(json.dumps(await self.handle_request(line)), flush=True)
+
+        while True:
+            line = await loop.run_in_executor(None, sys.stdin.readline)
+            if not line:
+                break
+            if line.strip():
+                task = asyncio.ensure_future(respond(line))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+
+
+async def _serve(args: argparse.Namespace) -> None:
+    async with AnalysisServer(workers=args.workers, cache_size=args.cache_size, max_pending=args.max_pending,
+                              hash_megabytes=args.hash) as server:
+        if args.stdio:
+            await server.serve_stdio()
+            return
+        if args.unix:
+            listener = await server.serve_unix(args.unix)
+        else:
+            listener = await server.serve_tcp(args.host, args.port)
+        async with listener:
+            await listener.serve_forever()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='castle analysis server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', help='listen on a Unix socket at this path, instead of TCP')
+    parser.add_argument('--stdio', action='store_true', help='read requests from standard input')
+    parser.add_argument('--workers', type=int, help='worker processes, one per CPU by default')
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE)
+    parser.add_argument('--max-pending', type=int, default=DEFAULT_MAX_PENDING)
+    parser.add_argument('--hash', type=int, default=TranspositionTable.DEFAULT_MEGABYTES,
+                        help='transposition table megabytes per worker')
+    try:
+        asyncio.run(_serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
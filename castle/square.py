@@ -1,20 +1,21 @@
 from castle.piece import Piece
-from typing import List
 
 
 class Square:
+    __slots__ = ('rank', 'file', 'index', 'occupant')
+
     def __init__(self, rank: int, file: int):
         self.rank: int = rank
         self.file: int = file
+        # rank * 8 + file, as used by bitboards and move encodings
+        self.index: int = rank * 8 + file
         self.occupant: Piece = None
-        self.white_defenders: List[Square] = []
-        self.black_defenders: List[Square] = []
 
     def __eq__(self, other):
-        return self.notation() == other.notation()
+        return isinstance(other, Square) and self.index == other.index
 
     def __hash__(self):
-        return hash((self.rank, self.file, self.occupant))
+        return self.index
 
     def __repr__(self):
         return self.notation()
@@ -32,4 +33,3 @@ class Square:
     def notation(self):
         # ranks are 1-indexed
         return f'{Square.index_to_file(self.file)}{self.rank + 1}'
-
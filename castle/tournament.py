@@ -0,0 +1,320 @@
+import argparse
+import datetime
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from castle.game import Game
+from castle.piece import PieceType, Color
+from castle.pgn import PgnGame
+from castle.player import PlayerType
+from castle.search import Search
+from castle.transposition import TranspositionTable
+from castle.uci import search_time
+
+# Headless engine-vs-engine matches, with the games played across a pool of worker processes:
+#   python -m castle.tournament --games 100 --engine depth=3 --engine movetime=200 --pgn match.pgn
+# Each opening is played twice, once with each engine as white, so neither gets the better side of more openings.
+
+STARTING_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+# games still going after this many plies are drawn by adjudication
+DEFAULT_MAX_PLIES = 300
+# two-sided 95% confidence
+_Z_95 = 1.959964
+
+
+class EngineConfig:
+    """How one side of a match searches: its depth, time per move in milliseconds, and node limits.
+    Without any limit, it searches to DEFAULT_DEPTH.
+    """
+    DEFAULT_DEPTH = 3
+
+    def __init__(self,
+                 name: str,
+                 depth: Optional[int] = None,
+                 movetime: Optional[int] = None,
+                 nodes: Optional[int] = None,
+                 hash_megabytes: int = TranspositionTable.DEFAULT_MEGABYTES) -> None:
+        self.name = name
+        if depth is None and movetime is None and nodes is None:
+            depth = self.DEFAULT_DEPTH
+        self.depth = depth
+        self.movetime = movetime
+        self.nodes = nodes
+        self.hash_megabytes = hash_megabytes
+
+    def __repr__(self):
+        return f'<EngineConfig {self.name} depth={self.depth} movetime={self.movetime} nodes={self.nodes}>'
+
+    @classmethod
+    def from_spec(cls, spec: str, default_name: str) -> 'EngineConfig':
+        """An engine from a comma separated spec, like 'name=new,depth=4,movetime=100,nodes=5000,hash=32'
+        """
+        options: Dict[str, str] = {}
+        for item in filter(None, spec.split(',')):
+            name, _, value = item.partition('=')
+            options[name.strip()] = value.strip()
+        unknown = set(options) - {'name', 'depth', 'movetime', 'nodes', 'hash'}
+        if unknown:
+            raise ValueError(f'unknown engine options: {", ".join(sorted(unknown))}')
+        limits = {name: int(options[name]) for name in ('depth', 'movetime', 'nodes') if name in options}
+        return cls(options.get('name', default_name),
+                   hash_megabytes=int(options.get('hash', TranspositionTable.DEFAULT_MEGABYTES)),
+                   **limits)
+
+
+class TimeControl:
+    """A clock for each side: `base` seconds for the game, plus `increment` seconds after each move.
+    A side whose clock runs out loses on time, unless the opponent doesn't have the material to mate.
+    """
+    def __init__(self, base: float, increment: float = 0.0) -> None:
+        self.base = base
+        self.increment = increment
+
+    def __repr__(self):
+        return f'<TimeControl {self}>'
+
+    def __str__(self):
+        # as the PGN TimeControl tag writes it
+        return f'{self.base:g}+{self.increment:g}' if self.increment else f'{self.base:g}'
+
+    @classmethod
+    def parse(cls, text: str) -> 'TimeControl':
+        base, _, increment = text.partition('+')
+        return cls(float(base), float(increment or 0))
+
+
+def _insufficient_material(game: Game, color: Optional[Color] = None) -> bool:
+    """Neither side can mate: bare kings, or a king and one minor piece against a bare king.
+    Given a color, whether that side alone has too little to mate: a bare king, or a king and one minor piece.
+    """
+    piece_at = game.board.piece_at
+    minors = 0
+    for index in range(64):
+        piece = piece_at(index)
+        if not piece or piece.type == PieceType.KING or (color is not None and piece.color != color):
+            continue
+        if piece.type not in (PieceType.KNIGHT, PieceType.BISHOP):
+            return False
+        minors += 1
+        if minors > 1:
+            return False
+    return True
+
+
+def play_game(white: EngineConfig,
+              black: EngineConfig,
+              fen: str = STARTING_FEN,
+              time_control: Optional[TimeControl] = None,
+              max_plies: int = DEFAULT_MAX_PLIES) -> PgnGame:
+    """Play one game between two engines, and return its record. Each engine keeps its own transposition table for
+    the whole game.
+    """
+    game = Game(PlayerType.HUMAN, PlayerType.HUMAN, fen=fen)
+    engines = {Color.WHITE: white, Color.BLACK: black}
+    tables = {color: TranspositionTable(engine.hash_megabytes) for color, engine in engines.items()}
+    clocks = {color: time_control.base for color in engines} if time_control else {}
+    # how often each position has been reached, for threefold repetition
+    seen = {game.zobrist_key: 1}
+    record = PgnGame()
+    result, termination = '1/2-1/2', 'adjudication'
+
+    while len(record.moves) < max_plies:
+        color = game.current_player.color
+        if game.count_legal_moves() == 0:
+            if game.board.is_in_check(color):
+                result, termination = ('0-1' if color == Color.WHITE else '1-0'), 'checkmate'
+            else:
+                result, termination = '1/2-1/2', 'stalemate'
+            break
+        if game.halfmove_clock >= 100:
+            result, termination = '1/2-1/2', 'fifty move rule'
+            break
+        if _insufficient_material(game):
+            result, termination = '1/2-1/2', 'insufficient material'
+            break
+
+        engine = engines[color]
+        time_limit = engine.movetime / 1000 if engine.movetime is not None else None
+        if time_control:
+            budget = search_time(clocks[color], time_control.increment)
+            time_limit = budget if time_limit is None else min(time_limit, budget)
+        search = Search(game,
+                        max_depth=engine.depth or Search.DEFAULT_MAX_DEPTH,
+                        time_limit=time_limit,
+                        node_limit=engine.nodes,
+                        table=tables[color])
+        start = time.monotonic()
+        code = search.run().best_move.code
+        if time_control:
+            clocks[color] -= time.monotonic() - start
+            if clocks[color] < 0:
+                # a flag fall is only a loss if the opponent could still mate
+                if _insufficient_material(game, color.opposite()):
+                    result = '1/2-1/2'
+                else:
+                    result = '0-1' if color == Color.WHITE else '1-0'
+                termination = 'time forfeit'
+                break
+            clocks[color] += time_control.increment
+
+        record.moves.append(game.san(code))
+        game.make_move_code(code)
+        key = game.zobrist_key
+        seen[key] = seen.get(key, 0) + 1
+        if seen[key] >= 3:
+            result, termination = '1/2-1/2', 'threefold repetition'
+            break
+
+    record.headers['White'] = white.name
+    record.headers['Black'] = black.name
+    if fen != STARTING_FEN:
+        record.headers['SetUp'] = '1'
+        record.headers['FEN'] = fen
+    record.headers['TimeControl'] = str(time_control) if time_control else '-'
+    record.headers['Termination'] = termination
+    record.headers['PlyCount'] = str(len(record.moves))
+    record.result = result
+    return record
+
+
+def elo_difference(wins: int, draws: int, losses: int) -> Tuple[float, float]:
+    """The Elo difference the score implies, and its 95% confidence margin. A score of 0% or 100% gives an infinite
+    difference, and any score from a single outcome an infinite margin.
+    """
+    games = wins + draws + losses
+    if not games:
+        return 0.0, math.inf
+    score = (wins + draws / 2) / games
+    deviation = math.sqrt((wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games)
+
+    def elo(p: float) -> float:
+        if p <= 0:
+            return -math.inf
+        if p >= 1:
+            return math.inf
+        return 400 * math.log10(p / (1 - p))
+
+    if deviation == 0:
+        return elo(score), math.inf
+    error = _Z_95 * deviation / math.sqrt(games)
+    return elo(score), (elo(score + error) - elo(score - error)) / 2
+
+
+class MatchResult:
+    """The games of a match, in round order, and the score from the first engine's point of view
+    """
+    def __init__(self, first: EngineConfig, second: EngineConfig) -> None:
+        self.first = first
+        self.second = second
+        self.games: List[PgnGame] = []
+        self.wins = 0
+        self.draws = 0
+        self.losses = 0
+
+    def add(self, record: PgnGame) -> None:
+        self.games.append(record)
+        if record.result == '1/2-1/2':
+            self.draws += 1
+        elif (record.result == '1-0') == (record.headers['White'] == self.first.name):
+            self.wins += 1
+        else:
+            self.losses += 1
+
+    @property
+    def score(self) -> float:
+        games = self.wins + self.draws + self.losses
+        return (self.wins + self.draws / 2) / games if games else 0.0
+
+    def elo(self) -> Tuple[float, float]:
+        return elo_difference(self.wins, self.draws, self.losses)
+
+    def summary(self) -> str:
+        elo, margin = self.elo()
+        return f'{self.first.name} vs {self.second.name}: {self.wins} W, {self.draws} D, {self.losses} L ' \
+               f'({self.score:.1%} of {len(self.games)} games), Elo difference {elo:+.1f} +/- {margin:.1f}'
+
+    def write_pgn(self, path: str) -> None:
+        with open(path, 'w') as pgn_file:
+            pgn_file.write('\n'.join(record.to_pgn() for record in self.games))
+
+
+def _pairings(first: EngineConfig, second: EngineConfig, openings: Sequence[str],
+              games: int) -> Iterator[Tuple[int, EngineConfig, EngineConfig, str]]:
+    # each opening twice in a row, with the colors swapped the second time
+    for round_number in range(1, games + 1):
+        fen = openings[(round_number - 1) // 2 % len(openings)]
+        if round_number % 2:
+            yield round_number, first, second, fen
+        else:
+            yield round_number, second, first, fen
+
+
+def play_match(first: EngineConfig,
+               second: EngineConfig,
+               games: int,
+               openings: Optional[Sequence[str]] = None,
+               time_control: Optional[TimeControl] = None,
+               max_plies: int = DEFAULT_MAX_PLIES,
+               workers: Optional[int] = None,
+               event: str = 'castle match') -> MatchResult:
+    """Play a match between two engines, with the games spread over a pool of worker processes, one per CPU by
+    default. Games start from each opening FEN in turn, or the starting position if there are none.
+    """
+    if first.name == second.name:
+        raise ValueError(f'the engines need different names, both are called {first.name}')
+    openings = openings or [STARTING_FEN]
+    workers = workers or os.cpu_count() or 1
+    date = datetime.date.today().strftime('%Y.%m.%d')
+    records: Dict[int, PgnGame] = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(play_game, white, black, fen, time_control, max_plies): round_number
+                   for round_number, white, black, fen in _pairings(first, second, openings, games)}
+        for future in as_completed(futures):
+            records[futures[future]] = future.result()
+
+    match = MatchResult(first, second)
+    for round_number in sorted(records):
+        record = records[round_number]
+        record.headers.update(Event=event, Site='castle', Date=date, Round=str(round_number))
+        match.add(record)
+    return match
+
+
+def _read_openings(path: str) -> List[str]:
+    # one FEN per line, ignoring blank lines and # comments
+    with open(path) as openings_file:
+        return [line.strip() for line in openings_file if line.strip() and not line.startswith('#')]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='castle self-play matches')
+    parser.add_argument('--engine', action='append', default=[],
+                        help='engine options, like name=new,depth=4,movetime=100,nodes=5000,hash=32. Give two.')
+    parser.add_argument('--games', type=int, default=10)
+    parser.add_argument('--openings', help='file of opening FENs, one per line')
+    parser.add_argument('--tc', help='time control: seconds per game, plus an increment, like 10+0.1')
+    parser.add_argument('--max-plies', type=int, default=DEFAULT_MAX_PLIES)
+    parser.add_argument('--workers', type=int, help='worker processes, one per CPU by default')
+    parser.add_argument('--pgn', help='write the games to this PGN file')
+    args = parser.parse_args()
+
+    specs = args.engine + [''] * (2 - len(args.engine))
+    if len(specs) != 2:
+        parser.error('give at most two engines')
+    first = EngineConfig.from_spec(specs[0], 'castle-1')
+    second = EngineConfig.from_spec(specs[1], 'castle-2')
+    match = play_match(first, second, args.games,
+                       openings=_read_openings(args.openings) if args.openings else None,
+                       time_control=TimeControl.parse(args.tc) if args.tc else None,
+                       max_plies=args.max_plies,
+                       workers=args.workers)
+    if args.pgn:
+        match.write_pgn(args.pgn)
+    print(match.summary())
+
+
+if __name__ == '__main__':
+    main()
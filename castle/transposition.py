@@ -0,0 +1,108 @@
+from array import array
+from typing import Optional, Tuple
+
+from castle.move import NO_MOVE
+
+# how a stored score relates to the position's true score
+EXACT = 0
+# the search failed high: the true score is at least the stored score
+LOWER_BOUND = 1
+# the search failed low: the true score is at most the stored score
+UPPER_BOUND = 2
+
+_BOUND_MASK = 0b11
+_AGE_SHIFT = 2
+_AGE_MASK = 0b111111
+
+
+class TranspositionTable:
+    """Table of search results, keyed by Zobrist key, with a fixed memory footprint.
+
+    Entries are stored across preallocated arrays rather than as objects, so the table's size is set by its megabyte
+    budget up front and never grows. Each entry takes ENTRY_BYTES: the full key, score, the best move's 16-bit
+    encoding, depth, and the bound type packed with the age of the search which stored it. NO_MOVE is stored when a
+    search didn't find a best move, e.g. after failing low.
+
+    The table has two-entry buckets, like PerftCache. The first entry is replaced by a result from a newer search or
+    from an equal or deeper subtree; otherwise the second entry is always replaced.
+    """
+    ENTRY_BYTES = 16
+    DEFAULT_MEGABYTES = 16
+
+    def __init__(self, megabytes: float = DEFAULT_MEGABYTES) -> None:
+        buckets = int(megabytes * 1024 * 1024) // (self.ENTRY_BYTES * 2)
+        if buckets < 1:
+            raise ValueError(f'transposition table needs room for at least one bucket, got {megabytes}MB')
+        # round down to a power of two, so a bucket can be selected with a mask
+        buckets = 1 << (buckets.bit_length() - 1)
+        self._mask = buckets - 1
+        self.size = buckets * 2
+        self._keys = array('Q', [0]) * self.size
+        self._scores = array('i', [0]) * self.size
+        self._moves = array('H', [NO_MOVE]) * self.size
+        self._depths = array('b', [-1]) * self.size
+        self._flags = array('B', [0]) * self.size
+        self.age = 0
+        self.hits = 0
+        self.misses = 0
+        # probes which missed because the bucket was full of other positions
+        self.collisions = 0
+
+    @property
+    def footprint(self) -> int:
+        """The memory used by the table's entries, in bytes
+        """
+        return self.size * self.ENTRY_BYTES
+
+    def new_search(self) -> None:
+        """Start a new search, so entries from earlier searches are replaced first
+        """
+        self.age = (self.age + 1) & _AGE_MASK
+
+    def probe(self, key: int) -> Optional[Tuple[int, int, int, int]]:
+        """Returns the stored (depth, bound, score, move) for the position, or None
+        """
+        slot = (key & self._mask) << 1
+        for index in (slot, slot + 1):
+            if self._keys[index] == key and self._depths[index] >= 0:
+                self.hits += 1
+                return self._depths[index], self._flags[index] & _BOUND_MASK, self._scores[index], self._moves[index]
+        self.misses += 1
+        if self._depths[slot] >= 0 and self._depths[slot + 1] >= 0:
+            self.collisions += 1
+        return None
+
+    def store(self, key: int, depth: int, bound: int, score: int, move: int = NO_MOVE) -> None:
+        slot = (key & self._mask) << 1
+        stored_age = self._flags[slot] >> _AGE_SHIFT
+        if self._keys[slot] != key and stored_age == self.age and depth < self._depths[slot]:
+            slot += 1
+        # keep the best move found by an earlier search of this position, if this one didn't find one
+        if move == NO_MOVE and self._keys[slot] == key:
+            move = self._moves[slot]
+        self._keys[slot] = key
+        self._depths[slot] = depth
+        self._flags[slot] = (self.age << _AGE_SHIFT) | bound
+        self._scores[slot] = score
+        self._moves[slot] = move
+
+    def hashfull(self) -> int:
+        """How full the table is with entries from the current search, in permille, estimated from its first entries
+        """
+        sample = min(1000, self.size)
+        used = sum(
+            1 for index in range(sample)
+            if self._depths[index] >= 0 and self._flags[index] >> _AGE_SHIFT == self.age
+        )
+        return used * 1000 // sample
+
+    def clear(self) -> None:
+        self._keys = array('Q', [0]) * self.size
+        self._scores = array('i', [0]) * self.size
+        self._moves = array('H', [NO_MOVE]) * self.size
+        self._depths = array('b', [-1]) * self.size
+        self._flags = array('B', [0]) * self.size
+        self.age = 0
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
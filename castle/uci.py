@@ -0,0 +1,226 @@
+import sys
+import threading
+from typing import Callable, Iterable, List, Optional
+
+from castle.board import InvalidChessNotationError
+from castle.game import Game
+from castle.move import move_coordinates
+from castle.piece import Color
+from castle.player import PlayerType
+from castle.search import Search, SearchResult, MATE_SCORE, is_mate_score
+from castle.transposition import TranspositionTable
+
+# Universal Chess Interface front-end, so castle can be run by chess GUIs and tournament managers:
+#   python -m castle.uci
+# The search runs on a worker thread, so commands like stop and isready are answered while it's thinking.
+
+ENGINE_NAME = 'castle'
+ENGINE_AUTHOR = 'Phillip Tennen and Jake Goodman'
+MIN_HASH_MEGABYTES = 1
+MAX_HASH_MEGABYTES = 1024
+# without a movestogo, the clock is assumed to need to last this many more moves
+_DEFAULT_MOVES_TO_GO = 30
+# kept back from the clock, for the time taken to report the move
+_MOVE_OVERHEAD = 0.05
+
+
+def search_time(remaining: float, increment: float = 0.0, moves_to_go: Optional[int] = None) -> float:
+    """How many seconds to spend on a move, given the time left on the clock and the increment per move
+    """
+    moves = moves_to_go or _DEFAULT_MOVES_TO_GO
+    budget = remaining / moves + increment * 0.75
+    # never plan to use more than half of what's left
+    return max(0.01, min(budget, remaining / 2) - _MOVE_OVERHEAD)
+
+
+def format_score(score: int) -> str:
+    """The score as a UCI info score: centipawns, or the number of moves to mate, negative when being mated
+    """
+    if is_mate_score(score):
+        plies = MATE_SCORE - abs(score)
+        moves = (plies + 1) // 2
+        return f'mate {moves if score > 0 else -moves}'
+    return f'cp {score}'
+
+
+def format_info(result: SearchResult) -> str:
+    nps = int(result.nodes / result.elapsed) if result.elapsed > 0 else 0
+    info = f'info depth {result.depth} score {format_score(result.score)} nodes {result.nodes} nps {nps} ' \
+           f'time {int(result.elapsed * 1000)}'
+    if result.pv:
+        info += ' pv ' + ' '.join(move.coordinate_notation() for move in result.pv)
+    return info
+
+
+class UciEngine:
+    """Handles UCI commands one line at a time, writing its responses with `output`
+    """
+    def __init__(self, output: Optional[Callable[[str], None]] = None) -> None:
+        self._output = output or self._print
+        self._output_lock = threading.Lock()
+        self.game = Game(PlayerType.HUMAN, PlayerType.HUMAN)
+        self.hash_megabytes = TranspositionTable.DEFAULT_MEGABYTES
+        self.table = TranspositionTable(self.hash_megabytes)
+        self._search: Optional[Search] = None
+        self._thread: Optional[threading.Thread] = None
+        # set when a 'go infinite' search may report its move
+        self._infinite_done = threading.Event()
+
+    @staticmethod
+    def _print(line: str) -> None:
+        print(line, flush=True)
+
+    def send(self, line: str) -> None:
+        with self._output_lock:
+            self._output(line)
+
+    @property
+    def searching(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def run(self, lines: Optional[Iterable[str]] = None) -> None:
+        """Handle commands from the lines, or standard input, until 'quit' or the end of the input
+        """
+        for line in lines if lines is not None else sys.stdin:
+            if not self.handle(line):
+                return
+        self.wait()
+
+    def handle(self, line: str) -> bool:
+        """Handle one command. Returns False once the engine should exit.
+        """
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+        if command == 'uci':
+            self.send(f'id name {ENGINE_NAME}')
+            self.send(f'id author {ENGINE_AUTHOR}')
+            self.send(f'option name Hash type spin default {TranspositionTable.DEFAULT_MEGABYTES} '
+                      f'min {MIN_HASH_MEGABYTES} max {MAX_HASH_MEGABYTES}')
+            self.send('uciok')
+        elif command == 'isready':
+            self.send('readyok')
+        elif command == 'ucinewgame':
+            self.wait()
+            self.table.clear()
+            self.game = Game(PlayerType.HUMAN, PlayerType.HUMAN)
+        elif command == 'setoption':
+            self.set_option(args)
+        elif command == 'position':
+            self.wait()
+            self.set_position(args)
+        elif command == 'go':
+            self.wait()
+            self.go(args)
+        elif command == 'stop':
+            self.stop()
+        elif command == 'quit':
+            self.stop()
+            return False
+        # unknown commands are ignored, as the protocol asks
+        return True
+
+    def set_option(self, args: List[str]) -> None:
+        # setoption name <name> [value <value>]
+        if 'name' not in args:
+            return
+        value_index = args.index('value') if 'value' in args else len(args)
+        name = ' '.join(args[args.index('name') + 1:value_index]).lower()
+        value = ' '.join(args[value_index + 1:])
+        if name == 'hash':
+            try:
+                megabytes = int(value)
+            except ValueError:
+                return
+            self.wait()
+            self.hash_megabytes = max(MIN_HASH_MEGABYTES, min(megabytes, MAX_HASH_MEGABYTES))
+            self.table = TranspositionTable(self.hash_megabytes)
+
+    def set_position(self, args: List[str]) -> None:
+        # position startpos|fen <fen> [moves <move>...]
+        moves_index = args.index('moves') if 'moves' in args else len(args)
+        if args and args[0] == 'fen':
+            try:
+                game = Game(PlayerType.HUMAN, PlayerType.HUMAN, fen=' '.join(args[1:moves_index]))
+            except InvalidChessNotationError as e:
+                self.send(f'info string {e}')
+                return
+        else:
+            game = Game(PlayerType.HUMAN, PlayerType.HUMAN)
+        for coordinates in args[moves_index + 1:]:
+            code = next((code for code in game.generate_legal_codes() if move_coordinates(code) == coordinates), None)
+            if code is None:
+                self.send(f'info string illegal move {coordinates}')
+                break
+            game.make_move_code(code)
+        self.game = game
+
+    def go(self, args: List[str]) -> None:
+        """Start searching the current position on the worker thread, which reports its best move when it's done
+        """
+        options = {}
+        infinite = 'infinite' in args
+        for name, value in zip(args, args[1:]):
+            if name in ('depth', 'movetime', 'wtime', 'btime', 'winc', 'binc', 'movestogo', 'nodes'):
+                try:
+                    options[name] = int(value)
+                except ValueError:
+                    pass
+
+        time_limit = None
+        if 'movetime' in options:
+            time_limit = options['movetime'] / 1000
+        elif not infinite:
+            white = self.game.current_player.color == Color.WHITE
+            remaining = options.get('wtime' if white else 'btime')
+            if remaining is not None:
+                increment = options.get('winc' if white else 'binc', 0)
+                time_limit = search_time(remaining / 1000, increment / 1000, options.get('movestogo'))
+
+        self._search = Search(self.game,
+                              max_depth=options.get('depth', Search.DEFAULT_MAX_DEPTH),
+                              time_limit=time_limit,
+                              node_limit=options.get('nodes'),
+                              table=self.table,
+                              on_iteration=lambda result: self.send(format_info(result)))
+        self._infinite_done.clear()
+        if not infinite:
+            self._infinite_done.set()
+        self._thread = threading.Thread(target=self._think, args=(self._search,), daemon=True)
+        self._thread.start()
+
+    def _think(self, search: Search) -> None:
+        result = search.run()
+        # 'go infinite' mustn't report its move until it's told to stop
+        self._infinite_done.wait()
+        best_move = result.best_move.coordinate_notation() if result.best_move else '0000'
+        self.send(f'bestmove {best_move}')
+
+    def stop(self) -> None:
+        """Stop any search in progress, and wait for it to report its move
+        """
+        if self._search is not None:
+            self._search.stop()
+        self._infinite_done.set()
+        self.wait()
+
+    def wait(self) -> None:
+        """Wait for the search in progress to finish and report its move, before changing what it's searching.
+        A 'go infinite' search never finishes on its own, so it's stopped.
+        """
+        if not self._infinite_done.is_set():
+            self.stop()
+            return
+        if self._thread is not None:
+            self._thread.join()
+        self._search = None
+        self._thread = None
+
+
+def main() -> None:
+    UciEngine().run()
+
+
+if __name__ == '__main__':
+    main()
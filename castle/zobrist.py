@@ -0,0 +1,38 @@
+import random
+from typing import List
+
+from castle.piece import Piece, Color
+
+# Keys are generated from a fixed seed, so the same position hashes to the same key in every process.
+_rng = random.Random(0x636173746c65)
+
+# PIECE_KEYS[color.value][piece_type.value][square index]. Index 0 of the piece type list is unused.
+PIECE_KEYS: List[List[List[int]]] = [
+    [[_rng.getrandbits(64) for _ in range(64)] for _ in range(7)]
+    for _ in range(2)
+]
+# XORed in when black is to move
+SIDE_TO_MOVE_KEY: int = _rng.getrandbits(64)
+# CASTLING_KEYS[castling rights bitmask], one key per combination of the four CASTLE_* flags
+CASTLING_KEYS: List[int] = [0] + [_rng.getrandbits(64) for _ in range(15)]
+# EN_PASSANT_KEYS[file] is XORed in when the player to move can capture en passant on that file
+EN_PASSANT_KEYS: List[int] = [_rng.getrandbits(64) for _ in range(8)]
+
+
+def piece_key(piece: Piece, rank: int, file: int) -> int:
+    return PIECE_KEYS[piece.color.value][piece.type.value][rank * 8 + file]
+
+
+def compute_key(game: 'Game') -> int:
+    """Compute a game's Zobrist key from scratch.
+    Game.zobrist_key is maintained incrementally, so this is only needed to verify it.
+    """
+    key = 0
+    for square in game.board.squares_occupied():
+        key ^= piece_key(square.occupant, square.rank, square.file)
+    if game.current_player.color == Color.BLACK:
+        key ^= SIDE_TO_MOVE_KEY
+    key ^= CASTLING_KEYS[game.castling_rights]
+    if game.en_passant_eligible():
+        key ^= EN_PASSANT_KEYS[game.en_passant_target_square.file]
+    return key
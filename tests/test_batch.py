@@ -0,0 +1,49 @@
+import unittest
+
+from castle import Game, Board, PlayerType, Color, FenGameConstructor
+from castle import batch
+from castle.evaluation import evaluate
+
+_FENS = [
+    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
+    'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+    '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+    '4k3/8/8/8/8/8/8/1N2K3 w - - 0 1',
+]
+
+
+class BatchEvaluationTests(unittest.TestCase):
+    def boards(self):
+        return [FenGameConstructor(fen).game.board for fen in _FENS]
+
+    def test_encoding(self):
+        codes = batch.encode_board(Game(PlayerType.HUMAN, PlayerType.HUMAN, board_type=Board).board)
+        # a1 holds a white rook, and e8 the black king
+        self.assertEqual(4, codes[0])
+        self.assertEqual(-6, codes[60])
+        self.assertEqual(1, codes[8])
+        self.assertEqual(32, sum(1 for code in codes if code))
+
+    def test_scores(self):
+        scores = [int(score) for score in batch.evaluate_boards(self.boards())]
+        self.assertEqual(len(_FENS), len(scores))
+        # the start position is symmetric
+        self.assertEqual(0, scores[0])
+        # a knight up, and the knight adds some mobility
+        knight = FenGameConstructor(_FENS[3]).game.board
+        self.assertGreater(scores[3], evaluate(knight, Color.WHITE))
+
+    def test_material_and_pst_match_evaluation(self):
+        # with only kings and pawns there's no mobility term, so the batch score is the incremental evaluation's
+        board = FenGameConstructor('4k3/2p2p2/8/3P4/8/5P2/8/4K3 w - - 0 1').game.board
+        self.assertEqual([evaluate(board, Color.WHITE)], [int(score) for score in batch.evaluate_boards([board])])
+
+    @unittest.skipUnless(batch.HAS_NUMPY, 'NumPy is not installed')
+    def test_numpy_matches_pure_python(self):
+        encoded = batch.encode_boards(self.boards())
+        self.assertEqual((len(_FENS), 64), encoded.shape)
+        self.assertEqual('int8', str(encoded.dtype))
+        pure = [batch._evaluate_codes(codes) for codes in encoded.tolist()]
+        scores = batch.evaluate_encoded(encoded)
+        self.assertEqual('int32', str(scores.dtype))
+        self.assertEqual(pure, scores.tolist())
@@ -0,0 +1,49 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from castle.bench import BENCHMARKS, compare, main, run_benchmarks
+
+
+class BenchTests(unittest.TestCase):
+    def test_run_benchmarks(self):
+        results = run_benchmarks(['fen', 'san', 'perft'], repeat=1)
+        self.assertEqual(['fen', 'san', 'perft'], list(results['benchmarks']))
+        for result in results['benchmarks'].values():
+            self.assertGreater(result['operations'], 0)
+            self.assertGreater(result['per_second'], 0)
+        with self.assertRaises(ValueError):
+            run_benchmarks(['nothing'])
+
+    def test_compare(self):
+        def results(**speeds):
+            return {'benchmarks': {name: {'per_second': speed} for name, speed in speeds.items()}}
+
+        baseline = results(perft=1000, fen=100, san=50)
+        self.assertEqual([], compare(results(perft=950, fen=120, movegen=1), baseline, 0.1))
+        regressions = compare(results(perft=850, fen=100), baseline, 0.1)
+        self.assertEqual(['perft'], [name for name, _ in regressions])
+        self.assertAlmostEqual(-0.15, regressions[0][1])
+
+    def test_baseline(self):
+        path = os.path.join(tempfile.mkdtemp(), 'baseline.json')
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(0, main(['fen', '--repeat', '1', '--json', path]))
+            with open(path) as baseline_file:
+                baseline = json.load(baseline_file)
+            self.assertIn('fen', baseline['benchmarks'])
+
+            # a baseline far faster than this machine can manage is a regression
+            baseline['benchmarks']['fen']['per_second'] *= 1000
+            with open(path, 'w') as baseline_file:
+                json.dump(baseline, baseline_file)
+            with contextlib.redirect_stderr(io.StringIO()) as errors:
+                self.assertEqual(1, main(['fen', '--repeat', '1', '--baseline', path]))
+            self.assertIn('regression: fen', errors.getvalue())
+        os.remove(path)
+
+    def test_every_benchmark_is_named(self):
+        self.assertEqual({'perft', 'movegen', 'legality', 'fen', 'san', 'search'}, set(BENCHMARKS))
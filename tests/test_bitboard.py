@@ -0,0 +1,104 @@
+import unittest
+
+from castle import Game, Board, BitBoard, Piece, PieceType, Color, PlayerType, FenGameConstructor
+from castle.bitboard import KNIGHT_ATTACKS, KING_ATTACKS, rook_attacks, bishop_attacks, iter_bits, square_index
+
+
+class BitBoardTests(unittest.TestCase):
+    def assert_same_moves(self, fen: str):
+        bitboard_game = FenGameConstructor(fen).game
+        self.assertIsInstance(bitboard_game.board, BitBoard)
+        list_board = Board()
+        for square in bitboard_game.board.squares_occupied():
+            list_board.place_piece(square.occupant, square.notation())
+
+        for color in [Color.WHITE, Color.BLACK]:
+            self.assertEqual(list_board.get_all_moves(color), bitboard_game.board.get_all_moves(color))
+            for square in list_board.squares_matching_filter(color=color):
+                bitboard_square = bitboard_game.board.square_from_notation(square.notation())
+                self.assertEqual(
+                    {s.notation() for s in list_board.get_moves(square)},
+                    {s.notation() for s in bitboard_game.board.get_moves(bitboard_square)}
+                )
+
+    def test_moves_match_list_board(self):
+        self.assert_same_moves('rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq -')
+        self.assert_same_moves('r3k2r/p6p/8/B7/1pp1p3/3b4/P6P/R3K2R w KQkq -')
+        self.assert_same_moves('r3k2r/pb3p2/5npp/n2p4/1p1PPB2/6P1/P2N1PBP/R3K2R b KQkq -')
+        self.assert_same_moves('r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq -')
+
+    def test_attack_tables(self):
+        a1 = square_index(0, 0)
+        e4 = square_index(3, 4)
+        self.assertEqual(2, len(list(iter_bits(KNIGHT_ATTACKS[a1]))))
+        self.assertEqual(8, len(list(iter_bits(KNIGHT_ATTACKS[e4]))))
+        self.assertEqual(3, len(list(iter_bits(KING_ATTACKS[a1]))))
+        self.assertEqual(8, len(list(iter_bits(KING_ATTACKS[e4]))))
+        # empty board
+        self.assertEqual(14, len(list(iter_bits(rook_attacks(e4, 0)))))
+        self.assertEqual(13, len(list(iter_bits(bishop_attacks(e4, 0)))))
+        # a blocker on e6 stops the ray, but is itself attacked
+        blocked = rook_attacks(e4, 1 << square_index(5, 4))
+        self.assertTrue(blocked & (1 << square_index(5, 4)))
+        self.assertFalse(blocked & (1 << square_index(6, 4)))
+
+    def test_bitboards_follow_square_api(self):
+        board = BitBoard()
+        rook = Piece(PieceType.ROOK, Color.BLACK)
+        board.place_piece(rook, 'a3')
+        a3 = square_index(2, 0)
+        self.assertEqual(1 << a3, board.pieces(PieceType.ROOK, Color.BLACK))
+        self.assertEqual(1 << a3, board.occupancy(Color.BLACK))
+        self.assertEqual(0, board.occupancy(Color.WHITE))
+        self.assertEqual(rook, board.square_from_notation('a3').occupant)
+
+        board.move_piece_to_location(board.square_from_notation('a3'), 'h3')
+        self.assertEqual(1 << square_index(2, 7), board.occupancy())
+        self.assertEqual(['h3'], [s.notation() for s in board.squares_matching_filter(type=PieceType.ROOK)])
+
+        board.clear()
+        self.assertEqual(0, board.occupancy())
+        self.assertEqual([], list(board.squares_occupied()))
+
+    def test_copy_is_bitboard(self):
+        g = Game(PlayerType.HUMAN, PlayerType.HUMAN)
+        clone = g.board.copy()
+        self.assertIsInstance(clone, BitBoard)
+        self.assertEqual(g.board.occupancy(), clone.occupancy())
+
+    def test_selectable_board_type(self):
+        g = Game(PlayerType.HUMAN, PlayerType.HUMAN, board_type=Board)
+        self.assertNotIsInstance(g.board, BitBoard)
+        self.assertEqual(20, len(g.get_all_legal_moves(Color.WHITE)))
+
+    def test_generate_legal_captures(self):
+        g = FenGameConstructor('r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1').game
+        captures = g.generate_legal_captures()
+        expected = [move for move in g.generate_legal_moves() if move.is_capture]
+        self.assertEqual(8, len(captures))
+        self.assertEqual(set(expected), set(captures))
+        # quiet promotions are included, and castling isn't
+        g = FenGameConstructor('4k3/1P6/8/8/8/8/8/R3K3 w Q - 0 1').game
+        self.assertEqual(['b7b8b', 'b7b8n', 'b7b8q', 'b7b8r'],
+                         sorted(move.coordinate_notation() for move in g.generate_legal_captures()))
+        # the list-based Board gives the same captures
+        g = Game(PlayerType.HUMAN, PlayerType.HUMAN, board_type=Board)
+        g.apply_record('1. e4 d5 ')
+        self.assertEqual(['e4d5'], [move.coordinate_notation() for move in g.generate_legal_captures()])
+        self.assertEqual(1, len(g.board.get_all_captures(Color.WHITE)))
+
+    def test_static_exchange(self):
+        def exchange(fen: str, coordinates: str) -> int:
+            g = FenGameConstructor(fen).game
+            move = next(move for move in g.generate_legal_moves() if move.coordinate_notation() == coordinates)
+            return g.board.static_exchange(move.code)
+
+        # an undefended pawn
+        self.assertEqual(1, exchange('4k3/8/8/3p4/8/8/8/3RK3 w - - 0 1', 'd1d5'))
+        # a pawn defended by a pawn loses the rook for it
+        self.assertEqual(-4, exchange('4k3/8/4p3/3p4/8/8/8/3RK3 w - - 0 1', 'd1d5'))
+        # a knight defended by a pawn, taken by a pawn
+        self.assertEqual(2, exchange('4k3/8/2p5/3n4/4P3/8/8/4K3 w - - 0 1', 'e4d5'))
+        # the rook behind the first one joins the exchange once the first has captured
+        self.assertEqual(1, exchange('3rk3/8/8/3p4/8/8/3R4/3RK3 w - - 0 1', 'd2d5'))
+        self.assertEqual(-4, exchange('3rk3/3r4/8/3p4/8/8/3R4/3RK3 w - - 0 1', 'd2d5'))
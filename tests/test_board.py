@@ -1,6 +1,6 @@
 import unittest
 
-from castle import Board, Piece, PieceType, Color, InvalidChessNotationError
+from castle import Board, BitBoard, Piece, PieceType, Color, InvalidChessNotationError, MoveParser, CastleMove
 
 
 class BoardTests(unittest.TestCase):
@@ -231,3 +231,106 @@ class BoardTests(unittest.TestCase):
         self.assertTrue(board.is_in_check(Color.WHITE))
         board.move_piece_to_location(board.square_from_notation('e1'), 'd2')
         self.assertFalse(board.is_in_check(Color.WHITE))
+
+    def test_make_unmake_capture(self):
+        board = Board()
+        board.place_piece(Piece(PieceType.ROOK, Color.WHITE), 'a1')
+        board.place_piece(Piece(PieceType.KNIGHT, Color.BLACK), 'a7')
+        move = MoveParser.move_from_squares(board.square_from_notation('a1'), board.square_from_notation('a7'))
+        undo = board.make_move(move)
+        self.assertEqual(Piece(PieceType.ROOK, Color.WHITE), board.piece_from_notation('a7'))
+        self.assertIsNone(board.piece_from_notation('a1'))
+        self.assertEqual(Piece(PieceType.KNIGHT, Color.BLACK), undo.captured_piece)
+
+        board.unmake_move(move, undo)
+        self.assertEqual(Piece(PieceType.ROOK, Color.WHITE), board.piece_from_notation('a1'))
+        self.assertEqual(Piece(PieceType.KNIGHT, Color.BLACK), board.piece_from_notation('a7'))
+
+    def test_make_unmake_promotion(self):
+        board = BitBoard()
+        board.place_piece(Piece(PieceType.PAWN, Color.WHITE), 'b7')
+        board.place_piece(Piece(PieceType.ROOK, Color.BLACK), 'c8')
+        move = MoveParser.move_from_squares(board.square_from_notation('b7'), board.square_from_notation('c8'))
+        move.promotion = PieceType.KNIGHT
+        undo = board.make_move(move)
+        self.assertEqual(Piece(PieceType.KNIGHT, Color.WHITE), board.piece_from_notation('c8'))
+        self.assertEqual(0, board.pieces(PieceType.PAWN, Color.WHITE))
+
+        board.unmake_move(move, undo)
+        self.assertEqual(Piece(PieceType.PAWN, Color.WHITE), board.piece_from_notation('b7'))
+        self.assertEqual(Piece(PieceType.ROOK, Color.BLACK), board.piece_from_notation('c8'))
+        self.assertEqual(0, board.pieces(PieceType.KNIGHT, Color.WHITE))
+
+    def test_make_unmake_castle(self):
+        board = Board()
+        board.place_piece(Piece(PieceType.KING, Color.BLACK), 'e8')
+        board.place_piece(Piece(PieceType.ROOK, Color.BLACK), 'a8')
+        move = CastleMove(Color.BLACK, False)
+        undo = board.make_move(move)
+        self.assertEqual(Piece(PieceType.KING, Color.BLACK), board.piece_from_notation('c8'))
+        self.assertEqual(Piece(PieceType.ROOK, Color.BLACK), board.piece_from_notation('d8'))
+
+        board.unmake_move(move, undo)
+        self.assertEqual(Piece(PieceType.KING, Color.BLACK), board.piece_from_notation('e8'))
+        self.assertEqual(Piece(PieceType.ROOK, Color.BLACK), board.piece_from_notation('a8'))
+        self.assertIsNone(board.piece_from_notation('c8'))
+        self.assertIsNone(board.piece_from_notation('d8'))
+
+    def test_is_square_attacked(self):
+        for board in [Board(), BitBoard()]:
+            board.place_piece(Piece(PieceType.ROOK, Color.BLACK), 'a8')
+            board.place_piece(Piece(PieceType.PAWN, Color.WHITE), 'a4')
+            board.place_piece(Piece(PieceType.PAWN, Color.BLACK), 'e5')
+            board.place_piece(Piece(PieceType.KNIGHT, Color.WHITE), 'g1')
+            # rook ray stops at the pawn
+            self.assertTrue(board.is_square_attacked(board.square_from_notation('a5'), Color.BLACK))
+            self.assertTrue(board.is_square_attacked(board.square_from_notation('a4'), Color.BLACK))
+            self.assertFalse(board.is_square_attacked(board.square_from_notation('a3'), Color.BLACK))
+            # pawns only attack diagonally forwards
+            self.assertTrue(board.is_square_attacked(board.square_from_notation('d4'), Color.BLACK))
+            self.assertFalse(board.is_square_attacked(board.square_from_notation('e4'), Color.BLACK))
+            self.assertFalse(board.is_square_attacked(board.square_from_notation('d6'), Color.BLACK))
+            self.assertTrue(board.is_square_attacked(board.square_from_notation('b5'), Color.WHITE))
+            self.assertTrue(board.is_square_attacked(board.square_from_notation('f3'), Color.WHITE))
+            self.assertFalse(board.is_square_attacked(board.square_from_notation('g3'), Color.WHITE))
+
+    def test_is_square_attacked_matches_bitboard(self):
+        from castle import FenGameConstructor
+        game = FenGameConstructor('r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq -').game
+        list_board = Board()
+        for square in game.board.squares_occupied():
+            list_board.place_piece(square.occupant, square.notation())
+        for square in list_board.squares_all():
+            bitboard_square = game.board.square_from_notation(square.notation())
+            for color in [Color.WHITE, Color.BLACK]:
+                self.assertEqual(list_board.is_square_attacked(square, color),
+                                 game.board.is_square_attacked(bitboard_square, color),
+                                 f'{square} attacked by {color}')
+
+    def test_pieces_are_shared(self):
+        import copy
+        import pickle
+        piece = Piece(PieceType.KNIGHT, Color.BLACK)
+        self.assertIs(piece, Piece(PieceType.KNIGHT, Color.BLACK))
+        self.assertIsNot(piece, Piece(PieceType.KNIGHT, Color.WHITE))
+        self.assertEqual(3, piece.value)
+        self.assertIs(piece, pickle.loads(pickle.dumps(piece)))
+        self.assertIs(piece, copy.deepcopy(piece))
+        with self.assertRaises(AttributeError):
+            piece.type = PieceType.QUEEN
+
+        self.board.place_piece(piece, 'c6')
+        self.assertIs(piece, self.board.copy().square_from_notation('c6').occupant)
+
+    def test_squares_compare_by_coordinates(self):
+        square = self.board.square_from_notation('e4')
+        other_board_square = BitBoard().square_from_notation('e4')
+        self.assertEqual(28, square.index)
+        self.assertEqual(square, other_board_square)
+        self.assertEqual(hash(square), hash(other_board_square))
+        self.assertNotEqual(square, self.board.square_from_notation('e5'))
+        self.assertNotEqual(square, 'e4')
+        # the hash doesn't change with the occupant
+        self.board.place_piece(Piece(PieceType.PAWN, Color.WHITE), 'e4')
+        self.assertEqual(hash(other_board_square), hash(square))
+        self.assertFalse(hasattr(square, '__dict__'))
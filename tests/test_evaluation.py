@@ -0,0 +1,49 @@
+import unittest
+
+from castle import Game, Board, BitBoard, PlayerType, Color, FenGameConstructor
+from castle.evaluation import evaluate, compute_scores, MAX_PHASE
+
+
+class EvaluationTests(unittest.TestCase):
+    def assert_scores_match(self, g: Game):
+        self.assertEqual(compute_scores(g.board), (g.board.midgame_score, g.board.endgame_score, g.board.phase))
+
+    def test_start_position_is_balanced(self):
+        for board_type in [Board, BitBoard]:
+            g = Game(PlayerType.HUMAN, PlayerType.HUMAN, board_type=board_type)
+            self.assertEqual(0, g.board.midgame_score)
+            self.assertEqual(0, g.board.endgame_score)
+            self.assertEqual(MAX_PHASE, g.board.phase)
+            self.assert_scores_match(g)
+
+    def test_scores_follow_moves(self):
+        g = FenGameConstructor('r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1').game
+        start = (g.board.midgame_score, g.board.endgame_score, g.board.phase)
+        self.assert_scores_match(g)
+        # every kind of move: captures, castling, promotions and en passant
+        for first in g.generate_legal_moves():
+            g.make_move(first)
+            self.assert_scores_match(g)
+            for second in g.generate_legal_moves():
+                g.make_move(second)
+                self.assert_scores_match(g)
+                g.unmake_move()
+            g.unmake_move()
+        self.assertEqual(start, (g.board.midgame_score, g.board.endgame_score, g.board.phase))
+
+        g = FenGameConstructor('4k3/1P6/8/8/8/8/8/4K3 w - - 0 1').game
+        before = evaluate(g.board, Color.WHITE)
+        g.make_move(next(move for move in g.generate_legal_moves() if move.coordinate_notation() == 'b7b8q'))
+        self.assert_scores_match(g)
+        self.assertGreater(evaluate(g.board, Color.WHITE), before + 700)
+        self.assertEqual(4, g.board.phase)
+
+    def test_evaluation(self):
+        # a knight up, from either side's point of view
+        g = FenGameConstructor('4k3/8/8/8/8/8/8/1N2K3 w - - 0 1').game
+        self.assertGreater(evaluate(g.board, Color.WHITE), 200)
+        self.assertEqual(-evaluate(g.board, Color.WHITE), evaluate(g.board, Color.BLACK))
+        # in the endgame, the king belongs in the centre
+        centre = FenGameConstructor('4k3/8/8/8/3K4/8/8/8 w - - 0 1').game
+        corner = FenGameConstructor('4k3/8/8/8/8/8/8/K7 w - - 0 1').game
+        self.assertGreater(evaluate(centre.board, Color.WHITE), evaluate(corner.board, Color.WHITE))
@@ -1,7 +1,8 @@
 import unittest
 
 import castle
-from castle import Game, Board, Piece, PieceType, Color, InvalidChessNotationError, PlayerType, MoveParser, FenGameConstructor
+from castle import Game, Board, Piece, PieceType, Color, InvalidChessNotationError, PlayerType, MoveParser, FenGameConstructor, EnPassantMove, CastleMove
+from castle.move import move_coordinates
 
 
 class GameTests(unittest.TestCase):
@@ -185,3 +186,189 @@ class GameTests(unittest.TestCase):
             },
             board.get_moves(board.square_from_notation('e4'))
         )
+
+    def test_undo_restores_game_state(self):
+        g = castle.Game(PlayerType.HUMAN, PlayerType.HUMAN)
+        g.apply_record('1. e4 d5 2. Nf3 Nh6 3. Bc4 Nc6 4. e5 a6')
+        g.apply_notation('O-O')
+        g.apply_notation('f5')
+        self.assertFalse(g.can_white_castle_short)
+        self.assertEqual('f6', g.en_passant_target_square.notation())
+        self.assertTrue(g.en_passant_eligible())
+
+        g.undo_move()
+        self.assertIsNone(g.en_passant_target_square)
+        g.undo_move()
+        self.assertTrue(g.can_white_castle_short)
+        self.assertTrue(g.can_white_castle_long)
+        self.check_contains_piece(g, 'e1', PieceType.KING, Color.WHITE)
+        self.check_contains_piece(g, 'h1', PieceType.ROOK, Color.WHITE)
+        self.assertEqual(Color.WHITE, g.current_player.color)
+
+    def test_rook_capture_removes_castling_rights(self):
+        g = FenGameConstructor('r3k2r/8/8/8/8/8/6B1/R3K2R w KQkq - 0 1').game
+        g.apply_notation('Bxa8')
+        self.assertFalse(g.can_black_castle_long)
+        self.assertTrue(g.can_black_castle_short)
+        g.undo_move()
+        self.assertTrue(g.can_black_castle_long)
+        self.assertEqual(Piece(PieceType.ROOK, Color.BLACK), g.board.piece_from_notation('a8'))
+
+    def test_generate_legal_moves_matches_filtered_moves(self):
+        g = FenGameConstructor('r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq -').game
+        self.assertEqual(g.get_all_legal_moves(Color.WHITE), set(g.generate_legal_moves()))
+        self.assertEqual(g.get_all_legal_moves(Color.BLACK), set(g.generate_legal_moves(Color.BLACK)))
+
+    def test_generate_legal_moves_double_check(self):
+        g = FenGameConstructor('4k3/8/8/8/8/8/3n4/R3K2r w Q - 0 1').game
+        # the h1 rook and d2 knight both give check, so only the king can move
+        moves = g.generate_legal_moves()
+        self.assertTrue(moves)
+        for move in moves:
+            self.assertEqual(PieceType.KING, move.active_piece.type)
+        self.assertEqual({'d2', 'e2', 'f2'}, {m.to_square.notation() for m in moves})
+
+    def test_generate_legal_moves_pinned_piece(self):
+        g = FenGameConstructor('4k3/4r3/8/8/8/8/4B3/4K3 w - - 0 1').game
+        # the bishop is pinned to the king by the rook, and can't move at all
+        moves = g.generate_legal_moves()
+        self.assertFalse([m for m in moves if m.active_piece.type == PieceType.BISHOP])
+
+    def test_generate_legal_moves_en_passant_discovered_check(self):
+        g = FenGameConstructor('8/8/8/KPp4r/8/8/8/7k w - c6 0 1').game
+        # capturing en passant would remove both pawns from the 5th rank, exposing the king to the rook
+        moves = g.generate_legal_moves()
+        self.assertFalse([m for m in moves if type(m) == EnPassantMove])
+
+        g = FenGameConstructor('8/8/8/1Pp4r/K7/8/8/7k w - c6 0 1').game
+        self.assertEqual(1, len([m for m in g.generate_legal_moves() if type(m) == EnPassantMove]))
+
+    def test_checkmate(self):
+        g = castle.Game(PlayerType.HUMAN, PlayerType.HUMAN)
+        g.apply_record('1. f3 e5 2. g4 ')
+        self.assertFalse(g.finished)
+        g.apply_notation('Qh4')
+        self.assertTrue(g.is_in_checkmate(Color.WHITE))
+        self.assertFalse(g.is_in_stalemate(Color.WHITE))
+        self.assertTrue(g.finished)
+        self.assertEqual(castle.Winner.BLACK, g.winner)
+
+    def test_stalemate(self):
+        g = FenGameConstructor('7k/5Q2/6K1/8/8/8/8/8 b - - 0 1').game
+        self.assertTrue(g.is_in_stalemate(Color.BLACK))
+        self.assertFalse(g.is_in_checkmate(Color.BLACK))
+
+    def play_coordinates(self, game: Game, coordinates: str):
+        """Play a legal move given as source and destination squares, with an optional promotion piece: e7e8n
+        """
+        promotion = PieceType.type_from_symbol(coordinates[4].upper()) if len(coordinates) > 4 else None
+        for move in game.generate_legal_moves():
+            if type(move) == CastleMove:
+                continue
+            if f'{move.from_square}{move.to_square}' == coordinates[:4] and move.promotion == promotion:
+                game.apply_move(move)
+                return
+        self.fail(f'{coordinates} is not legal')
+
+    def test_zobrist_key_is_incremental(self):
+        from castle.zobrist import compute_key
+        g = castle.Game(PlayerType.HUMAN, PlayerType.HUMAN)
+        keys = [g.zobrist_key]
+        self.assertEqual(compute_key(g), g.zobrist_key)
+        # covers en passant, captures, an underpromotion and castling
+        for coordinates in ['e2e4', 'd7d5', 'e4e5', 'f7f5', 'e5f6', 'b8c6', 'f6g7', 'c8e6', 'g7h8n', 'd8d6', 'g1f3']:
+            self.play_coordinates(g, coordinates)
+            self.assertEqual(compute_key(g), g.zobrist_key, coordinates)
+            keys.append(g.zobrist_key)
+        g.apply_notation('O-O-O')
+        self.assertEqual(compute_key(g), g.zobrist_key)
+        keys.append(g.zobrist_key)
+        # every position in this game is distinct
+        self.assertEqual(len(keys), len(set(keys)))
+
+        # undoing restores every key
+        while len(g.moves):
+            keys.pop()
+            g.undo_move()
+            self.assertEqual(keys[-1], g.zobrist_key)
+            self.assertEqual(compute_key(g), g.zobrist_key)
+
+    def test_zobrist_key_transpositions(self):
+        g1 = castle.Game(PlayerType.HUMAN, PlayerType.HUMAN)
+        g1.apply_record('1. Nf3 Nf6 2. Nc3 ')
+        g2 = castle.Game(PlayerType.HUMAN, PlayerType.HUMAN)
+        g2.apply_record('1. Nc3 Nf6 2. Nf3 ')
+        self.assertEqual(g1.zobrist_key, g2.zobrist_key)
+
+        # same pieces, but different side to move
+        g3 = castle.Game(PlayerType.HUMAN, PlayerType.HUMAN)
+        g3.apply_record('1. Nc3 Nf6 2. Nf3 Ng8 3. Ng1 Nf6 ')
+        self.assertNotEqual(g1.zobrist_key, g3.zobrist_key)
+
+        # same pieces and side to move, but castling rights were lost
+        g4 = castle.Game(PlayerType.HUMAN, PlayerType.HUMAN)
+        g4.apply_record('1. Nf3 Nf6 2. Rg1 Ng8 3. Rh1 Nf6 4. Nc3 ')
+        self.assertEqual(g1.board.zobrist_key, g4.board.zobrist_key)
+        self.assertNotEqual(g1.zobrist_key, g4.zobrist_key)
+
+    def test_move_encoding_round_trip(self):
+        # every kind of move: quiet, captures, double pushes, castling, en passant and promotions
+        for fen in ['r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+                    'rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 1',
+                    'n1n5/PPPk4/8/8/8/8/4Kppp/5N1N b - - 0 1']:
+            g = FenGameConstructor(fen).game
+            codes = g.generate_legal_codes()
+            self.assertEqual(len(set(codes)), len(codes))
+            for code in codes:
+                move = g.board.move_from_code(code)
+                self.assertEqual(code, move.code)
+                self.assertEqual(move_coordinates(code), move.coordinate_notation())
+                fen_before = g.to_fen()
+                g.make_move_code(code)
+                # the Move rebuilt from the history is the one which was made
+                self.assertEqual(move, g.moves[-1])
+                self.assertEqual(move, g.unmake_move())
+                self.assertEqual(fen_before, g.to_fen())
+
+    def test_moves_built_lazily(self):
+        g = Game(PlayerType.HUMAN, PlayerType.HUMAN)
+        for coordinates in ['e2e4', 'd7d5', 'e4d5', 'g8f6']:
+            self.play_coordinates(g, coordinates)
+        self.assertEqual(4, len(g.move_codes))
+        self.assertEqual(['e2e4', 'd7d5', 'e4d5', 'g8f6'], [move.coordinate_notation() for move in g.moves])
+        self.assertTrue(g.moves[2].is_capture)
+        # the list-based Board makes encoded moves too
+        list_game = Game(PlayerType.HUMAN, PlayerType.HUMAN, board_type=Board)
+        for code in g.move_codes:
+            list_game.make_move_code(code)
+        self.assertEqual(g.to_fen(), list_game.to_fen())
+        self.assertEqual(g.moves, list_game.moves)
+        while list_game.move_codes:
+            list_game.unmake_move_code()
+        self.assertEqual(Game(PlayerType.HUMAN, PlayerType.HUMAN).to_fen(), list_game.to_fen())
+
+    def test_fen_round_trip(self):
+        for fen in ['rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
+                    'rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3',
+                    '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 b - - 12 57',
+                    'r3k2r/8/8/8/8/8/8/R3K2R b Kq - 3 40']:
+            self.assertEqual(fen, FenGameConstructor(fen).game.to_fen())
+            self.assertEqual(fen, Game(PlayerType.HUMAN, PlayerType.HUMAN, board_type=Board, fen=fen).to_fen())
+        # the clocks are optional
+        self.assertEqual('4k3/8/8/8/8/8/8/4K3 w - - 0 1', FenGameConstructor('4k3/8/8/8/8/8/8/4K3 w - -').game.to_fen())
+        for fen in ['', '4k3/8/8/8/8/8/8/4K3 w', '4k3/8/8/8/8/8/4K3 w - - 0 1', '4k3/8/8/8/8/8/8/4K4 w - - 0 1',
+                    '4k3/8/8/8/8/8/8/4X3 w - - 0 1', '4k3/8/8/8/8/8/8/4K3 x - - 0 1', '4k3/8/8/8/8/8/8/4K3 w - - a 1']:
+            with self.assertRaises(InvalidChessNotationError):
+                FenGameConstructor(fen)
+
+    def test_move_clocks(self):
+        g = Game(PlayerType.HUMAN, PlayerType.HUMAN)
+        g.apply_record('1. e4 e5 2. Nf3 Nc6 3. Bb5')
+        self.assertTrue(g.to_fen().endswith(' b KQkq - 3 3'))
+        g.apply_notation('Nd4')
+        self.assertTrue(g.to_fen().endswith(' 4 4'))
+        g.apply_notation('Nxd4')
+        self.assertTrue(g.to_fen().endswith(' 0 4'))
+        while g.move_codes:
+            g.unmake_move_code()
+        self.assertEqual(Game(PlayerType.HUMAN, PlayerType.HUMAN).to_fen(), g.to_fen())
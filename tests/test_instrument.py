@@ -0,0 +1,67 @@
+import os
+import tempfile
+import unittest
+
+from castle import Game, PlayerType
+from castle.bitboard import BitBoard
+from castle import instrument
+from castle.instrument import SamplingProfiler, instrumented, profile, snapshot
+from castle.search import Search
+
+
+class InstrumentTests(unittest.TestCase):
+    def tearDown(self):
+        instrument.disable()
+
+    def test_disabled_by_default(self):
+        original = vars(BitBoard)['is_in_check']
+        self.assertFalse(instrument.is_enabled())
+        with instrumented():
+            self.assertTrue(instrument.is_enabled())
+            self.assertIsNot(original, vars(BitBoard)['is_in_check'])
+        # the original methods are put back
+        self.assertFalse(instrument.is_enabled())
+        self.assertIs(original, vars(BitBoard)['is_in_check'])
+
+    def test_counts(self):
+        game = Game(PlayerType.HUMAN, PlayerType.HUMAN)
+        with instrumented():
+            self.assertEqual(400, game.perft(2))
+        stats = snapshot()
+        self.assertEqual(20, stats['Game.make_move_code']['calls'])
+        self.assertEqual(20, stats['Game.count_legal_moves']['calls'])
+        self.assertGreater(stats['Game.count_legal_moves']['seconds'], 0)
+
+        # nothing is counted once it's disabled
+        game.perft(2)
+        self.assertEqual(stats, snapshot())
+        self.assertIn('Game.make_move_code', instrument.format_stats(stats))
+
+    def test_recursive_time_counted_once(self):
+        game = Game(PlayerType.HUMAN, PlayerType.HUMAN)
+        with instrumented(['Search.run', 'Search._negamax']):
+            Search(game, max_depth=2).run()
+        stats = snapshot()
+        self.assertGreater(stats['Search._negamax']['calls'], 20)
+        self.assertLessEqual(stats['Search._negamax']['seconds'], stats['Search.run']['seconds'])
+
+    def test_unknown_target(self):
+        with self.assertRaises(ValueError):
+            instrument.enable(['Game.no_such_method'])
+
+    def test_profile(self):
+        game = Game(PlayerType.HUMAN, PlayerType.HUMAN)
+        path = os.path.join(tempfile.mkdtemp(), 'perft.prof')
+        result, report = profile(game.perft, 2, path=path)
+        self.assertEqual(400, result)
+        self.assertIn('perft', report)
+        self.assertTrue(os.path.getsize(path))
+        os.remove(path)
+
+    def test_sampling(self):
+        game = Game(PlayerType.HUMAN, PlayerType.HUMAN)
+        with SamplingProfiler(interval=0.0005) as sampler:
+            game.perft(3)
+        self.assertGreater(sampler.samples, 0)
+        self.assertIn('test_instrument.py:test_sampling', sampler.inclusive_counts())
+        self.assertIn('samples', sampler.report())
@@ -0,0 +1,39 @@
+import unittest
+
+from castle import Game, PlayerType, FenGameConstructor
+from castle.move import move_coordinates
+from castle.ordering import MoveOrderer, mvv_lva
+
+
+class MoveOrderingTests(unittest.TestCase):
+    def test_mvv_lva(self):
+        # the queen on d5 can be taken by the pawn or the rook, and the knight on b5 by the rook
+        g = FenGameConstructor('4k3/8/8/1n1q4/4P3/8/8/1R1RK3 w - - 0 1').game
+        codes = {move_coordinates(code): code for code in g.generate_legal_codes()}
+        self.assertGreater(mvv_lva(g.board, codes['e4d5']), mvv_lva(g.board, codes['d1d5']))
+        self.assertGreater(mvv_lva(g.board, codes['d1d5']), mvv_lva(g.board, codes['b1b5']))
+        self.assertEqual(0, mvv_lva(g.board, codes['e1e2']))
+
+        ordered = [move_coordinates(code) for code in MoveOrderer(g.board).ordered(list(codes.values()), 0)]
+        self.assertEqual(['e4d5', 'd1d5', 'b1b5'], ordered[:3])
+        self.assertEqual(sorted(codes), sorted(ordered))
+
+    def test_hash_move_first(self):
+        g = Game(PlayerType.HUMAN, PlayerType.HUMAN)
+        codes = g.generate_legal_codes()
+        hash_move = codes[-1]
+        ordered = list(MoveOrderer(g.board).ordered(codes, 0, hash_move))
+        self.assertEqual(hash_move, ordered[0])
+        self.assertEqual(sorted(codes), sorted(ordered))
+
+    def test_killers_and_history(self):
+        g = Game(PlayerType.HUMAN, PlayerType.HUMAN)
+        codes = {move_coordinates(code): code for code in g.generate_legal_codes()}
+        orderer = MoveOrderer(g.board)
+        orderer.record_cutoff(codes['g1f3'], 2, 3)
+        orderer.record_cutoff(codes['e2e4'], 2, 3)
+        # the most recent killer comes first, then the older one
+        ordered = [move_coordinates(code) for code in orderer.ordered(list(codes.values()), 2)]
+        self.assertEqual(['e2e4', 'g1f3'], ordered[:2])
+        # killers are per ply, but the history score of the moves carries over to other plies
+        self.assertGreater(orderer.score(codes['e2e4'], 5), orderer.score(codes['d2d4'], 5))
@@ -2,6 +2,7 @@ import unittest
 
 import castle
 from castle import Game, Board, Piece, PieceType, Color, InvalidChessNotationError, PlayerType, MoveParser, FenGameConstructor
+from castle.perft import PerftCache
 from typing import List
 
 
@@ -75,3 +76,98 @@ class PerftTests(unittest.TestCase):
                 27990
             ]
         )
+
+    def test_perft_kiwipete(self):
+        self.run_perft(
+            'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq -',
+            [
+                48,
+                2039,
+                97862
+            ]
+        )
+
+    def test_perft_en_passant_pins(self):
+        self.run_perft(
+            '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - -',
+            [
+                14,
+                191,
+                2812,
+                43238
+            ]
+        )
+
+    def test_perft_promotions(self):
+        self.run_perft(
+            'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+            [
+                6,
+                264,
+                9467
+            ]
+        )
+        self.run_perft(
+            'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+            [
+                44,
+                1486,
+                62379
+            ]
+        )
+
+    def test_divide(self):
+        g = Game(PlayerType.HUMAN, PlayerType.HUMAN)
+        divide = g.divide(3)
+        self.assertEqual(20, len(divide))
+        self.assertEqual(8902, sum(divide.values()))
+        self.assertEqual(600, divide['e2e4'])
+        self.assertEqual(440, divide['g1f3'])
+
+        g = FenGameConstructor('r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1').game
+        g.apply_notation('Qe1')
+        divide = g.divide(1)
+        # every promotion piece is a separate root move
+        self.assertTrue({'b2a1q', 'b2a1r', 'b2a1b', 'b2a1n'} <= divide.keys())
+
+        g = FenGameConstructor('r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1').game
+        self.assertTrue({'e1g1', 'e1c1'} <= g.divide(1).keys())
+
+    def test_cached_perft_matches(self):
+        g = FenGameConstructor('r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq -').game
+        # a deliberately tiny cache, so entries are constantly replaced
+        cache = PerftCache(buckets=4)
+        self.assertEqual(g.perft(3), g.perft(3, cache))
+        self.assertEqual([48, 2039, 97862], g.perft_report(3, cache))
+        self.assertGreater(cache.hits, 0)
+        self.assertLessEqual(len(cache), 8)
+
+    def test_perft_parallel(self):
+        g = FenGameConstructor('r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq -').game
+        self.assertEqual(97862, g.perft_parallel(3, workers=2))
+        self.assertEqual(g.divide(3), g.divide_parallel(3, workers=2, frontier_depth=2))
+        # the position is unchanged afterwards
+        self.assertEqual('r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1', g.to_fen())
+
+
+class PerftCacheTests(unittest.TestCase):
+    def test_replacement(self):
+        cache = PerftCache(buckets=1)
+        cache.put(1, 3, 'deep')
+        cache.put(2, 1, 'shallow')
+        # the deeper entry is kept, and the shallow one goes in the always-replace slot
+        self.assertEqual('deep', cache.get(1, 3))
+        self.assertEqual('shallow', cache.get(2, 1))
+        cache.put(3, 1, 'newer')
+        self.assertEqual('deep', cache.get(1, 3))
+        self.assertIsNone(cache.get(2, 1))
+        self.assertEqual('newer', cache.get(3, 1))
+        # the same key at another depth is a different entry
+        self.assertIsNone(cache.get(1, 2))
+        self.assertEqual(4, cache.hits)
+        self.assertEqual(2, cache.misses)
+
+    def test_bucket_count(self):
+        with self.assertRaises(ValueError):
+            PerftCache(buckets=3)
+
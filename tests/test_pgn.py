@@ -0,0 +1,102 @@
+import io
+import unittest
+
+from castle import Game, PlayerType, FenGameConstructor
+from castle.move import InvalidMoveError
+from castle.pgn import read_games, PgnReader
+
+PGN = '''[Event "Casual Game"]
+[Site "Berlin GER"]
+[White "Adolf Anderssen"]
+[Black "Jean Dufresne"]
+[Annotator "A \\"quoted\\" name"]
+[Result "1-0"]
+
+1.e4 e5 2.Nf3 Nc6 3.Bc4 Bc5 {the Giuoco
+Piano} 4.b4!? Bxb4 $6 5.c3 (5.O-O d6 (5...Nf6) 6.c3) 5...Ba5 ; a rest of line comment
+6.d4 1-0
+
+% an escaped line, which is ignored
+[Event "Second"]
+[SetUp "1"]
+[FEN "4k3/8/8/8/8/8/4P3/4K3 w - - 0 1"]
+
+e4 Kd7 e5 *
+
+[Event "No result"]
+
+1. d4 d5
+'''
+
+
+class PgnTests(unittest.TestCase):
+    def test_read_games(self):
+        games = list(read_games(io.StringIO(PGN)))
+        self.assertEqual(3, len(games))
+
+        first = games[0]
+        self.assertEqual('Adolf Anderssen', first.headers['White'])
+        self.assertEqual('A "quoted" name', first.headers['Annotator'])
+        self.assertEqual(['e4', 'e5', 'Nf3', 'Nc6', 'Bc4', 'Bc5', 'b4', 'Bxb4', 'c3', 'Ba5', 'd4'], first.moves)
+        self.assertEqual('1-0', first.result)
+        self.assertEqual({6: ['the Giuoco\nPiano'], 10: ['a rest of line comment']}, first.comments)
+        # b4!? and Bxb4 $6
+        self.assertEqual({6: [5], 7: [6]}, first.nags)
+        self.assertEqual({}, first.variations)
+
+        second = games[1]
+        self.assertEqual(['e4', 'Kd7', 'e5'], second.moves)
+        self.assertEqual('*', second.result)
+        # played from the FEN tag
+        g = second.to_game()
+        self.assertEqual('4P3', g.to_fen().split('/')[3])
+        self.assertEqual('3k4', g.to_fen().split('/')[1])
+
+        third = games[2]
+        self.assertEqual('No result', third.headers['Event'])
+        self.assertEqual(['d4', 'd5'], third.moves)
+        self.assertEqual('*', third.result)
+
+    def test_keep_variations(self):
+        first = next(iter(PgnReader(io.StringIO(PGN), keep_variations=True)))
+        # the variation is an alternative to 5.c3
+        self.assertEqual({8: ['5. O-O d6 (5... Nf6) 6. c3']}, first.variations)
+        self.assertEqual(11, len(first.moves))
+
+    def test_lazy(self):
+        # only the lines of the first game are read to yield it
+        lines = iter(PGN.splitlines(keepends=True))
+        games = read_games(lines)
+        next(games)
+        self.assertEqual('', next(lines).strip())
+
+    def test_to_game(self):
+        games = list(read_games(io.StringIO(PGN)))
+        g = games[0].to_game()
+        self.assertEqual(11, len(g.move_codes))
+        self.assertEqual(games[0].moves, g.san_history())
+
+        expected = Game(PlayerType.HUMAN, PlayerType.HUMAN)
+        expected.apply_record('1. e4 {a comment} e5 2. Nf3 Nc6 3. Bc4 Bc5 4. b4 Bxb4 5. c3 (5. O-O) Ba5 6. d4')
+        self.assertEqual(expected.to_fen(), g.to_fen())
+
+    def test_illegal_castle(self):
+        game = next(read_games(['1. e4 e5 2. O-O *']))
+        with self.assertRaises(InvalidMoveError):
+            game.to_game()
+
+    def test_to_pgn(self):
+        games = list(read_games(io.StringIO(PGN), keep_variations=True))
+        text = games[0].to_pgn()
+        self.assertTrue(text.startswith('[Event "Casual Game"]\n[Site "Berlin GER"]\n[Date "?"]'))
+        self.assertIn('[Annotator "A \\"quoted\\" name"]', text)
+        self.assertIn('4. b4 $5 Bxb4 $6', text)
+        self.assertTrue(all(len(line) <= 79 for line in text.splitlines()))
+
+        written = list(read_games(io.StringIO('\n'.join(game.to_pgn() for game in games)), keep_variations=True))
+        for game, read_back in zip(games, written):
+            self.assertEqual(game.moves, read_back.moves)
+            self.assertEqual(game.nags, read_back.nags)
+            self.assertEqual(game.comments, read_back.comments)
+            self.assertEqual(game.variations, read_back.variations)
+            self.assertEqual(game.result, read_back.result)
@@ -0,0 +1,89 @@
+import os
+import tempfile
+import unittest
+
+from castle import Game, PlayerType, FenGameConstructor, Board, InvalidChessNotationError
+from castle.positiondb import PositionWriter, PositionReader, RECORD_BYTES, encode_fen
+
+FENS = [
+    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
+    'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+    'rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3',
+    '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 b - - 12 57',
+]
+
+
+class PositionDatabaseTests(unittest.TestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.pos')
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_record_size(self):
+        self.assertTrue(32 <= RECORD_BYTES <= 40)
+        self.assertEqual(RECORD_BYTES, len(encode_fen(FENS[0])))
+
+    def test_bad_fen(self):
+        bad = ['rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KXkq - 0 1',
+               'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNX w KQkq - 0 1',
+               'rnbqkbnr w KQkq',
+               '8/8/8 w - - 0 1',
+               'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR x KQkq - 0 1',
+               '9/8/8/8/8/8/8/8 w - - 0 1',
+               'rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e9 0 1',
+               'rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e4 0 1']
+        with PositionWriter(self.path) as writer:
+            for fen in bad:
+                with self.assertRaises(ValueError):
+                    writer.write_fen(fen)
+                with self.assertRaises(InvalidChessNotationError):
+                    Game(PlayerType.HUMAN, PlayerType.HUMAN, fen=fen)
+            self.assertEqual(0, writer.count)
+
+    def test_fen_round_trip(self):
+        with PositionWriter(self.path) as writer:
+            writer.write_fens(FENS + [''])
+            self.assertEqual(len(FENS), writer.count)
+        self.assertEqual(16 + len(FENS) * RECORD_BYTES, os.path.getsize(self.path))
+
+        with PositionReader(self.path) as reader:
+            self.assertEqual(len(FENS), len(reader))
+            # read out of order, since any record can be read directly
+            for index in reversed(range(len(FENS))):
+                self.assertEqual(FENS[index], reader.fen(index))
+                game = reader.game(index)
+                expected = FenGameConstructor(FENS[index]).game
+                self.assertEqual(expected.to_fen(), game.to_fen())
+                self.assertEqual(expected.zobrist_key, game.zobrist_key)
+                self.assertEqual(expected.board.zobrist_key, reader.board(index).zobrist_key)
+                self.assertEqual(expected.board.zobrist_key, reader.board(index, Board).zobrist_key)
+            with self.assertRaises(IndexError):
+                reader.fen(len(FENS))
+
+    def test_pgn(self):
+        pgn = ['[Event "One"]', '', '1. e4 e5 2. Nf3 1-0', '',
+               '[FEN "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 b - - 12 57"]', '', 'Rxb5+ 0-1']
+        with PositionWriter(self.path) as writer:
+            writer.write_pgn(pgn)
+        with PositionReader(self.path) as reader:
+            self.assertEqual(6, len(reader))
+            self.assertEqual('rnbqkbnr/pppp1ppp/8/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R b KQkq - 1 2', reader.fen(3))
+            self.assertEqual('8/2p5/3p4/Kr6/1R3p1k/8/4P1P1/8 w - - 0 58', reader.fen(5))
+
+    def test_game_position(self):
+        g = Game(PlayerType.HUMAN, PlayerType.HUMAN)
+        g.apply_record('1. d4 Nf6 2. c4 e6')
+        with PositionWriter(self.path) as writer:
+            writer.write_game(g)
+        with PositionReader(self.path) as reader:
+            self.assertEqual(g.to_fen(), reader.fen(0))
+            self.assertTrue(g.to_fen().endswith(' 0 3'))
+            self.assertEqual(g.to_fen(), reader.game(0).to_fen())
+
+    def test_bad_file(self):
+        with open(self.path, 'wb') as handle:
+            handle.write(b'not a position file')
+        with self.assertRaises(ValueError):
+            PositionReader(self.path)
@@ -0,0 +1,167 @@
+import unittest
+
+from castle import Game, PlayerType, FenGameConstructor, BitBoard, PieceType, InvalidChessNotationError
+from castle.board import Board
+from castle.move import InvalidMoveError, move_coordinates, move_flags
+from castle.move import KINGSIDE_CASTLE, QUEENSIDE_CASTLE, EN_PASSANT, DOUBLE_PAWN_PUSH
+from castle.san import parse_san, tokenize
+from castle.search import Search
+
+
+def sans(game: Game) -> dict:
+    return {move_coordinates(code): game.san(code) for code in game.generate_legal_codes()}
+
+
+class SanTests(unittest.TestCase):
+    def test_disambiguation(self):
+        g = FenGameConstructor('4k3/8/8/8/8/5N2/8/1N2K3 w - - 0 1').game
+        self.assertEqual('Nbd2', sans(g)['b1d2'])
+        self.assertEqual('Nfd2', sans(g)['f3d2'])
+        self.assertEqual('Nh4', sans(g)['f3h4'])
+
+        g = FenGameConstructor('4k3/8/8/R7/8/8/8/R3K3 w - - 0 1').game
+        self.assertEqual('R1a3', sans(g)['a1a3'])
+        self.assertEqual('R5a3', sans(g)['a5a3'])
+
+        g = FenGameConstructor('2k5/8/8/8/4Q2Q/8/8/K6Q w - - 0 1').game
+        moves = sans(g)
+        self.assertEqual('Qh4e1', moves['h4e1'])
+        self.assertEqual('Qee1', moves['e4e1'])
+        self.assertEqual('Q1e1', moves['h1e1'])
+
+    def test_pinned_piece_not_ambiguous(self):
+        # the knight on c3 could reach e2, but it's pinned to the king
+        g = FenGameConstructor('4k3/8/8/8/1b6/2N5/8/4K1N1 w - - 0 1').game
+        self.assertEqual('Ne2', sans(g)['g1e2'])
+
+    def test_captures_and_special_moves(self):
+        g = FenGameConstructor('4k3/8/8/3pP3/8/8/8/R3K2R w KQ d6 0 1').game
+        moves = sans(g)
+        self.assertEqual('exd6', moves['e5d6'])
+        self.assertEqual('O-O', moves['e1g1'])
+        self.assertEqual('O-O-O', moves['e1c1'])
+        self.assertEqual('Rxa8+', sans(FenGameConstructor('r3k3/8/8/8/8/8/8/R3K3 w - - 0 1').game)['a1a8'])
+
+    def test_check_and_mate(self):
+        g = FenGameConstructor('6k1/5ppp/8/8/8/8/8/R3K3 w - - 0 1').game
+        self.assertEqual('Ra8#', sans(g)['a1a8'])
+        self.assertEqual('Ra7', sans(g)['a1a7'])
+
+        g = FenGameConstructor('8/4P3/6k1/8/8/8/8/4K3 w - - 0 1').game
+        moves = sans(g)
+        self.assertEqual('e8=Q+', moves['e7e8q'])
+        self.assertEqual('e8=N', moves['e7e8n'])
+
+    def test_notation_is_lazy(self):
+        g = Game(PlayerType.HUMAN, PlayerType.HUMAN)
+        moves = g.generate_legal_moves()
+        self.assertTrue(all(move._notation is None for move in moves))
+        knight = next(move for move in moves if move.coordinate_notation() == 'g1f3')
+        self.assertEqual('Nf3', knight.notation)
+        # the notation is kept once it's been worked out
+        g.make_move(knight)
+        self.assertEqual('Nf3', knight.notation)
+
+    def test_search_moves(self):
+        g = FenGameConstructor('6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1').game
+        result = Search(g, max_depth=2).run()
+        self.assertEqual('Ra8#', result.best_move.notation)
+        g.make_move(result.best_move)
+        self.assertEqual(['Ra8#'], [move.notation for move in g.moves])
+
+        # a move made with notation written without the position gets it worked out again
+        g = FenGameConstructor('4k3/8/8/8/8/5N2/8/1N2K3 w - - 0 1').game
+        code = next(code for code in g.generate_legal_codes() if move_coordinates(code) == 'b1d2')
+        move = g.board.move_from_code(code)
+        move.notation = 'Nd2'
+        g.make_move(move)
+        self.assertEqual('Nbd2', g.moves[0].notation)
+
+    def test_history(self):
+        for board_type in (Board, None):
+            g = Game(PlayerType.HUMAN, PlayerType.HUMAN, board_type=board_type) if board_type else \
+                Game(PlayerType.HUMAN, PlayerType.HUMAN)
+            for coordinates in ['e2e4', 'd7d5', 'e4d5', 'd8d5', 'b1c3', 'd5e5']:
+                code = next(code for code in g.generate_legal_codes() if move_coordinates(code) == coordinates)
+                g.make_move_code(code)
+            fen = g.to_fen()
+            self.assertEqual(['e4', 'd5', 'exd5', 'Qxd5', 'Nc3', 'Qe5+'], [move.notation for move in g.moves])
+            self.assertEqual(fen, g.to_fen())
+            g.unmake_move_code()
+            self.assertEqual(['e4', 'd5', 'exd5', 'Qxd5', 'Nc3'], g.san_history())
+
+
+class SanParserTests(unittest.TestCase):
+    KIWIPETE = 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1'
+
+    def test_tokenize(self):
+        token = tokenize('Nbxd7+')
+        self.assertEqual(PieceType.KNIGHT, token.piece_type)
+        self.assertEqual(1, token.file)
+        self.assertIsNone(token.rank)
+        self.assertTrue(token.is_capture)
+        self.assertEqual(51, token.dest)
+        self.assertEqual('+', token.check)
+
+        token = tokenize('exd8=R#')
+        self.assertEqual(PieceType.PAWN, token.piece_type)
+        self.assertEqual(PieceType.ROOK, token.promotion)
+        self.assertEqual('#', token.check)
+        self.assertEqual(KINGSIDE_CASTLE, tokenize('O-O+').castle)
+        self.assertEqual(QUEENSIDE_CASTLE, tokenize('0-0-0').castle)
+        for notation in ['', 'Nz3', 'Ke9', 'O-O-O-O', 'Kd8=Q']:
+            with self.assertRaises(InvalidChessNotationError):
+                tokenize(notation)
+
+    def test_disambiguation(self):
+        g = FenGameConstructor('2k5/8/8/8/4Q2Q/8/8/K6Q w - - 0 1').game
+        self.assertEqual('h4e1', move_coordinates(parse_san(g, 'Qh4e1')))
+        self.assertEqual('e4e1', move_coordinates(parse_san(g, 'Qee1')))
+        self.assertEqual('h1e1', move_coordinates(parse_san(g, 'Q1e1')))
+        with self.assertRaises(InvalidChessNotationError):
+            parse_san(g, 'Qe1')
+        with self.assertRaises(InvalidMoveError):
+            parse_san(g, 'Nf3')
+
+        # the knight on c3 is pinned, so Ne2 can only be the other one
+        g = FenGameConstructor('4k3/8/8/8/1b6/2N5/8/4K1N1 w - - 0 1').game
+        self.assertEqual('g1e2', move_coordinates(parse_san(g, 'Ne2')))
+
+    def test_pawn_moves(self):
+        g = FenGameConstructor('4k3/2P5/8/3pP3/8/8/6P1/4K3 w - d6 0 1').game
+        self.assertEqual('e5d6', move_coordinates(parse_san(g, 'exd6')))
+        self.assertEqual(EN_PASSANT, move_flags(parse_san(g, 'exd6')))
+        self.assertEqual(DOUBLE_PAWN_PUSH, move_flags(parse_san(g, 'g4')))
+        self.assertEqual('c7c8n', move_coordinates(parse_san(g, 'c8=N')))
+        self.assertEqual('c7c8q', move_coordinates(parse_san(g, 'c8')))
+        with self.assertRaises(InvalidMoveError):
+            parse_san(g, 'e7')
+
+    def test_castling(self):
+        g = FenGameConstructor('r3k2r/8/8/8/8/8/8/R3K2R w Kq - 0 1').game
+        self.assertEqual('e1g1', move_coordinates(parse_san(g, 'O-O')))
+        # the right has been lost
+        with self.assertRaises(InvalidMoveError):
+            parse_san(g, 'O-O-O')
+        # no king or rook to castle with
+        g = FenGameConstructor('4k3/8/8/8/8/8/8/4K3 w KQkq - 0 1').game
+        with self.assertRaises(InvalidMoveError):
+            parse_san(g, 'O-O')
+        # through check
+        g = FenGameConstructor('4kr2/8/8/8/8/8/8/4K2R w K - 0 1').game
+        with self.assertRaises(InvalidMoveError):
+            parse_san(g, 'O-O')
+
+    def test_round_trip(self):
+        # every legal move's SAN parses back to the same move, with either board
+        for board_type in (BitBoard, Board):
+            g = FenGameConstructor(self.KIWIPETE).game
+            if board_type is Board:
+                list_game = Game(PlayerType.HUMAN, PlayerType.HUMAN, board_type=Board)
+                list_game.board.clear()
+                for square in g.board.squares_occupied():
+                    list_game.board.place_piece(square.occupant, square.notation())
+                list_game.castling_rights = g.castling_rights
+                g = list_game
+            for code in g.generate_legal_codes():
+                self.assertEqual(code, parse_san(g, g.san(code)))
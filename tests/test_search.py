@@ -0,0 +1,123 @@
+import unittest
+
+from castle import Game, PlayerType, FenGameConstructor, Search, SearchPlayer
+from castle.search import MATE_SCORE, is_mate_score
+from castle.move import NO_MOVE
+from castle.transposition import TranspositionTable, EXACT, LOWER_BOUND
+
+
+class SearchTests(unittest.TestCase):
+    def test_finds_mate_in_one(self):
+        # back rank mate with Ra8
+        g = FenGameConstructor('6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1').game
+        result = Search(g, max_depth=3).run()
+        self.assertEqual('a1a8', result.best_move.coordinate_notation())
+        self.assertEqual(MATE_SCORE - 1, result.score)
+        self.assertTrue(is_mate_score(result.score))
+        # quiescence search finds there are no evasions at the end of the first iteration, and the search stops there
+        self.assertEqual(1, result.depth)
+
+    def test_captures_hanging_queen(self):
+        g = FenGameConstructor('4k3/8/8/3q4/8/8/3R4/4K3 w - - 0 1').game
+        result = Search(g, max_depth=2).run()
+        self.assertEqual('d2d5', result.best_move.coordinate_notation())
+        self.assertGreater(result.score, 0)
+
+    def test_pv_is_legal_and_position_restored(self):
+        g = Game(PlayerType.HUMAN, PlayerType.HUMAN)
+        fen = g.to_fen()
+        result = Search(g, max_depth=3).run()
+        self.assertEqual(fen, g.to_fen())
+        self.assertEqual(3, result.depth)
+        self.assertEqual(3, len(result.pv))
+        self.assertEqual(result.best_move, result.pv[0])
+        for move in result.pv:
+            self.assertIn(move, g.generate_legal_moves())
+            g.make_move(move)
+
+    def test_stalemate_scores_as_draw(self):
+        g = FenGameConstructor('k7/8/1Q6/8/8/8/8/7K b - - 0 1').game
+        result = Search(g, max_depth=2).run()
+        self.assertIsNone(result.best_move)
+        self.assertEqual(0, result.score)
+
+    def test_node_limit(self):
+        g = Game(PlayerType.HUMAN, PlayerType.HUMAN)
+        result = Search(g, node_limit=500).run()
+        self.assertIsNotNone(result.best_move)
+        self.assertLess(result.depth, Search.DEFAULT_MAX_DEPTH)
+        # the first iteration always completes, and later ones stop at the budget
+        self.assertLessEqual(result.nodes, 501)
+        self.assertEqual(g.to_fen(), Game(PlayerType.HUMAN, PlayerType.HUMAN).to_fen())
+
+    def test_time_limit(self):
+        g = Game(PlayerType.HUMAN, PlayerType.HUMAN)
+        result = Search(g, time_limit=0.2).run()
+        self.assertIsNotNone(result.best_move)
+        self.assertLess(result.elapsed, 1.0)
+
+    def test_quiescence_sees_recapture(self):
+        # at depth 1, Qxd5 looks like it wins a pawn, but the queen is lost to exd5
+        g = FenGameConstructor('4k3/8/4p3/3p4/8/8/8/3QK3 w - - 0 1').game
+        result = Search(g, max_depth=1).run()
+        self.assertNotEqual('d1d5', result.best_move.coordinate_notation())
+        # still well ahead: the queen against two pawns
+        self.assertGreater(result.score, 600)
+
+    def test_table_is_reused(self):
+        g = Game(PlayerType.HUMAN, PlayerType.HUMAN)
+        table = TranspositionTable(1)
+        first = Search(g, max_depth=3, table=table).run()
+        hits = table.hits
+        # searching the same position again starts from the stored results
+        second = Search(g, max_depth=3, table=table).run()
+        self.assertGreater(table.hits, hits)
+        self.assertLess(second.nodes, first.nodes)
+        self.assertEqual(first.score, second.score)
+
+    def test_computer_player_searches(self):
+        g = FenGameConstructor('6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1').game
+        g.white_player = SearchPlayer(g.white_player.color, g, max_depth=2)
+        g.current_player = g.white_player
+        g.play_turn()
+        self.assertTrue(g.finished)
+
+
+class TranspositionTableTests(unittest.TestCase):
+    def test_footprint_follows_budget(self):
+        table = TranspositionTable(1)
+        self.assertEqual(1024 * 1024, table.footprint)
+        self.assertEqual(1024 * 1024 // TranspositionTable.ENTRY_BYTES, table.size)
+        # budgets which aren't a power of two round down
+        self.assertEqual(1024 * 1024, TranspositionTable(1.5).footprint)
+        with self.assertRaises(ValueError):
+            TranspositionTable(0)
+
+    def test_store_and_probe(self):
+        table = TranspositionTable(1)
+        self.assertIsNone(table.probe(1234))
+        table.store(1234, 3, EXACT, -50, 77)
+        self.assertEqual((3, EXACT, -50, 77), table.probe(1234))
+        self.assertEqual(1, table.hits)
+        self.assertEqual(1, table.misses)
+        # a result without a best move keeps the one already stored for the position
+        table.store(1234, 4, LOWER_BOUND, 20, NO_MOVE)
+        self.assertEqual((4, LOWER_BOUND, 20, 77), table.probe(1234))
+
+    def test_replacement(self):
+        table = TranspositionTable(1)
+        buckets = table.size // 2
+        deep, shallow, other = 5, 5 + buckets, 5 + 2 * buckets
+        table.store(deep, 6, EXACT, 0)
+        # a shallower result goes in the always-replace entry, and the deep result is kept
+        table.store(shallow, 2, EXACT, 0)
+        table.store(other, 1, EXACT, 0)
+        self.assertIsNotNone(table.probe(deep))
+        self.assertIsNone(table.probe(shallow))
+        self.assertIsNotNone(table.probe(other))
+        self.assertEqual(1, table.collisions)
+        # in a new search, the deep entry from the old search can be replaced
+        table.new_search()
+        table.store(shallow, 2, EXACT, 0)
+        self.assertIsNone(table.probe(deep))
+        self.assertIsNotNone(table.probe(shallow))
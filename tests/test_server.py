@@ -0,0 +1,118 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+
+from castle.server import AnalysisServer
+
+MATE_IN_ONE = '6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1'
+
+
+class AnalysisServerTests(unittest.TestCase):
+    def setUp(self):
+        self.server = AnalysisServer(workers=1, cache_size=2)
+
+    def tearDown(self):
+        self.server.close()
+
+    def run_async(self, coroutine):
+        return asyncio.run(coroutine)
+
+    def test_analyse(self):
+        result = self.run_async(self.server.analyse(MATE_IN_ONE, depth=2))
+        self.assertEqual('a1a8', result['bestmove'])
+        self.assertEqual('Ra8#', result['san'])
+        self.assertFalse(result['cached'])
+
+    def test_cache(self):
+        async def requests():
+            first = await self.server.analyse(MATE_IN_ONE, depth=2)
+            # the clocks don't change the position's key
+            second = await self.server.analyse('6k1/5ppp/8/8/8/8/8/R5K1 w - - 12 40', depth=2)
+            return first, second
+
+        first, second = self.run_async(requests())
+        self.assertTrue(second['cached'])
+        self.assertEqual(first['pv'], second['pv'])
+        self.assertEqual(1, self.server.stats['searches'])
+
+    def test_cache_evicts_least_recently_used(self):
+        async def requests():
+            for depth in (1, 2, 1, 3, 1, 2):
+                await self.server.analyse(MATE_IN_ONE, depth=depth)
+
+        self.run_async(requests())
+        # depth 2 was evicted by depth 3, while depth 1 kept being used
+        self.assertEqual(4, self.server.stats['searches'])
+        self.assertEqual(2, self.server.stats['cache_hits'])
+
+    def test_duplicates_are_coalesced(self):
+        async def requests():
+            return await asyncio.gather(*[self.server.analyse(MATE_IN_ONE, depth=3) for _ in range(5)])
+
+        results = self.run_async(requests())
+        self.assertEqual(1, self.server.stats['searches'])
+        self.assertEqual(4, self.server.stats['coalesced'])
+        self.assertEqual({'a1a8'}, {result['bestmove'] for result in results})
+
+    def test_busy(self):
+        self.server.max_pending = 1
+
+        async def requests():
+            return await asyncio.gather(self.server.handle_request(json.dumps({'id': 1, 'fen': MATE_IN_ONE})),
+                                        self.server.handle_request(json.dumps({'id': 2, 'fen': MATE_IN_ONE,
+                                                                               'depth': 1})))
+
+        first, second = self.run_async(requests())
+        self.assertIn('bestmove', first)
+        self.assertIn('busy', second['error'])
+        self.assertEqual(2, second['id'])
+
+    def test_bad_requests(self):
+        async def requests():
+            return [await self.server.handle_request(line) for line in
+                    ('not json', '[1]', '{"id": 3}', '{"id": 4, "fen": "rubbish"}',
+                     json.dumps({'id': 5, 'fen': MATE_IN_ONE, 'depth': -1}))]
+
+        responses = self.run_async(requests())
+        self.assertTrue(all('error' in response for response in responses))
+        self.assertEqual([None, None, 3, 4, 5], [response['id'] for response in responses])
+
+    def test_tcp(self):
+        async def client():
+            listener = await self.server.serve_tcp()
+            port = listener.sockets[0].getsockname()[1]
+            async with listener:
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+                for request_id in range(3):
+                    writer.write(json.dumps({'id': request_id, 'fen': MATE_IN_ONE, 'depth': 2}).encode() + b'\n')
+                writer.write(b'{"command": "stats"}\n')
+                await writer.drain()
+                responses = [json.loads(await reader.readline()) for _ in range(4)]
+                writer.close()
+                return responses
+
+        responses = self.run_async(client())
+        moves = {response['id']: response['bestmove'] for response in responses if 'bestmove' in response}
+        self.assertEqual({0: 'a1a8', 1: 'a1a8', 2: 'a1a8'}, moves)
+        self.assertTrue(any('stats' in response for response in responses))
+
+    @unittest.skipUnless(hasattr(asyncio, 'start_unix_server'), 'no Unix sockets')
+    def test_unix_socket(self):
+        path = os.path.join(tempfile.mkdtemp(), 'castle.sock')
+
+        async def client():
+            listener = await self.server.serve_unix(path)
+            async with listener:
+                reader, writer = await asyncio.open_unix_connection(path)
+                writer.write(json.dumps({'id': 'a', 'fen': MATE_IN_ONE, 'nodes': 200}).encode() + b'\n')
+                await writer.drain()
+                response = json.loads(await reader.readline())
+                writer.close()
+                return response
+
+        response = self.run_async(client())
+        self.assertEqual('a', response['id'])
+        self.assertEqual('a1a8', response['bestmove'])
+        os.remove(path)
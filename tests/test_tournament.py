@@ -0,0 +1,72 @@
+import io
+import math
+import unittest
+
+from castle.pgn import read_games
+from castle.tournament import EngineConfig, TimeControl, elo_difference, play_game, play_match
+
+
+class TournamentTests(unittest.TestCase):
+    def test_elo_difference(self):
+        self.assertEqual((0.0, math.inf), elo_difference(0, 0, 0))
+        elo, margin = elo_difference(60, 20, 20)
+        # a 70% score
+        self.assertAlmostEqual(147.2, elo, places=1)
+        self.assertTrue(0 < margin < 100)
+        elo, wider = elo_difference(6, 2, 2)
+        self.assertAlmostEqual(147.2, elo, places=1)
+        self.assertGreater(wider, margin)
+        self.assertEqual(math.inf, elo_difference(3, 0, 0)[0])
+
+    def test_engine_spec(self):
+        engine = EngineConfig.from_spec('name=new,depth=4,nodes=5000', 'default')
+        self.assertEqual(('new', 4, None, 5000), (engine.name, engine.depth, engine.movetime, engine.nodes))
+        self.assertEqual(EngineConfig.DEFAULT_DEPTH, EngineConfig.from_spec('', 'default').depth)
+        with self.assertRaises(ValueError):
+            EngineConfig.from_spec('speed=9', 'default')
+        self.assertEqual('10+0.1', str(TimeControl.parse('10+0.1')))
+
+    def test_play_game(self):
+        record = play_game(EngineConfig('a', depth=2), EngineConfig('b', depth=1), fen='6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1')
+        self.assertEqual(['Ra8#'], record.moves)
+        self.assertEqual('1-0', record.result)
+        self.assertEqual('checkmate', record.headers['Termination'])
+        self.assertEqual('1', record.headers['SetUp'])
+
+        record = play_game(EngineConfig('a', depth=1), EngineConfig('b', depth=1), fen='8/8/4k3/8/8/3K4/8/8 w - - 0 1')
+        self.assertEqual('insufficient material', record.headers['Termination'])
+        self.assertEqual('1/2-1/2', record.result)
+
+    def test_max_plies(self):
+        record = play_game(EngineConfig('a', nodes=50), EngineConfig('b', nodes=50), max_plies=6,
+                           time_control=TimeControl(60))
+        self.assertEqual(6, len(record.moves))
+        self.assertEqual('adjudication', record.headers['Termination'])
+        self.assertEqual('60', record.headers['TimeControl'])
+
+    def test_time_forfeit(self):
+        engine = EngineConfig('a', depth=1)
+        # with no time on the clock, white's first move flags
+        record = play_game(engine, engine, fen='4k3/8/8/8/8/8/8/R3K3 w - - 0 1', time_control=TimeControl(0))
+        self.assertEqual('time forfeit', record.headers['Termination'])
+        # black's bare king can't mate, so it's a draw
+        self.assertEqual('1/2-1/2', record.result)
+
+        record = play_game(engine, engine, fen='r3k3/8/8/8/8/8/8/4K3 w - - 0 1', time_control=TimeControl(0))
+        self.assertEqual('time forfeit', record.headers['Termination'])
+        self.assertEqual('0-1', record.result)
+
+    def test_play_match(self):
+        openings = ['6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1', 'r5k1/8/8/8/8/8/5PPP/6K1 b - - 0 1']
+        match = play_match(EngineConfig('a', depth=2), EngineConfig('b', depth=2), 4, openings=openings, workers=1)
+        # each opening is won by whoever has the rook, which is each engine once per opening
+        self.assertEqual((2, 0, 2), (match.wins, match.draws, match.losses))
+        self.assertEqual(['a', 'b', 'a', 'b'], [record.headers['White'] for record in match.games])
+        self.assertEqual(['1', '2', '3', '4'], [record.headers['Round'] for record in match.games])
+        self.assertIn('2 W, 0 D, 2 L', match.summary())
+
+        pgn = '\n'.join(record.to_pgn() for record in match.games)
+        games = list(read_games(io.StringIO(pgn)))
+        self.assertEqual(['Ra8#', 'Ra8#', 'Ra1#', 'Ra1#'], [game.moves[0] for game in games])
+        self.assertEqual(['1-0', '1-0', '0-1', '0-1'], [game.result for game in games])
+        self.assertIn('1... Ra1#', pgn)
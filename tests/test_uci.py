@@ -0,0 +1,80 @@
+import time
+import unittest
+
+from castle.search import MATE_SCORE
+from castle.uci import UciEngine, format_score, search_time
+
+
+class UciTests(unittest.TestCase):
+    def setUp(self):
+        self.output = []
+        self.engine = UciEngine(self.output.append)
+
+    def tearDown(self):
+        self.engine.stop()
+
+    def bestmove(self) -> str:
+        self.engine.wait()
+        return next(line for line in reversed(self.output) if line.startswith('bestmove')).split()[1]
+
+    def test_handshake(self):
+        self.engine.handle('uci')
+        self.assertEqual('uciok', self.output[-1])
+        self.assertTrue(any(line.startswith('option name Hash type spin') for line in self.output))
+        self.engine.handle('isready')
+        self.assertEqual('readyok', self.output[-1])
+
+    def test_go_depth(self):
+        self.engine.handle('position fen 6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1')
+        self.engine.handle('go depth 2')
+        self.assertEqual('a1a8', self.bestmove())
+        info = [line for line in self.output if line.startswith('info depth')]
+        self.assertIn('score mate 1', info[-1])
+        self.assertIn(' pv a1a8', info[-1])
+        for field in ('nodes', 'nps', 'time'):
+            self.assertIn(f' {field} ', info[-1])
+
+    def test_position_moves(self):
+        self.engine.handle('position startpos moves e2e4 e7e5 g1f3')
+        self.assertEqual('rnbqkbnr/pppp1ppp/8/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R b KQkq - 1 2', self.engine.game.to_fen())
+        self.engine.handle('position startpos moves e2e5')
+        self.assertIn('illegal move e2e5', self.output[-1])
+
+    def test_stop_infinite_search(self):
+        self.engine.handle('position startpos')
+        self.engine.handle('go infinite')
+        self.assertTrue(self.engine.searching)
+        # answered straight away, while the search carries on
+        self.engine.handle('isready')
+        self.assertEqual('readyok', self.output[-1])
+        self.assertTrue(self.engine.searching)
+        start = time.monotonic()
+        self.engine.handle('stop')
+        self.assertFalse(self.engine.searching)
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertTrue(self.output[-1].startswith('bestmove'))
+
+    def test_nodes_and_clock(self):
+        self.engine.handle('position startpos')
+        self.engine.handle('go nodes 500')
+        self.bestmove()
+        self.engine.handle('go wtime 2000 btime 2000')
+        self.assertNotEqual('0000', self.bestmove())
+
+    def test_hash_option(self):
+        self.engine.handle('setoption name Hash value 1')
+        self.assertEqual(1, self.engine.hash_megabytes)
+        self.assertLessEqual(self.engine.table.footprint, 1024 * 1024)
+
+    def test_no_legal_moves(self):
+        self.engine.handle('position fen 7k/5KQ1/8/8/8/8/8/8 b - - 0 1')
+        self.engine.handle('go depth 1')
+        self.assertEqual('0000', self.bestmove())
+
+    def test_formatting(self):
+        self.assertEqual('cp -35', format_score(-35))
+        self.assertEqual('mate 1', format_score(MATE_SCORE - 1))
+        self.assertEqual('mate 2', format_score(MATE_SCORE - 3))
+        self.assertEqual('mate -1', format_score(-MATE_SCORE + 2))
+        self.assertLess(search_time(10), 1)
+        self.assertLessEqual(search_time(1, moves_to_go=1), 0.5)